@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+"""
+Resultados compartidos entre varios puestos del Juego de Reflejos.
+
+En las ferias hay varias Raspberry Pi con el juego, cada una con sus propios
+archivos de resultados. Un servidor de agregación (este módulo ejecutado
+como programa) junta los resultados de todos los puestos, y cada juego lleva
+un cliente que le envía sus resultados por lotes y le pide las estadísticas
+de todos los puestos para la clasificación y el histograma.
+
+El cliente trabaja con asyncio en un hilo aparte: las pantallas nunca esperan
+a la red, y las estadísticas recibidas se aplican en las pantallas que no
+miden tiempos. Si el servidor no está disponible, el juego sigue con sus
+estadísticas locales y los resultados se envían cuando vuelva.
+
+Cada resultado lleva el nombre del puesto y un número de secuencia (su
+posición en los resultados del puesto), así que los reenvíos después de un
+corte no se cuentan dos veces y un puesto que arranca manda lo que el
+servidor todavía no tenía.
+
+El protocolo es una línea JSON por mensaje sobre TCP. Para arrancar el servidor:
+
+    python3 agregacion.py --puerto 8765 --registro global.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+from collections import Counter
+
+from estadisticas import Estadisticas
+from histograma import LIMITES_HISTOGRAMA, indice_rango, limites_automaticos_conteos
+
+# Puerto por defecto del servidor
+PUERTO_AGREGACION = 8765
+
+# Tamaño máximo de un mensaje (las estadísticas llevan una fila por jugador)
+LIMITE_MENSAJE = 1 << 24
+
+# Cada cuánto sincroniza el cliente aunque no haya resultados nuevos (segundos)
+INTERVALO_SINCRONIZACION = 5.0
+
+# Cuánto espera el cliente a que lleguen más resultados antes de enviar un lote
+ESPERA_LOTE = 0.5
+
+# Número máximo de resultados por mensaje
+LOTE_MAXIMO = 500
+
+# Tiempo máximo de una sincronización completa (segundos)
+TIEMPO_MAXIMO_SINCRONIZACION = 3.0
+
+async def _pedir(lector, escritor, mensaje):
+    """
+    Envía un mensaje y espera la respuesta.
+
+    Returns:
+        Diccionario con la respuesta
+    """
+    escritor.write(json.dumps(mensaje).encode() + b'\n')
+    await escritor.drain()
+    linea = await lector.readline()
+    if not linea:
+        raise ConnectionError("El servidor ha cerrado la conexión")
+    respuesta = json.loads(linea)
+    if 'error' in respuesta:
+        raise ValueError(respuesta['error'])
+    return respuesta
+
+def estadisticas_desde_resumen(resumen, limites=LIMITES_HISTOGRAMA):
+    """
+    Construye las estadísticas de todos los puestos a partir del resumen que
+    envía el servidor.
+
+    Args:
+        resumen: Respuesta del servidor a un mensaje "estadisticas"
+        limites: Límites de los rangos del histograma, o "auto"
+
+    Returns:
+        Estadisticas: Estadísticas de todos los puestos
+    """
+    conteos_por_tiempo = {tiempo: cantidad for tiempo, cantidad in resumen['tiempos']}
+    if limites == 'auto':
+        limites = limites_automaticos_conteos(conteos_por_tiempo)
+    conteos = [0] * (len(limites) + 1)
+    for tiempo, cantidad in conteos_por_tiempo.items():
+        conteos[indice_rango(limites, tiempo)] += cantidad
+    filas = [(nombre, intentos, suma, mejor, orden_mejor, [tuple(reciente) for reciente in recientes])
+             for nombre, intentos, suma, mejor, orden_mejor, recientes in resumen['jugadores']]
+    return Estadisticas.desde_resumen(resumen['cantidad'], resumen['suma'], resumen['minimo'], conteos,
+                                      conteos_por_tiempo, filas, limites=limites)
+
+class ServidorAgregacion:
+    """
+    Resultados de todos los puestos, guardados en un registro JSON Lines de
+    solo añadir, con sus estadísticas en memoria.
+    """
+
+    def __init__(self, ruta_registro):
+        """
+        Args:
+            ruta_registro: Archivo donde se añaden los resultados recibidos
+        """
+        self.ruta_registro = ruta_registro
+        # Último número de secuencia recibido de cada puesto
+        self.ultimas = {}
+        # Número de resultados de cada tiempo, para el histograma de los clientes
+        self.tiempos = Counter()
+        self.estadisticas = None
+        self._archivo = None
+        self._cargar()
+
+    def _cargar(self):
+        """
+        Lee los resultados ya recibidos y calcula sus estadísticas.
+        """
+        jugadores = []
+        if os.path.exists(self.ruta_registro):
+            with open(self.ruta_registro, 'r') as archivo:
+                for linea in archivo:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        # Línea a medio escribir por un corte de luz
+                        continue
+                    jugadores.append({'nombre': entrada['nombre'], 'tiempo': entrada['tiempo']})
+                    self.tiempos[entrada['tiempo']] += 1
+                    self.ultimas[entrada['kiosco']] = max(self.ultimas.get(entrada['kiosco'], 0),
+                                                          entrada['secuencia'])
+        self.estadisticas = Estadisticas.desde_datos({'jugadores': jugadores})
+
+    def agregar_resultados(self, kiosco, resultados):
+        """
+        Guarda los resultados de un puesto que todavía no se habían recibido.
+
+        Args:
+            kiosco: Nombre del puesto
+            resultados: Lista de diccionarios con 'secuencia', 'nombre' y 'tiempo'
+
+        Returns:
+            int: Último número de secuencia recibido del puesto
+        """
+        ultima = self.ultimas.get(kiosco, 0)
+        nuevos = []
+        for resultado in sorted(resultados, key=lambda resultado: resultado['secuencia']):
+            if resultado['secuencia'] <= ultima:
+                # Reenvío de un lote que ya había llegado
+                continue
+            ultima = resultado['secuencia']
+            nuevos.append({'kiosco': kiosco, 'secuencia': ultima,
+                           'nombre': str(resultado['nombre']), 'tiempo': int(resultado['tiempo'])})
+        if not nuevos:
+            return ultima
+
+        # Primero al disco: si se corta la luz, el puesto vuelve a enviar el lote
+        if self._archivo is None:
+            self._archivo = open(self.ruta_registro, 'a')
+        self._archivo.write(''.join(json.dumps(nuevo) + '\n' for nuevo in nuevos))
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+
+        for nuevo in nuevos:
+            jugador = {'nombre': nuevo['nombre'], 'tiempo': nuevo['tiempo']}
+            self.estadisticas.agregar(jugador)
+            self.tiempos[jugador['tiempo']] += 1
+        self.ultimas[kiosco] = ultima
+        return ultima
+
+    def resumen(self, kiosco):
+        """
+        Args:
+            kiosco: Nombre del puesto que lo pide
+
+        Returns:
+            Diccionario con lo necesario para reconstruir las estadísticas en
+            el cliente (ver estadisticas_desde_resumen) y el último número de
+            secuencia recibido del puesto
+        """
+        estadisticas = self.estadisticas
+        return {
+            'ultima': self.ultimas.get(kiosco, 0),
+            'cantidad': estadisticas.cantidad,
+            'suma': estadisticas.suma,
+            'minimo': estadisticas.minimo,
+            'tiempos': sorted(self.tiempos.items()),
+            # La clasificación ya va en las filas; se sigue enviando para
+            # los puestos con una versión anterior del juego
+            'mejores': estadisticas.jugadores.mejores_jugadores(),
+            'jugadores': estadisticas.jugadores.filas()
+        }
+
+    def responder(self, mensaje):
+        """
+        Args:
+            mensaje: Mensaje recibido de un cliente
+
+        Returns:
+            Diccionario con la respuesta
+        """
+        try:
+            tipo = mensaje['tipo']
+            kiosco = str(mensaje['kiosco'])
+            if tipo == 'resultados':
+                return {'ultima': self.agregar_resultados(kiosco, mensaje['resultados'])}
+            if tipo == 'estadisticas':
+                return self.resumen(kiosco)
+            return {'error': f"Mensaje desconocido: {tipo}"}
+        except (KeyError, TypeError, ValueError) as e:
+            return {'error': f"Mensaje no válido: {e}"}
+
+    async def atender(self, lector, escritor):
+        """
+        Atiende la conexión de un cliente hasta que la cierre.
+        """
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                try:
+                    respuesta = self.responder(json.loads(linea))
+                except ValueError:
+                    respuesta = {'error': "El mensaje no es JSON"}
+                escritor.write(json.dumps(respuesta).encode() + b'\n')
+                await escritor.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            escritor.close()
+
+    async def servir(self, anfitrion, puerto):
+        """
+        Arranca el servidor.
+
+        Args:
+            anfitrion: Dirección donde escuchar
+            puerto: Puerto (0 para que el sistema elija uno libre)
+
+        Returns:
+            asyncio.Server: Servidor en marcha
+        """
+        return await asyncio.start_server(self.atender, anfitrion, puerto, limit=LIMITE_MENSAJE)
+
+    def cerrar(self):
+        """
+        Cierra el registro.
+        """
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+class ClienteAgregacion:
+    """
+    Cliente del servidor de agregación que trabaja en un hilo aparte con su
+    propio bucle de asyncio. Envía los resultados por lotes y mantiene las
+    estadísticas de todos los puestos que se muestran en las pantallas.
+    """
+
+    def __init__(self, anfitrion, puerto=PUERTO_AGREGACION, kiosco=None, cantidad_local=0,
+                 leer_locales=None, limites=LIMITES_HISTOGRAMA, intervalo=INTERVALO_SINCRONIZACION):
+        """
+        Args:
+            anfitrion: Dirección del servidor
+            puerto: Puerto del servidor
+            kiosco: Nombre de este puesto (por defecto, el nombre del equipo)
+            cantidad_local: Número de resultados que ya tiene este puesto
+            leer_locales: Función (desde, hasta) que devuelve esos resultados
+                          locales, para enviar los que no tenga el servidor
+            limites: Límites de los rangos del histograma, o "auto"
+            intervalo: Cada cuánto se sincroniza aunque no haya resultados nuevos
+        """
+        self.anfitrion = anfitrion
+        self.puerto = puerto
+        self.kiosco = kiosco or socket.gethostname()
+        self.leer_locales = leer_locales
+        self.limites = limites
+        self.intervalo = intervalo
+        # Estadísticas de todos los puestos, o None hasta la primera sincronización
+        self.estadisticas = None
+        self.conectado = False
+
+        self._cantidad_local = cantidad_local
+        self._siguiente = cantidad_local
+        self._pendientes = []
+        self._al_dia = False
+        self._cantidad_servidor = None
+        # Último resumen del servidor que todavía no se ha aplicado
+        self._resumen_pendiente = None
+        # Protege los pendientes y las estadísticas frente al hilo del juego
+        self._cerrojo = threading.Lock()
+        self._parar = False
+        self._hilo = None
+        self._bucle = None
+        self._despertar = None
+
+    def iniciar(self):
+        """
+        Arranca el hilo del cliente.
+        """
+        self._hilo = threading.Thread(target=asyncio.run, args=(self._principal(),),
+                                      name='cliente-agregacion', daemon=True)
+        self._hilo.start()
+
+    def agregar(self, jugador):
+        """
+        Apunta un resultado nuevo para enviarlo. No espera a la red.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo'
+        """
+        with self._cerrojo:
+            self._siguiente += 1
+            self._pendientes.append({'secuencia': self._siguiente, 'nombre': jugador['nombre'],
+                                     'tiempo': jugador['tiempo']})
+            # El jugador se ve enseguida en las estadísticas de todos los puestos
+            if self.estadisticas is not None:
+                self.estadisticas.agregar(jugador)
+        self._avisar()
+
+    def detener(self, espera=TIEMPO_MAXIMO_SINCRONIZACION):
+        """
+        Intenta enviar los resultados pendientes y para el hilo. Lo que no se
+        pueda enviar se manda la próxima vez que arranque el juego.
+
+        Args:
+            espera: Tiempo máximo que se espera al hilo (segundos)
+        """
+        if self._hilo is None:
+            return
+        self._parar = True
+        self._avisar()
+        self._hilo.join(espera)
+        self._hilo = None
+
+    def _avisar(self):
+        """
+        Despierta al bucle del cliente desde otro hilo.
+        """
+        bucle = self._bucle
+        if bucle is not None:
+            try:
+                bucle.call_soon_threadsafe(self._despertar.set)
+            except RuntimeError:
+                # El bucle ya ha terminado
+                pass
+
+    async def _principal(self):
+        """
+        Bucle del cliente: sincroniza, y espera al siguiente resultado o al intervalo.
+        """
+        self._despertar = asyncio.Event()
+        self._bucle = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._sincronizar(), TIEMPO_MAXIMO_SINCRONIZACION)
+                if not self.conectado:
+                    print(f"Conectado al servidor de resultados {self.anfitrion}:{self.puerto}.")
+                self.conectado = True
+            except (OSError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as e:
+                if self.conectado:
+                    print(f"Sin conexión con el servidor de resultados: {e}")
+                self.conectado = False
+            except Exception as e:
+                # Un fallo inesperado (por ejemplo, un resumen mal formado) no
+                # debe parar el hilo: se avisa y se vuelve a intentar
+                print(f"Error al sincronizar con el servidor de resultados: {e!r}")
+                self.conectado = False
+            if self._parar:
+                return
+
+            try:
+                await asyncio.wait_for(self._despertar.wait(), self.intervalo)
+                # Se juntan en un lote los resultados que lleguen seguidos
+                await asyncio.sleep(ESPERA_LOTE)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+
+    async def _sincronizar(self):
+        """
+        Envía los resultados pendientes y pide las estadísticas de todos los puestos.
+        """
+        lector, escritor = await asyncio.open_connection(self.anfitrion, self.puerto, limit=LIMITE_MENSAJE)
+        try:
+            resumen = await _pedir(lector, escritor, {'tipo': 'estadisticas', 'kiosco': self.kiosco})
+            if not self._al_dia:
+                await self._ponerse_al_dia(resumen['ultima'])
+
+            enviados = False
+            while True:
+                with self._cerrojo:
+                    lote = self._pendientes[:LOTE_MAXIMO]
+                if not lote:
+                    break
+                respuesta = await _pedir(lector, escritor, {'tipo': 'resultados', 'kiosco': self.kiosco,
+                                                            'resultados': lote})
+                with self._cerrojo:
+                    self._pendientes = [pendiente for pendiente in self._pendientes
+                                        if pendiente['secuencia'] > respuesta['ultima']]
+                enviados = True
+            if enviados:
+                resumen = await _pedir(lector, escritor, {'tipo': 'estadisticas', 'kiosco': self.kiosco})
+        finally:
+            escritor.close()
+
+        self._actualizar(resumen)
+
+    async def _ponerse_al_dia(self, ultima):
+        """
+        Al conectar por primera vez, manda los resultados locales que el
+        servidor todavía no tiene (por ejemplo, los de antes de un corte).
+
+        Args:
+            ultima: Último número de secuencia de este puesto que tiene el servidor
+        """
+        if ultima < self._cantidad_local and self.leer_locales is not None:
+            # Se leen del disco en otro hilo para no parar el bucle de asyncio
+            faltan = await asyncio.get_running_loop().run_in_executor(
+                None, self.leer_locales, ultima, self._cantidad_local)
+            with self._cerrojo:
+                self._pendientes[:0] = [{'secuencia': ultima + 1 + i, 'nombre': jugador['nombre'],
+                                         'tiempo': jugador['tiempo']} for i, jugador in enumerate(faltan)]
+        elif ultima > self._cantidad_local:
+            # El servidor tiene más resultados de este puesto que el propio
+            # puesto (se borraron sus archivos): se sigue a partir de ellos
+            desfase = ultima - self._cantidad_local
+            with self._cerrojo:
+                for pendiente in self._pendientes:
+                    pendiente['secuencia'] += desfase
+                self._siguiente += desfase
+        self._al_dia = True
+
+    def _actualizar(self, resumen):
+        """
+        Guarda el resumen del servidor para que el juego lo aplique con
+        actualizar_estadisticas. Reconstruir las estadísticas ocupa el
+        intérprete un buen rato, y en este hilo podría coincidir con una
+        pantalla que está midiendo un tiempo de reacción.
+        """
+        if resumen['cantidad'] == self._cantidad_servidor:
+            # Nada nuevo: las estadísticas actuales ya tienen los resultados propios
+            return
+        with self._cerrojo:
+            self._resumen_pendiente = resumen
+            self._cantidad_servidor = resumen['cantidad']
+
+    def actualizar_estadisticas(self):
+        """
+        Sustituye las estadísticas de todos los puestos por las del último
+        resumen del servidor, más los resultados propios que todavía no le
+        han llegado. El juego lo llama en las pantallas que no miden tiempos.
+
+        Returns:
+            bool: True si han cambiado las estadísticas
+        """
+        with self._cerrojo:
+            resumen = self._resumen_pendiente
+            self._resumen_pendiente = None
+        if resumen is None:
+            return False
+
+        try:
+            estadisticas = estadisticas_desde_resumen(resumen, self.limites)
+        except Exception as e:
+            # Un resumen mal formado no debe parar el juego: se espera al siguiente
+            print(f"Resumen del servidor de resultados no válido: {e!r}")
+            with self._cerrojo:
+                self._cantidad_servidor = None
+            return False
+
+        with self._cerrojo:
+            for pendiente in self._pendientes:
+                if pendiente['secuencia'] > resumen['ultima']:
+                    estadisticas.agregar({'nombre': pendiente['nombre'], 'tiempo': pendiente['tiempo']})
+            self.estadisticas = estadisticas
+        return True
+
+def main():
+    """
+    Arranca el servidor de agregación.
+    """
+    parser = argparse.ArgumentParser(description="Servidor de resultados compartidos del Juego de Reflejos")
+    parser.add_argument('--anfitrion', default='0.0.0.0', help="Dirección donde escuchar")
+    parser.add_argument('--puerto', type=int, default=PUERTO_AGREGACION, help="Puerto donde escuchar")
+    parser.add_argument('--registro', default='global.jsonl', help="Archivo donde se guardan los resultados")
+    argumentos = parser.parse_args()
+
+    servidor = ServidorAgregacion(argumentos.registro)
+    print(f"{servidor.estadisticas.cantidad} resultados de {len(servidor.ultimas)} puestos.")
+
+    async def servir():
+        en_marcha = await servidor.servir(argumentos.anfitrion, argumentos.puerto)
+        print(f"Escuchando en {argumentos.anfitrion}:{argumentos.puerto}")
+        async with en_marcha:
+            await en_marcha.serve_forever()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén en memoria de los datos de los jugadores.
+
+Los datos se leen del disco una sola vez por proceso y todas las pantallas
+comparten la misma copia. Solo se vuelven a leer si otro programa cambia los
+archivos (se comprueba la fecha de modificación), nunca durante una partida.
+"""
+
+from estadisticas import Estadisticas
+from histograma import LIMITES_HISTOGRAMA, limites_automaticos
+from registro import firma_archivos
+
+class AlmacenJugadores:
+    """
+    Datos y estadísticas de todos los jugadores, compartidos por todo el juego.
+    """
+
+    def __init__(self, registro, limites=LIMITES_HISTOGRAMA):
+        """
+        Args:
+            registro: RegistroResultados o RegistroSQLite donde se guardan los resultados
+            limites: Límites de los rangos del histograma, o "auto" para
+                     calcularlos a partir de los datos cada vez que se cargan
+        """
+        self.registro = registro
+        self.limites = limites
+        self._datos = None
+        self._estadisticas = None
+        self._firma = None
+
+    def _firma_archivos(self):
+        """
+        Returns:
+            Tupla con la fecha de modificación y el tamaño de cada archivo
+        """
+        return firma_archivos(self.registro.ruta_datos, self.registro.ruta_registro)
+
+    def _cargar(self):
+        """
+        Lee los datos del disco y recalcula las estadísticas.
+        """
+        consultar = getattr(self.registro, 'consultar_estadisticas', None)
+        if consultar is not None:
+            # El registro calcula las estadísticas sin traer todas las filas
+            self._datos = None
+            self._estadisticas = consultar(limites=self.limites)
+        else:
+            self._datos = self.registro.cargar()
+            limites = self.limites
+            if limites == 'auto':
+                limites = limites_automaticos([jugador['tiempo'] for jugador in self._datos['jugadores']])
+            self._estadisticas = Estadisticas.desde_datos(self._datos, limites=limites)
+        self._firma = self._firma_archivos()
+
+    @property
+    def datos(self):
+        """
+        Diccionario con los datos de los jugadores (se carga la primera vez).
+        """
+        if self._estadisticas is None:
+            self._cargar()
+        if self._datos is None:
+            self._datos = self.registro.cargar()
+        return self._datos
+
+    @property
+    def estadisticas(self):
+        """
+        Estadísticas de todos los jugadores (se calculan la primera vez).
+        """
+        if self._estadisticas is None:
+            self._cargar()
+        return self._estadisticas
+
+    def comprobar_cambios(self):
+        """
+        Vuelve a cargar los datos si otro programa ha modificado los archivos.
+        No se debe llamar desde las pantallas cronometradas.
+
+        Returns:
+            bool: True si los datos se han vuelto a cargar
+        """
+        # Con el escritor en segundo plano los archivos cambian después de
+        # agregar: esos cambios propios tampoco obligan a recargar
+        firma_escrita = getattr(self.registro, 'firma_escrita', None)
+        firma_propia = firma_escrita() if firma_escrita is not None else None
+
+        firma = self._firma_archivos()
+        if self._estadisticas is not None and firma in (self._firma, firma_propia):
+            self._firma = firma
+            return False
+        self._cargar()
+        return True
+
+    def agregar(self, jugador):
+        """
+        Añade el resultado de un jugador a la memoria y al registro en disco.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo'
+        """
+        estadisticas = self.estadisticas
+        if self._datos is not None:
+            self._datos['jugadores'].append(jugador)
+        if self.registro.agregar(jugador):
+            self.registro.compactar(self.datos)
+        estadisticas.agregar(jugador)
+
+        # Los cambios propios no invalidan los datos en memoria
+        self._firma = self._firma_archivos()
@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+"""
+Análisis de los archivos de resultados de uno o varios puestos.
+
+Recorre los archivos una sola vez, sin cargarlos enteros en memoria, y
+calcula la cantidad de resultados, la media, el mínimo, el máximo, el
+histograma y percentiles aproximados (con un t-digest, ver cuantiles.py).
+La memoria no crece con el número de resultados.
+
+Entiende todos los formatos del juego: la instantánea jugadores.json con su
+registro jugadores.jsonl, la base de datos SQLite, el archivo binario y el
+registro del servidor de agregación (global.jsonl). También se le puede dar
+la carpeta de un puesto, y se usa su almacén más reciente.
+
+Los datos repetidos se cuentan una sola vez:
+- las entradas del registro que ya están en la instantánea;
+- los archivos con los mismos resultados (copias, o el mismo puesto en dos
+  formatos) y los jugadores.json que se importaron a una base de datos o a
+  un archivo binario de la misma carpeta;
+- los resultados del servidor de agregación que ya estaban en otro de sus
+  registros (cada puesto numera sus resultados).
+No se deben mezclar los registros del servidor con los archivos de los
+puestos que le envían resultados: serían los mismos resultados dos veces.
+
+Ejemplos:
+
+    python3 analisis.py puesto1/ puesto2/ copia/jugadores.json
+    python3 analisis.py global.jsonl --limites auto --csv histograma.csv
+    python3 analisis.py puesto1/ --guardar puesto1.resumen.json
+    python3 analisis.py puesto1.resumen.json puesto2.resumen.json
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from array import array
+from collections import Counter
+
+from cuantiles import COMPRESION, TDigest
+from estadisticas import TIEMPO_MAXIMO_INDICE
+from histograma import etiquetas_rangos, leer_limites, limites_automaticos_conteos, numpy
+from registro_binario import RegistroBinario
+
+# Archivos que usa juego.py dentro de la carpeta de un puesto, del más nuevo
+# al más antiguo (los nuevos se importan de jugadores.json)
+ARCHIVO_BINARIO = 'jugadores.bin'
+ARCHIVO_SQLITE = 'jugadores.sqlite3'
+ARCHIVO_JUGADORES = 'jugadores.json'
+
+# Terminación de los resúmenes guardados con --guardar
+SUFIJO_RESUMEN = '.resumen.json'
+
+# Número de resultados que se procesan de una vez
+TAMANO_BLOQUE = 10000
+
+# Caracteres que se leen de cada vez de un archivo JSON
+TAMANO_LECTURA = 1 << 16
+
+# Percentiles del informe
+PERCENTILES_INFORME = [1, 5, 25, 50, 75, 90, 95, 99]
+
+class ResumenTiempos:
+    """
+    Resumen de un conjunto de tiempos que ocupa siempre lo mismo: cantidad,
+    suma, extremos, conteo por milisegundo (para el histograma) y t-digest
+    (para los percentiles). Dos resúmenes se pueden combinar.
+    """
+
+    def __init__(self, compresion=COMPRESION):
+        """
+        Args:
+            compresion: Compresión del t-digest
+        """
+        self.cantidad = 0
+        self.suma = 0
+        self.minimo = None
+        self.maximo = None
+        # Conteo por milisegundo; el último cuenta los tiempos de TIEMPO_MAXIMO_INDICE o más
+        self.conteos_por_tiempo = [0] * (TIEMPO_MAXIMO_INDICE + 1)
+        self.digest = TDigest(compresion)
+
+    def agregar_bloque(self, tiempos):
+        """
+        Añade un bloque de tiempos. Los tiempos son milisegundos enteros, así
+        que se agrupan los repetidos antes de pasarlos al t-digest.
+
+        Args:
+            tiempos: Lista o array de NumPy con tiempos en milisegundos
+        """
+        if len(tiempos) == 0:
+            return
+        if numpy is not None:
+            valores, veces = numpy.unique(numpy.asarray(tiempos, dtype=numpy.int64), return_counts=True)
+            repetidos = zip(valores.tolist(), veces.tolist())
+        else:
+            repetidos = sorted(Counter(tiempos).items())
+
+        for tiempo, veces in repetidos:
+            self.cantidad += veces
+            self.suma += tiempo * veces
+            self.conteos_por_tiempo[min(max(tiempo, 0), TIEMPO_MAXIMO_INDICE)] += veces
+            self.digest.agregar(tiempo, veces)
+        if self.minimo is None or self.digest.minimo < self.minimo:
+            self.minimo = self.digest.minimo
+        if self.maximo is None or self.digest.maximo > self.maximo:
+            self.maximo = self.digest.maximo
+
+    def combinar(self, otro):
+        """
+        Añade a este resumen los tiempos de otro.
+
+        Args:
+            otro: ResumenTiempos que se junta con este
+        """
+        if not otro.cantidad:
+            return
+        self.cantidad += otro.cantidad
+        self.suma += otro.suma
+        self.conteos_por_tiempo = [a + b for a, b in zip(self.conteos_por_tiempo, otro.conteos_por_tiempo)]
+        self.digest.combinar(otro.digest)
+        self.minimo = self.digest.minimo
+        self.maximo = self.digest.maximo
+
+    def media(self):
+        """
+        Returns:
+            Tiempo medio en milisegundos, o 0 si no hay tiempos
+        """
+        if not self.cantidad:
+            return 0
+        return self.suma / self.cantidad
+
+    def histograma(self, limites):
+        """
+        Args:
+            limites: Límites de los rangos, o "auto" para calcularlos con los tiempos
+
+        Returns:
+            Tupla (límites, conteos) con los conteos en el formato de
+            histograma.contar_por_rangos
+        """
+        conteos_por_tiempo = {tiempo: cantidad for tiempo, cantidad in enumerate(self.conteos_por_tiempo)
+                              if cantidad}
+        if limites == 'auto':
+            limites = limites_automaticos_conteos(conteos_por_tiempo)
+        conteos = [0] * (len(limites) + 1)
+        rango = 0
+        for tiempo, cantidad in sorted(conteos_por_tiempo.items()):
+            while rango < len(limites) and tiempo >= limites[rango]:
+                rango += 1
+            conteos[rango] += cantidad
+        return limites, conteos
+
+    def a_diccionario(self):
+        """
+        Returns:
+            Diccionario que se puede guardar en JSON (ver desde_diccionario)
+        """
+        return {'cantidad': self.cantidad, 'suma': self.suma, 'minimo': self.minimo, 'maximo': self.maximo,
+                'conteos_por_tiempo': {str(tiempo): cantidad for tiempo, cantidad
+                                       in enumerate(self.conteos_por_tiempo) if cantidad},
+                'digest': self.digest.a_diccionario()}
+
+    @classmethod
+    def desde_diccionario(cls, datos):
+        """
+        Reconstruye un resumen guardado con a_diccionario.
+        """
+        resumen = cls(datos['digest']['compresion'])
+        resumen.cantidad = datos['cantidad']
+        resumen.suma = datos['suma']
+        resumen.minimo = datos['minimo']
+        resumen.maximo = datos['maximo']
+        for tiempo, cantidad in datos['conteos_por_tiempo'].items():
+            resumen.conteos_por_tiempo[int(tiempo)] = cantidad
+        resumen.digest = TDigest.desde_diccionario(datos['digest'])
+        return resumen
+
+class _LectorJSON:
+    """
+    Lee un archivo JSON por trozos, valor a valor, sin cargarlo entero.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.texto = ''
+        self.posicion = 0
+        self.terminado = False
+        self.decodificador = json.JSONDecoder()
+
+    def _leer_mas(self):
+        """
+        Returns:
+            bool: False si ya no queda nada por leer
+        """
+        if self.terminado:
+            return False
+        trozo = self.archivo.read(TAMANO_LECTURA)
+        if not trozo:
+            self.terminado = True
+            return False
+        self.texto = self.texto[self.posicion:] + trozo
+        self.posicion = 0
+        return True
+
+    def siguiente_caracter(self, saltar=' \t\r\n'):
+        """
+        Salta los caracteres indicados y devuelve el siguiente, sin consumirlo.
+
+        Returns:
+            str: Siguiente carácter, o '' al final del archivo
+        """
+        while True:
+            while self.posicion < len(self.texto) and self.texto[self.posicion] in saltar:
+                self.posicion += 1
+            if self.posicion < len(self.texto):
+                return self.texto[self.posicion]
+            if not self._leer_mas():
+                return ''
+
+    def consumir(self, esperado):
+        """
+        Consume un carácter que tiene que estar ahí.
+        """
+        if self.siguiente_caracter() != esperado:
+            raise ValueError(f"Se esperaba '{esperado}' en el archivo JSON")
+        self.posicion += 1
+
+    def valor(self):
+        """
+        Lee el siguiente valor JSON completo.
+        """
+        self.siguiente_caracter()
+        while True:
+            try:
+                valor, fin = self.decodificador.raw_decode(self.texto, self.posicion)
+                # Un número al final del trozo puede seguir en el siguiente
+                if fin < len(self.texto) or not self._leer_mas():
+                    self.posicion = fin
+                    return valor
+            except ValueError:
+                if not self._leer_mas():
+                    raise
+
+def leer_instantanea(ruta):
+    """
+    Recorre los jugadores de una instantánea (el antiguo jugadores.json) sin
+    cargarla entera.
+
+    Args:
+        ruta: Archivo de la instantánea
+
+    Returns:
+        Generador de diccionarios con 'nombre' y 'tiempo'. Al terminar
+        devuelve (como valor de retorno del generador) la última secuencia
+        del registro que incluye la instantánea
+    """
+    ultima_secuencia = 0
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        lector = _LectorJSON(archivo)
+        lector.consumir('{')
+        while lector.siguiente_caracter(' \t\r\n,') not in ('}', ''):
+            clave = lector.valor()
+            lector.consumir(':')
+            if clave != 'jugadores':
+                valor = lector.valor()
+                if clave == 'ultima_secuencia':
+                    ultima_secuencia = valor
+                continue
+            lector.consumir('[')
+            while lector.siguiente_caracter(' \t\r\n,') not in (']', ''):
+                yield lector.valor()
+            lector.consumir(']')
+    return ultima_secuencia
+
+def leer_lineas_json(ruta):
+    """
+    Recorre un archivo JSON Lines, saltando las líneas a medio escribir.
+
+    Returns:
+        Generador de diccionarios
+    """
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        for linea in archivo:
+            try:
+                yield json.loads(linea)
+            except ValueError:
+                continue
+
+def es_registro_servidor(ruta):
+    """
+    Returns:
+        bool: True si un archivo JSON Lines es un registro del servidor de agregación
+    """
+    for entrada in leer_lineas_json(ruta):
+        return 'kiosco' in entrada
+    return False
+
+def en_bloques(jugadores, tamano=TAMANO_BLOQUE):
+    """
+    Agrupa los tiempos de una secuencia de jugadores en listas.
+
+    Returns:
+        Generador de listas de tiempos
+    """
+    bloque = []
+    for jugador in jugadores:
+        bloque.append(jugador['tiempo'])
+        if len(bloque) == tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+class Analisis:
+    """
+    Resume varios archivos de resultados, contando los repetidos una sola vez.
+    """
+
+    def __init__(self, compresion=COMPRESION):
+        """
+        Args:
+            compresion: Compresión de los t-digest
+        """
+        self.compresion = compresion
+        self.resumen = ResumenTiempos(compresion)
+        # (ruta, descripción de lo que se ha hecho con ella)
+        self.fuentes = []
+        # Huella de los tiempos de cada fuente ya contada -> ruta
+        self._huellas = {}
+        # Último número de secuencia contado de cada puesto del servidor
+        self._secuencias = {}
+
+    def analizar(self, entradas):
+        """
+        Recorre todas las entradas (archivos o carpetas de puestos).
+
+        Args:
+            entradas: Lista de rutas
+        """
+        fuentes = []
+        for entrada in entradas:
+            fuentes.extend(self._fuentes_de(entrada))
+
+        # Cada archivo una sola vez, y los jugadores.json que se importaron a
+        # otro almacén de la misma carpeta no se cuentan
+        carpetas_importadas = {os.path.dirname(ruta) for tipo, ruta in fuentes if tipo in ('binario', 'sqlite')}
+        vistas = set()
+        for tipo, ruta in sorted(fuentes, key=lambda fuente: fuente[0] != 'resumen'):
+            if ruta in vistas:
+                continue
+            vistas.add(ruta)
+            if (tipo == 'instantanea' and os.path.basename(ruta) == ARCHIVO_JUGADORES
+                    and os.path.dirname(ruta) in carpetas_importadas):
+                self.fuentes.append((ruta, "omitido: importado al almacén de la misma carpeta"))
+                continue
+            self._analizar_fuente(tipo, ruta)
+
+    def _fuentes_de(self, entrada):
+        """
+        Returns:
+            Lista de tuplas (tipo, ruta absoluta) de una entrada
+        """
+        ruta = os.path.realpath(entrada)
+        if os.path.isdir(ruta):
+            for nombre, tipo in ((ARCHIVO_BINARIO, 'binario'), (ARCHIVO_SQLITE, 'sqlite'),
+                                 (ARCHIVO_JUGADORES, 'instantanea')):
+                if os.path.exists(os.path.join(ruta, nombre)):
+                    return [(tipo, os.path.join(ruta, nombre))]
+            if os.path.exists(os.path.join(ruta, 'jugadores.jsonl')):
+                return [('instantanea', os.path.join(ruta, ARCHIVO_JUGADORES))]
+            self.fuentes.append((ruta, "omitido: no hay resultados en la carpeta"))
+            return []
+
+        if ruta.endswith(SUFIJO_RESUMEN):
+            return [('resumen', ruta)]
+        base, extension = os.path.splitext(ruta)
+        if extension == '.bin':
+            return [('binario', ruta)]
+        if extension in ('.sqlite3', '.sqlite', '.db'):
+            return [('sqlite', ruta)]
+        if extension == '.jsonl':
+            if es_registro_servidor(ruta):
+                return [('servidor', ruta)]
+            # El registro va siempre con su instantánea (aunque no exista)
+            return [('instantanea', base + '.json')]
+        return [('instantanea', ruta)]
+
+    def _analizar_fuente(self, tipo, ruta):
+        """
+        Resume una fuente por separado y la junta con las demás si no está repetida.
+        """
+        if tipo == 'resumen':
+            # Se lee entero antes de juntar nada, por si el archivo está estropeado
+            try:
+                with open(ruta, 'r') as archivo:
+                    datos = json.load(archivo)
+                guardado = ResumenTiempos.desde_diccionario(datos['resumen'])
+                huellas = list(datos.get('huellas', []))
+                secuencias = {kiosco: int(secuencia) for kiosco, secuencia in datos.get('secuencias', {}).items()}
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                self.fuentes.append((ruta, f"error: {e}"))
+                return
+            self.resumen.combinar(guardado)
+            for huella in huellas:
+                self._huellas.setdefault(huella, ruta)
+            for kiosco, secuencia in secuencias.items():
+                self._secuencias[kiosco] = max(self._secuencias.get(kiosco, 0), secuencia)
+            self.fuentes.append((ruta, f"resumen guardado con {guardado.cantidad} resultados"))
+            return
+
+        resumen = ResumenTiempos(self.compresion)
+        huella = hashlib.blake2b(digest_size=16)
+        secuencias = dict(self._secuencias)
+        try:
+            for bloque in self._bloques(tipo, ruta, secuencias):
+                resumen.agregar_bloque(bloque)
+                if numpy is not None:
+                    huella.update(numpy.asarray(bloque, dtype='<i4').tobytes())
+                else:
+                    enteros = array('i', bloque)
+                    if sys.byteorder == 'big':
+                        enteros.byteswap()
+                    huella.update(enteros.tobytes())
+        except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            self.fuentes.append((ruta, f"error: {e}"))
+            return
+
+        huella.update(str(resumen.cantidad).encode())
+        clave = huella.hexdigest()
+        if resumen.cantidad and clave in self._huellas:
+            self.fuentes.append((ruta, f"repetido: mismos resultados que {self._huellas[clave]}"))
+            return
+        self._huellas[clave] = ruta
+        self._secuencias = secuencias
+        self.resumen.combinar(resumen)
+        self.fuentes.append((ruta, f"{resumen.cantidad} resultados"))
+
+    def _bloques(self, tipo, ruta, secuencias):
+        """
+        Recorre los tiempos de una fuente por bloques.
+
+        Args:
+            tipo: 'instantanea', 'servidor', 'sqlite' o 'binario'
+            ruta: Archivo de la fuente
+            secuencias: Última secuencia contada de cada puesto (se actualiza)
+
+        Returns:
+            Generador de bloques de tiempos
+        """
+        if tipo == 'binario':
+            # RegistroBinario crearía el archivo si no existe
+            if not os.path.exists(ruta):
+                raise OSError(f"No existe {ruta}")
+            yield from RegistroBinario(ruta, os.path.splitext(ruta)[0] + '.nombres').tiempos_por_bloques()
+        elif tipo == 'sqlite':
+            # Solo lectura: así no se crea ni se migra nada
+            conexion = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+            try:
+                cursor = conexion.execute("SELECT tiempo FROM jugadores ORDER BY id")
+                while True:
+                    filas = cursor.fetchmany(TAMANO_BLOQUE)
+                    if not filas:
+                        break
+                    yield [tiempo for tiempo, in filas]
+            finally:
+                conexion.close()
+        elif tipo == 'servidor':
+            def nuevos():
+                for entrada in leer_lineas_json(ruta):
+                    kiosco = entrada['kiosco']
+                    if entrada['secuencia'] > secuencias.get(kiosco, 0):
+                        secuencias[kiosco] = entrada['secuencia']
+                        yield entrada
+            yield from en_bloques(nuevos())
+        else:
+            yield from en_bloques(self._jugadores_almacen_json(ruta))
+
+    def _jugadores_almacen_json(self, ruta):
+        """
+        Recorre la instantánea y después las entradas de su registro que no
+        estaban en ella, como RegistroResultados.cargar.
+
+        Returns:
+            Generador de diccionarios con 'nombre' y 'tiempo'
+        """
+        ultima_secuencia = 0
+        if os.path.exists(ruta):
+            ultima_secuencia = yield from leer_instantanea(ruta)
+        ruta_registro = os.path.splitext(ruta)[0] + '.jsonl'
+        if os.path.exists(ruta_registro):
+            for entrada in leer_lineas_json(ruta_registro):
+                if entrada['seq'] > ultima_secuencia:
+                    yield entrada
+        elif not os.path.exists(ruta):
+            raise OSError(f"No existe {ruta}")
+
+    def guardar(self, ruta):
+        """
+        Guarda el resumen para juntarlo más adelante con otros.
+
+        Args:
+            ruta: Archivo donde guardarlo (conviene que termine en .resumen.json)
+        """
+        datos = {'resumen': self.resumen.a_diccionario(), 'huellas': sorted(self._huellas),
+                 'secuencias': self._secuencias}
+        with open(ruta, 'w') as archivo:
+            json.dump(datos, archivo)
+
+    def informe(self, limites, porcentajes=PERCENTILES_INFORME):
+        """
+        Returns:
+            Diccionario con la cantidad, la media, los extremos, los percentiles y el histograma
+        """
+        resumen = self.resumen
+        limites, conteos = resumen.histograma(limites)
+        return {
+            'cantidad': resumen.cantidad,
+            'media': resumen.media(),
+            'minimo': resumen.minimo,
+            'maximo': resumen.maximo,
+            'percentiles': {str(porcentaje): resumen.digest.percentil(porcentaje) for porcentaje in porcentajes},
+            'histograma': [{'rango': etiqueta, 'jugadores': cantidad}
+                           for etiqueta, cantidad in zip(etiquetas_rangos(limites), conteos)],
+            'fuentes': [{'ruta': ruta, 'resultado': resultado} for ruta, resultado in self.fuentes]
+        }
+
+def mostrar_informe(informe):
+    """
+    Escribe el informe en la consola.
+    """
+    for fuente in informe['fuentes']:
+        print(f"{fuente['ruta']}: {fuente['resultado']}")
+    print()
+    if not informe['cantidad']:
+        print("No hay resultados.")
+        return
+    print(f"Resultados: {informe['cantidad']}")
+    print(f"Media: {informe['media']:.1f} ms  Mínimo: {informe['minimo']} ms  Máximo: {informe['maximo']} ms")
+    print("Percentiles (aproximados): " +
+          "  ".join(f"p{porcentaje} {valor:.0f}" for porcentaje, valor in informe['percentiles'].items()) + " ms")
+    print()
+    mayor = max(rango['jugadores'] for rango in informe['histograma'])
+    for rango in informe['histograma']:
+        barra = '#' * round(40 * rango['jugadores'] / mayor) if mayor else ''
+        print(f"{rango['rango']:>10} ms {rango['jugadores']:>8}  {barra}")
+
+def main():
+    """
+    Analiza los archivos indicados en la línea de órdenes.
+    """
+    parser = argparse.ArgumentParser(description="Análisis de los resultados del Juego de Reflejos")
+    parser.add_argument('entradas', nargs='+',
+                        help="Archivos de resultados, carpetas de puestos o resúmenes guardados")
+    parser.add_argument('--limites', default=None,
+                        help="Límites del histograma separados por comas, o \"auto\"")
+    parser.add_argument('--compresion', type=int, default=COMPRESION,
+                        help="Compresión del t-digest (más es más preciso)")
+    parser.add_argument('--json', action='store_true', help="Escribir el informe en JSON")
+    parser.add_argument('--csv', help="Guardar el histograma en un archivo CSV (para hacer gráficas)")
+    parser.add_argument('--guardar', help=f"Guardar el resumen para juntarlo después (terminado en {SUFIJO_RESUMEN})")
+    argumentos = parser.parse_args()
+    try:
+        limites = leer_limites(argumentos.limites)
+    except ValueError as e:
+        parser.error(f"--limites no es válido: {e}")
+
+    analisis = Analisis(argumentos.compresion)
+    analisis.analizar(argumentos.entradas)
+    informe = analisis.informe(limites)
+
+    if argumentos.json:
+        print(json.dumps(informe, indent=2, ensure_ascii=False))
+    else:
+        mostrar_informe(informe)
+    if argumentos.csv:
+        with open(argumentos.csv, 'w', newline='') as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(['rango', 'jugadores'])
+            escritor.writerows((rango['rango'], rango['jugadores']) for rango in informe['histograma'])
+    if argumentos.guardar:
+        analisis.guardar(argumentos.guardar)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de rendimiento del Juego de Reflejos.
+
+Mide, sin abrir ninguna ventana (SDL_VIDEODRIVER=dummy), cuánto cuesta mostrar
+las pantallas del juego y el histograma, cuánta CPU gasta la pantalla de
+bienvenida en reposo, y cuánto tardan la carga, el guardado y las estadísticas
+con conjuntos de jugadores inventados.
+
+Los resultados se guardan en JSON para compararlos entre versiones:
+
+    python3 benchmark.py --salida antes.json
+    python3 benchmark.py --salida despues.json --comparar antes.json
+"""
+
+import os
+
+# Sin pantalla real: hay que configurarlo antes de importar pygame
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import pygame
+
+import juego
+from almacen import AlmacenJugadores
+from estadisticas import Estadisticas
+from registro import RegistroResultados
+from registro_binario import RegistroBinario
+
+# Tamaños de los conjuntos de jugadores inventados
+TAMANOS = [1000, 100000, 1000000]
+
+# Segundos que se deja la pantalla de bienvenida en reposo
+SEGUNDOS_REPOSO = 2
+
+# Porcentaje a partir del cual una diferencia se considera una regresión
+UMBRAL_REGRESION = 10
+
+def resumir(duraciones):
+    """
+    Resume una lista de duraciones en milisegundos.
+
+    Args:
+        duraciones: Lista de duraciones (ms)
+
+    Returns:
+        Diccionario con la mediana, el percentil 95, el mínimo y el número de muestras
+    """
+    ordenadas = sorted(duraciones)
+    return {
+        'mediana_ms': round(statistics.median(ordenadas), 4),
+        'p95_ms': round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))], 4),
+        'min_ms': round(ordenadas[0], 4),
+        'repeticiones': len(ordenadas)
+    }
+
+def cronometrar(funcion, repeticiones):
+    """
+    Ejecuta una función varias veces y mide cada ejecución.
+
+    Returns:
+        Lista de duraciones en milisegundos
+    """
+    duraciones = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        duraciones.append((time.perf_counter() - inicio) * 1000)
+    return duraciones
+
+def jugadores_inventados(cantidad, semilla=2025):
+    """
+    Genera datos de jugadores con tiempos parecidos a los reales.
+
+    Returns:
+        Diccionario con el mismo formato que jugadores.json
+    """
+    aleatorio = random.Random(semilla)
+    return {'jugadores': [
+        {'nombre': f"Jugador {i}", 'tiempo': int(aleatorio.gauss(280, 60)) if i % 50 else aleatorio.randint(100, 900)}
+        for i in range(cantidad)
+    ]}
+
+def tecla(codigo, caracter=''):
+    """
+    Returns:
+        Evento de pulsación de una tecla
+    """
+    return pygame.event.Event(pygame.KEYDOWN, key=codigo, unicode=caracter)
+
+def con_eventos(pantalla, eventos, *args):
+    """
+    Prepara una pantalla de reposo para medirla: los eventos se envían antes
+    de llamarla, así la pantalla los atiende y termina sin esperar a nadie.
+
+    Args:
+        pantalla: Función de la pantalla (pantalla_bienvenida, ...)
+        eventos: Lista de eventos; el último debe hacer que la pantalla termine
+        args: Argumentos de la pantalla
+
+    Returns:
+        Función sin argumentos que muestra la pantalla
+    """
+    def mostrar():
+        for evento in eventos:
+            pygame.event.post(evento)
+        pantalla(*args)
+    return mostrar
+
+def medir_reposo(segundos):
+    """
+    Deja la pantalla de bienvenida esperando, sin que nadie pulse nada, y
+    mide la CPU que gasta.
+
+    Args:
+        segundos: Tiempo que se deja la pantalla en reposo
+
+    Returns:
+        float: Milisegundos de CPU por cada segundo en reposo
+    """
+    pygame.event.post(tecla(pygame.K_a, 'a'))
+    pygame.time.set_timer(tecla(pygame.K_RETURN), int(segundos * 1000), 1)
+    inicio_cpu = time.process_time()
+    inicio = time.perf_counter()
+    juego.pantalla_bienvenida()
+    return (time.process_time() - inicio_cpu) * 1000 / (time.perf_counter() - inicio)
+
+def medir_pantallas(repeticiones):
+    """
+    Mide el coste por fotograma de cada pantalla y del histograma con los
+    datos del registro actual.
+
+    Args:
+        repeticiones: Veces que se repiten las medidas sin bucle
+
+    Returns:
+        Diccionario con los resultados de cada medida
+    """
+    juego.almacen = AlmacenJugadores(juego.registro)
+    estadisticas = juego.obtener_estadisticas()
+
+    nombre = [tecla(pygame.K_a, 'a'), tecla(pygame.K_RETURN)]
+    fin_perdida = pygame.event.Event(juego.EVENTO_FIN_PANTALLA)
+
+    resultados = {}
+    resultados['pantalla_bienvenida.mostrar'] = resumir(
+        cronometrar(con_eventos(juego.pantalla_bienvenida, nombre), repeticiones))
+    resultados['pantalla_bienvenida.cpu_ms_por_segundo_en_reposo'] = resumir([medir_reposo(SEGUNDOS_REPOSO)])
+    resultados['pantalla_perdida.mostrar'] = resumir(
+        cronometrar(con_eventos(juego.pantalla_perdida, [fin_perdida]), repeticiones))
+    resultados['pantalla_resultados.mostrar'] = resumir(
+        cronometrar(con_eventos(juego.pantalla_resultados, [tecla(pygame.K_SPACE, ' ')], "Prueba", None), repeticiones))
+
+    # Las pantallas de espera y de reacción no tienen bucle de dibujo: se mide
+    # lo que tardan en preparar y mostrar su único fotograma
+    escena = juego.nueva_superficie((juego.ANCHO, juego.ALTO))
+    uniform_original = juego.random.uniform
+    juego.random.uniform = lambda a, b: 0
+    try:
+        resultados['pantalla_espera.preparacion'] = resumir(
+            cronometrar(lambda: juego.pantalla_espera(escena), repeticiones))
+    finally:
+        juego.random.uniform = uniform_original
+
+    def reaccion_inmediata():
+        pygame.event.post(tecla(pygame.K_SPACE, ' '))
+        juego.pantalla_reaccion(escena)
+    resultados['pantalla_reaccion.presentacion'] = resumir(cronometrar(reaccion_inmediata, repeticiones))
+
+    resultados['dibujar_histograma'] = resumir(
+        cronometrar(lambda: juego.dibujar_histograma(estadisticas), repeticiones))
+    panel = juego.nueva_superficie((juego.ANCHO - juego.X_PANEL_HISTOGRAMA, juego.ALTO))
+    resultados['dibujar_panel_histograma'] = resumir(
+        cronometrar(lambda: juego.dibujar_panel_histograma(estadisticas, panel), repeticiones))
+    return resultados
+
+def medir_datos(cantidad, directorio, repeticiones):
+    """
+    Mide la carga, el guardado y las estadísticas con un conjunto inventado.
+
+    Args:
+        cantidad: Número de jugadores inventados
+        directorio: Carpeta temporal donde se escriben los archivos
+        repeticiones: Veces que se repite cada medida
+
+    Returns:
+        Diccionario con los resultados de cada medida
+    """
+    datos = jugadores_inventados(cantidad)
+    prefijo = os.path.join(directorio, f"jugadores_{cantidad}")
+    juego.registro = RegistroResultados(prefijo + '.json', prefijo + '.jsonl')
+
+    # Las medidas lentas se repiten menos con conjuntos grandes
+    veces = max(1, repeticiones if cantidad <= 100000 else repeticiones // 5)
+
+    resultados = {}
+    resultados['guardar_datos'] = resumir(cronometrar(lambda: juego.guardar_datos(datos), veces))
+    resultados['cargar_datos'] = resumir(cronometrar(juego.cargar_datos, veces))
+
+    contador = itertools.count()
+    resultados['registro.agregar'] = resumir(cronometrar(
+        lambda: juego.registro.agregar({'nombre': "Nuevo", 'tiempo': 200 + next(contador) % 200}), repeticiones))
+    juego.registro.cerrar()
+
+    resultados['Estadisticas.desde_datos'] = resumir(
+        cronometrar(lambda: Estadisticas.desde_datos(datos), veces))
+    # Las mismas estadísticas leyendo el archivo binario, sin la lista de jugadores
+    binario = RegistroBinario(prefijo + '.bin', prefijo + '.nombres')
+    binario.compactar(datos)
+    resultados['RegistroBinario.consultar_estadisticas'] = resumir(
+        cronometrar(binario.consultar_estadisticas, veces))
+    estadisticas = Estadisticas.desde_datos(datos)
+    resultados['Estadisticas.agregar'] = resumir(cronometrar(
+        lambda: estadisticas.agregar({'nombre': "Nuevo", 'tiempo': 250}), repeticiones))
+    resultados['obtener_mejores_jugadores'] = resumir(
+        cronometrar(lambda: juego.obtener_mejores_jugadores(datos), veces))
+    resultados['calcular_media'] = resumir(cronometrar(lambda: juego.calcular_media(datos), veces))
+    resultados['obtener_mejor_tiempo'] = resumir(cronometrar(lambda: juego.obtener_mejor_tiempo(datos), veces))
+    resultados['generar_datos_histograma'] = resumir(
+        cronometrar(lambda: juego.generar_datos_histograma(datos), veces))
+
+    resultados.update(medir_pantallas(repeticiones))
+    return resultados
+
+def comparar(actual, anterior):
+    """
+    Muestra las medidas que han empeorado respecto a un resultado anterior.
+
+    Args:
+        actual: Resultados de esta ejecución
+        anterior: Resultados cargados de un archivo anterior
+
+    Returns:
+        int: Número de regresiones encontradas
+    """
+    regresiones = 0
+    for tamano, medidas in actual['resultados'].items():
+        for nombre, medida in medidas.items():
+            previa = anterior.get('resultados', {}).get(tamano, {}).get(nombre)
+            if not previa or not previa['mediana_ms']:
+                continue
+            cambio = (medida['mediana_ms'] - previa['mediana_ms']) / previa['mediana_ms'] * 100
+            if cambio > UMBRAL_REGRESION:
+                regresiones += 1
+                print(f"REGRESIÓN {tamano} {nombre}: {previa['mediana_ms']} ms -> {medida['mediana_ms']} ms (+{cambio:.0f}%)")
+    return regresiones
+
+def main():
+    """
+    Ejecuta todas las medidas y guarda los resultados.
+    """
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento del Juego de Reflejos")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS,
+                        help="Número de jugadores de cada conjunto inventado")
+    parser.add_argument('--repeticiones', type=int, default=20,
+                        help="Veces que se repite cada medida")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    parser.add_argument('--comparar', help="Archivo JSON de una ejecución anterior")
+    argumentos = parser.parse_args()
+
+    juego.iniciar_pantalla()
+
+    resultados = {
+        'version': 1,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'plataforma': platform.platform(),
+        'maquina': platform.machine(),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'resolucion': [juego.ANCHO, juego.ALTO],
+        'resultados': {}
+    }
+
+    directorio = tempfile.mkdtemp(prefix='reflejos_benchmark_')
+    # Las rondas de las medidas no deben acabar en la traza del juego
+    juego.traza_rondas.ruta = os.path.join(directorio, 'benchmark.traza')
+    try:
+        for cantidad in argumentos.tamanos:
+            print(f"Midiendo con {cantidad} jugadores...", file=sys.stderr)
+            resultados['resultados'][str(cantidad)] = medir_datos(cantidad, directorio, argumentos.repeticiones)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    # Fotogramas y CPU de cada pantalla durante todas las medidas
+    resultados['consumo'] = juego.consumo_pantallas.pantallas
+
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if argumentos.salida:
+        with open(argumentos.salida, 'w') as archivo:
+            archivo.write(texto)
+    else:
+        print(texto)
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, 'r') as archivo:
+            if comparar(resultados, json.load(archivo)):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
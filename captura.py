@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Captura de las pulsaciones del teclado en un hilo aparte del dibujo.
+
+En Linux (la Raspberry Pi) el hilo lee directamente los dispositivos de
+teclado de /dev/input, así que una pulsación queda apuntada aunque el hilo
+principal esté ocupado dibujando el histograma o esperando un volcado. Si el
+núcleo lo permite, la marca de tiempo es la que pone el propio núcleo al
+recibir la tecla (en el mismo reloj que time.perf_counter_ns); si no, la pone
+el hilo en cuanto la lee. Las pulsaciones se dejan en una cola que las
+pantallas consumen cuando les viene bien, pero solo mientras dura una ronda
+(ver escuchar): fuera de ella se leen y se descartan.
+
+Para leer /dev/input el usuario tiene que estar en el grupo "input" (el
+usuario por defecto de la Raspberry Pi lo está). Si no hay teclados que se
+puedan leer, o en Windows y macOS, la captura queda desactivada y el juego
+sigue leyendo el teclado con pygame como siempre.
+
+Ojo: los dispositivos se leen aunque la ventana del juego no tenga el foco.
+Por eso las teclas que se pulsan fuera de las rondas (el nombre en la
+pantalla de bienvenida, lo que se escriba en otras ventanas) no se guardan.
+"""
+
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no hay /dev/input, la captura queda desactivada
+    fcntl = None
+
+# Lista de dispositivos de entrada del núcleo
+ARCHIVO_DISPOSITIVOS = '/proc/bus/input/devices'
+
+# struct input_event: segundos, microsegundos, tipo, código y valor
+EVENTO = struct.Struct('@llHHi')
+
+# Tipo de evento de las teclas y valor de una pulsación (0 es soltar, 2 repetición)
+EV_KEY = 1
+PULSADA = 1
+
+# Bit de la repetición automática en la máscara EV: la tienen los teclados
+# de verdad y no los botones sueltos (encendido, volumen...)
+EV_REP = 0x14
+
+# ioctl EVIOCSCLOCKID: elige el reloj de las marcas de tiempo del dispositivo
+EVIOCSCLOCKID = 0x400445a0
+CLOCK_MONOTONIC = 1
+
+# Cada cuánto se buscan teclados nuevos (conectados después de empezar)
+INTERVALO_BUSQUEDA = 1.0
+
+# Pulsaciones que caben en la cola. En una ronda solo cuenta la primera, así
+# que si se llena se descartan las nuevas
+CAPACIDAD_COLA = 64
+
+def buscar_teclados(archivo=ARCHIVO_DISPOSITIVOS):
+    """
+    Busca los teclados en la lista de dispositivos de entrada del núcleo.
+
+    Args:
+        archivo: Lista de dispositivos (formato de /proc/bus/input/devices)
+
+    Returns:
+        Lista de rutas /dev/input/eventN de los teclados
+    """
+    try:
+        with open(archivo, 'r') as entrada:
+            bloques = entrada.read().split('\n\n')
+    except OSError:
+        return []
+
+    teclados = []
+    for bloque in bloques:
+        manejadores = []
+        eventos = 0
+        for linea in bloque.splitlines():
+            if linea.startswith('H: Handlers='):
+                manejadores = linea.split('=', 1)[1].split()
+            elif linea.startswith('B: EV='):
+                eventos = int(linea.split('=', 1)[1], 16)
+        if 'kbd' in manejadores and eventos & (1 << EV_REP):
+            teclados.extend('/dev/input/' + nombre for nombre in manejadores if nombre.startswith('event'))
+    return teclados
+
+def reloj_del_nucleo_valido():
+    """
+    Returns:
+        bool: True si perf_counter usa CLOCK_MONOTONIC, el reloj que se puede
+              pedir al núcleo para las marcas de los eventos
+    """
+    return sys.platform.startswith('linux') and 'CLOCK_MONOTONIC' in time.get_clock_info('perf_counter').implementation
+
+class CapturaTeclado:
+    """
+    Hilo que lee las pulsaciones de los teclados y las deja, con su marca de
+    tiempo, en una cola segura entre hilos.
+    """
+
+    def __init__(self, rutas=None):
+        """
+        Args:
+            rutas: Dispositivos que se leen. Si es None se buscan los teclados
+                   (y se siguen buscando por si se conecta alguno más tarde)
+        """
+        self.rutas = rutas
+        self.activa = False
+        # Las pulsaciones solo se guardan mientras es True (ver escuchar)
+        self.escuchando = False
+        # Dispositivos abiertos: descriptor -> (ruta, True si las marcas son del núcleo)
+        self._dispositivos = {}
+        # (marca_ns, código de la tecla)
+        self._cola = queue.Queue(maxsize=CAPACIDAD_COLA)
+        self._parar = threading.Event()
+        self._hilo = None
+        self._ultima_busqueda = 0.0
+
+    def iniciar(self):
+        """
+        Abre los teclados y arranca el hilo de captura.
+
+        Returns:
+            bool: True si hay algún teclado que leer; si no, la captura queda desactivada
+        """
+        if self.activa:
+            return True
+        self._abrir_dispositivos()
+        if not self._dispositivos:
+            return False
+
+        if not all(del_nucleo for _, del_nucleo in self._dispositivos.values()):
+            # La marca la pone el hilo: que no tenga que esperar mucho al
+            # intérprete mientras el hilo principal ejecuta código Python
+            sys.setswitchinterval(0.001)
+
+        self.activa = True
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='captura-teclado', daemon=True)
+        self._hilo.start()
+        return True
+
+    def detener(self):
+        """
+        Para el hilo de captura y cierra los dispositivos. Se puede llamar varias veces.
+        """
+        if not self.activa:
+            return
+        self._parar.set()
+        self._hilo.join()
+        self.activa = False
+        for descriptor in list(self._dispositivos):
+            self._cerrar(descriptor)
+
+    @property
+    def recibiendo(self):
+        """
+        Returns:
+            bool: True si el hilo está leyendo los teclados y guardando las pulsaciones
+        """
+        return self.activa and self.escuchando
+
+    @contextmanager
+    def escuchar(self):
+        """
+        Guarda las pulsaciones mientras dura el bloque with (una ronda del
+        juego). Al empezar y al terminar se vacía la cola, así que nunca
+        quedan teclas de fuera de la ronda.
+        """
+        self._vaciar()
+        self.escuchando = True
+        try:
+            yield self
+        finally:
+            self.escuchando = False
+            self._vaciar()
+
+    def _vaciar(self):
+        """
+        Descarta las pulsaciones de la cola.
+        """
+        while True:
+            try:
+                self._cola.get_nowait()
+            except queue.Empty:
+                return
+
+    def esperar(self, segundos):
+        """
+        Espera la siguiente pulsación.
+
+        Args:
+            segundos: Tiempo máximo de espera
+
+        Returns:
+            Tupla (marca_ns, código) o None si no ha llegado ninguna
+        """
+        try:
+            return self._cola.get(timeout=segundos)
+        except queue.Empty:
+            return None
+
+    def _abrir_dispositivos(self):
+        """
+        Abre los teclados que todavía no están abiertos.
+        """
+        self._ultima_busqueda = time.monotonic()
+        abiertas = {ruta for ruta, _ in self._dispositivos.values()}
+        rutas = buscar_teclados() if self.rutas is None else self.rutas
+        for ruta in rutas:
+            if ruta in abiertas:
+                continue
+            try:
+                descriptor = os.open(ruta, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError:
+                # Sin permiso (fuera del grupo input) o desconectado
+                continue
+            del_nucleo = False
+            if fcntl is not None and reloj_del_nucleo_valido():
+                try:
+                    fcntl.ioctl(descriptor, EVIOCSCLOCKID, struct.pack('i', CLOCK_MONOTONIC))
+                    del_nucleo = True
+                except OSError:
+                    pass
+            self._dispositivos[descriptor] = (ruta, del_nucleo)
+
+    def _cerrar(self, descriptor):
+        """
+        Cierra un dispositivo (por ejemplo, un teclado que se ha desconectado).
+        """
+        del self._dispositivos[descriptor]
+        try:
+            os.close(descriptor)
+        except OSError:
+            pass
+
+    def _bucle(self):
+        """
+        Bucle del hilo: espera a que algún teclado tenga eventos y los lee.
+        """
+        while not self._parar.is_set():
+            if self.rutas is None and time.monotonic() - self._ultima_busqueda >= INTERVALO_BUSQUEDA:
+                self._abrir_dispositivos()
+            try:
+                listos, _, _ = select.select(list(self._dispositivos), [], [], 0.1)
+            except (OSError, ValueError):
+                self._parar.wait(0.1)
+                continue
+            for descriptor in listos:
+                self._leer(descriptor)
+
+    def _leer(self, descriptor):
+        """
+        Lee los eventos pendientes de un dispositivo y encola las pulsaciones.
+        """
+        marca_lectura = time.perf_counter_ns()
+        try:
+            datos = os.read(descriptor, EVENTO.size * 64)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._cerrar(descriptor)
+            return
+
+        if not self.escuchando:
+            # Fuera de una ronda los eventos se leen solo para descartarlos
+            return
+
+        del_nucleo = self._dispositivos[descriptor][1]
+        completos = len(datos) - len(datos) % EVENTO.size
+        for segundos, microsegundos, tipo, codigo, valor in EVENTO.iter_unpack(datos[:completos]):
+            if tipo != EV_KEY or valor != PULSADA:
+                continue
+            if del_nucleo:
+                marca = segundos * 1_000_000_000 + microsegundos * 1000
+            else:
+                marca = marca_lectura
+            try:
+                self._cola.put_nowait((marca, codigo))
+            except queue.Full:
+                pass
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Consumo de cada pantalla del Juego de Reflejos.
+
+Cuenta, para cada pantalla, cuántas veces se ha mostrado, cuántos fotogramas
+ha volcado y cuánto tiempo de CPU ha gastado frente al tiempo real que ha
+estado en pantalla. Sirve para comprobar que las pantallas de reposo (la de
+bienvenida puede quedarse horas esperando) no hacen trabajar a la Raspberry Pi.
+"""
+
+import functools
+import time
+
+class ConsumoPantallas:
+    """
+    Contadores de fotogramas y tiempo de CPU por pantalla.
+    """
+
+    def __init__(self):
+        # nombre -> {'veces', 'fotogramas', 'cpu_s', 'real_s'}
+        self.pantallas = {}
+        # Nombre de la pantalla que se está mostrando (None entre pantallas)
+        self.nombre_actual = None
+        self._actual = None
+        self._inicio_cpu = 0.0
+        self._inicio_real = 0.0
+
+    def empezar(self, nombre):
+        """
+        Empieza a contar el consumo de una pantalla.
+
+        Args:
+            nombre: Nombre de la pantalla
+        """
+        self.terminar()
+        contadores = self.pantallas.setdefault(nombre, {'veces': 0, 'fotogramas': 0, 'cpu_s': 0.0, 'real_s': 0.0})
+        contadores['veces'] += 1
+        self._actual = contadores
+        self.nombre_actual = nombre
+        self._inicio_cpu = time.process_time()
+        self._inicio_real = time.perf_counter()
+
+    def terminar(self):
+        """
+        Deja de contar el consumo de la pantalla actual.
+        """
+        if self._actual is None:
+            return
+        self._actual['cpu_s'] += time.process_time() - self._inicio_cpu
+        self._actual['real_s'] += time.perf_counter() - self._inicio_real
+        self._actual = None
+        self.nombre_actual = None
+
+    def fotograma(self):
+        """
+        Cuenta un volcado de la pantalla actual.
+        """
+        if self._actual is not None:
+            self._actual['fotogramas'] += 1
+
+    def medir(self, nombre):
+        """
+        Decorador que cuenta el consumo de una función de pantalla.
+
+        Args:
+            nombre: Nombre de la pantalla
+
+        Returns:
+            Decorador
+        """
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                self.empezar(nombre)
+                try:
+                    return funcion(*args, **kwargs)
+                finally:
+                    self.terminar()
+            return envoltura
+        return decorador
+
+    def informe(self):
+        """
+        Returns:
+            Lista de líneas de texto con el consumo de cada pantalla
+        """
+        lineas = []
+        for nombre, contadores in self.pantallas.items():
+            real = contadores['real_s']
+            porcentaje = contadores['cpu_s'] / real * 100 if real else 0
+            fps = contadores['fotogramas'] / real if real else 0
+            lineas.append(f"{nombre}: {contadores['veces']} veces, {contadores['fotogramas']} fotogramas "
+                          f"({fps:.1f} por segundo), {contadores['cpu_s']:.2f} s de CPU en {real:.1f} s ({porcentaje:.1f}%)")
+        return lineas
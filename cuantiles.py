@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Percentiles aproximados con memoria acotada (t-digest).
+
+Un t-digest resume cualquier cantidad de tiempos en unos pocos cientos de
+centroides (media y peso), más pequeños en los extremos, donde hace falta más
+precisión para percentiles como el 1 o el 99. Dos resúmenes se pueden juntar
+sin perder precisión, así que se puede resumir cada archivo (o cada puesto)
+por separado y combinarlos después.
+
+Es la versión "merging" del t-digest de Ted Dunning, con la función de
+escala k1.
+"""
+
+import math
+
+# Número de centroides aproximado: más compresión, más precisión y más memoria
+COMPRESION = 100
+
+class TDigest:
+    """
+    Resumen de una distribución para calcular percentiles aproximados.
+    """
+
+    def __init__(self, compresion=COMPRESION):
+        """
+        Args:
+            compresion: Parámetro delta del t-digest
+        """
+        self.compresion = compresion
+        self.total = 0
+        self.minimo = None
+        self.maximo = None
+        # Centroides ordenados por media
+        self._medias = []
+        self._pesos = []
+        # Puntos sin juntar todavía (valor, peso)
+        self._pendientes = []
+        self._limite_pendientes = 20 * compresion
+
+    def agregar(self, valor, peso=1):
+        """
+        Añade un valor (o el mismo valor varias veces, con su peso).
+
+        Args:
+            valor: Valor que se añade
+            peso: Número de veces que aparece
+        """
+        if peso <= 0:
+            return
+        self._pendientes.append((valor, peso))
+        self.total += peso
+        if self.minimo is None or valor < self.minimo:
+            self.minimo = valor
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+        if len(self._pendientes) >= self._limite_pendientes:
+            self._comprimir()
+
+    def combinar(self, otro):
+        """
+        Añade a este resumen todos los valores de otro.
+
+        Args:
+            otro: TDigest que se junta con este
+        """
+        otro._comprimir()
+        for media, peso in zip(otro._medias, otro._pesos):
+            self.agregar(media, peso)
+        # Los extremos del otro son exactos aunque sus centroides no
+        if otro.minimo is not None:
+            self.minimo = otro.minimo if self.minimo is None else min(self.minimo, otro.minimo)
+            self.maximo = otro.maximo if self.maximo is None else max(self.maximo, otro.maximo)
+
+    def _k(self, q):
+        """
+        Función de escala k1: los centroides son más pequeños cerca de 0 y de 1.
+        """
+        return self.compresion / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k):
+        """
+        Inversa de la función de escala.
+        """
+        return (math.sin(k * 2 * math.pi / self.compresion) + 1) / 2
+
+    def _comprimir(self):
+        """
+        Junta los puntos pendientes con los centroides.
+        """
+        if not self._pendientes:
+            return
+        puntos = sorted(list(zip(self._medias, self._pesos)) + self._pendientes)
+        self._pendientes = []
+        total = self.total
+
+        medias = []
+        pesos = []
+        media_actual, peso_actual = puntos[0]
+        acumulado = 0
+        limite = self._q(self._k(0) + 1) * total
+        for media, peso in puntos[1:]:
+            if acumulado + peso_actual + peso <= limite:
+                # Cabe en el centroide actual
+                peso_actual += peso
+                media_actual += (media - media_actual) * peso / peso_actual
+            else:
+                medias.append(media_actual)
+                pesos.append(peso_actual)
+                acumulado += peso_actual
+                limite = self._q(self._k(acumulado / total) + 1) * total
+                media_actual, peso_actual = media, peso
+        medias.append(media_actual)
+        pesos.append(peso_actual)
+        self._medias = medias
+        self._pesos = pesos
+
+    def percentil(self, porcentaje):
+        """
+        Calcula un percentil aproximado.
+
+        Args:
+            porcentaje: Percentil entre 0 y 100
+
+        Returns:
+            float o None: Valor aproximado del percentil, o None si no hay valores
+        """
+        self._comprimir()
+        if not self.total:
+            return None
+        objetivo = min(max(porcentaje / 100, 0), 1) * self.total
+        medias = self._medias
+        pesos = self._pesos
+        if len(medias) == 1:
+            return medias[0]
+
+        # Cada centroide se sitúa en el centro de su peso acumulado
+        centro_anterior = pesos[0] / 2
+        if objetivo < centro_anterior:
+            return self.minimo + (medias[0] - self.minimo) * objetivo / centro_anterior
+        for i in range(1, len(medias)):
+            centro = centro_anterior + (pesos[i - 1] + pesos[i]) / 2
+            if objetivo < centro:
+                fraccion = (objetivo - centro_anterior) / (centro - centro_anterior)
+                return medias[i - 1] + (medias[i] - medias[i - 1]) * fraccion
+            centro_anterior = centro
+        resto = self.total - centro_anterior
+        if resto <= 0:
+            return self.maximo
+        return medias[-1] + (self.maximo - medias[-1]) * (objetivo - centro_anterior) / resto
+
+    def a_diccionario(self):
+        """
+        Returns:
+            Diccionario que se puede guardar en JSON (ver desde_diccionario)
+        """
+        self._comprimir()
+        return {'compresion': self.compresion, 'minimo': self.minimo, 'maximo': self.maximo,
+                'medias': self._medias, 'pesos': self._pesos}
+
+    @classmethod
+    def desde_diccionario(cls, datos):
+        """
+        Reconstruye un resumen guardado con a_diccionario.
+
+        Returns:
+            TDigest: Resumen con los mismos centroides
+        """
+        digest = cls(datos['compresion'])
+        digest._medias = list(datos['medias'])
+        digest._pesos = list(datos['pesos'])
+        digest.total = sum(digest._pesos)
+        digest.minimo = datos['minimo']
+        digest.maximo = datos['maximo']
+        return digest
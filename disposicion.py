@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Disposición de los elementos en las pantallas del juego.
+
+Las medidas de las pantallas están pensadas para una pantalla de 1920x1080
+(la del puesto de la feria) y aquí se escalan al tamaño real, así el
+juego se ve igual en un monitor de 720p, en uno de 4K o en una ventana a la
+que se le cambia el tamaño. Las posiciones se calculan una sola vez para cada
+tamaño de pantalla y cada contenido y se guardan: las pantallas y el
+histograma solo las consultan.
+
+Este módulo no dibuja nada, así que no necesita pygame.
+"""
+
+from collections import OrderedDict
+
+# Tamaño de la pantalla para el que están pensadas todas las medidas
+ANCHO_REFERENCIA = 1920
+ALTO_REFERENCIA = 1080
+
+# Ancho de la línea que separa el juego del histograma (no se escala)
+GROSOR_DIVISION = 2
+
+# Tamaño de cada fuente en la pantalla de referencia
+TAMANOS_FUENTE = {
+    'grande': 72,
+    'mediana': 48,
+    'pequena': 32,
+    'muy_pequena': 24,  # Para los créditos
+}
+
+# Por debajo de este tamaño no se lee nada
+TAMANO_FUENTE_MINIMO = 12
+
+# Número de marcas del eje Y del histograma
+NUMERO_MARCAS_Y = 5
+
+# Columnas y tamaños de pantalla que se guardan ya calculados
+CAPACIDAD_COLUMNAS = 64
+CAPACIDAD_DISPOSICIONES = 4
+
+def _guardar(cache, clave, valor, capacidad):
+    """
+    Guarda un valor en una caché OrderedDict, descartando el más antiguo si se llena.
+    """
+    cache[clave] = valor
+    if len(cache) > capacidad:
+        cache.popitem(last=False)
+    return valor
+
+class GeometriaHistograma:
+    """
+    Posiciones del histograma dentro de su panel para un número de rangos.
+    Las coordenadas son relativas al panel, que empieza a la derecha de la
+    línea divisoria.
+    """
+
+    def __init__(self, disposicion, numero_rangos):
+        """
+        Args:
+            disposicion: Disposicion de la pantalla
+            numero_rangos: Número de barras del histograma
+        """
+        medida = disposicion.medida
+
+        # La mitad derecha empieza en inicio_x (antes de la línea divisoria)
+        inicio_x = disposicion.ancho_izquierda - disposicion.x_panel_histograma
+
+        # Área de las barras
+        self.area_x = area_x = inicio_x + medida(50)
+        self.area_y = area_y = medida(150)
+        self.area_ancho = area_ancho = disposicion.ancho_derecha - medida(100)
+        self.area_alto = area_alto = disposicion.alto - medida(300)
+        base = area_y + area_alto
+
+        # Centro del título y extremos de los ejes
+        self.titulo = (inicio_x + disposicion.ancho_derecha // 2, medida(80))
+        self.eje_y = ((area_x, area_y), (area_x, base))
+        self.eje_x = ((area_x, base), (area_x + area_ancho, base))
+
+        # Centro de la etiqueta de cada rango y posición de su barra
+        self.etiquetas_rangos = [(area_x + i * area_ancho // numero_rangos + area_ancho // (2 * numero_rangos),
+                                  base + medida(5)) for i in range(numero_rangos)]
+        self.x_barras = [area_x + medida(5) + i * area_ancho // numero_rangos for i in range(numero_rangos)]
+        self.ancho_barra = max(1, area_ancho // numero_rangos - medida(10))
+        self.base_barras = base
+
+        # Extremo derecho y centro vertical de cada marca del eje Y
+        self.marcas_y = [(area_x - medida(5), base - i * area_alto // (NUMERO_MARCAS_Y - 1))
+                         for i in range(NUMERO_MARCAS_Y)]
+
+        # Centro de los nombres de los ejes (el del eje Y, girado, por su borde izquierdo)
+        self.nombre_eje_x = (area_x + area_ancho // 2, base + medida(30))
+        self.nombre_eje_y = (area_x - medida(40), area_y + area_alto // 2)
+
+class Disposicion:
+    """
+    Geometría de las pantallas para un tamaño de pantalla: regiones, tamaños
+    de fuente y posiciones de los elementos, escalados desde la pantalla de
+    referencia.
+    """
+
+    def __init__(self, ancho, alto):
+        """
+        Args:
+            ancho: Ancho de la pantalla en píxeles
+            alto: Alto de la pantalla en píxeles
+        """
+        self.ancho = ancho
+        self.alto = alto
+        # En pantallas más estrechas que 16:9 (4:3, 5:4) manda el ancho,
+        # para que los textos quepan en su mitad
+        self.escala = min(alto / ALTO_REFERENCIA, ancho / ANCHO_REFERENCIA)
+
+        # Mitad izquierda para el juego, mitad derecha para el histograma
+        self.ancho_izquierda = ancho // 2
+        self.ancho_derecha = ancho - self.ancho_izquierda
+        self.centro_izquierda = self.ancho_izquierda // 2
+
+        # El panel del histograma empieza justo a la derecha de la línea divisoria
+        self.x_panel_histograma = self.ancho_izquierda + GROSOR_DIVISION
+
+        self.tamanos_fuente = {nombre: max(TAMANO_FUENTE_MINIMO, self.medida(tamano))
+                               for nombre, tamano in TAMANOS_FUENTE.items()}
+
+        # Elementos fijos: nombre de la escuela, créditos y botón de salir
+        self.y_escuela = self.medida(20)
+        self.y_creditos = alto - self.medida(40)
+        tamano_boton = self.medida(30)
+        margen = self.medida(10)
+        self.boton_salir = (ancho - tamano_boton - margen, margen, tamano_boton, tamano_boton)
+
+        self._columnas = OrderedDict()
+        self._histogramas = {}
+
+    def medida(self, pixeles):
+        """
+        Args:
+            pixeles: Medida en la pantalla de referencia
+
+        Returns:
+            int: Medida en esta pantalla
+        """
+        return round(pixeles * self.escala)
+
+    def x_centrado(self, ancho):
+        """
+        Returns:
+            int: x de un elemento de ese ancho centrado en la mitad izquierda
+        """
+        return self.centro_izquierda - ancho // 2
+
+    def columna(self, filas, y_minimo=0):
+        """
+        Coloca unas filas una debajo de otra, cada una centrada en la mitad
+        izquierda y el conjunto centrado en vertical.
+
+        Args:
+            filas: Tupla con el (ancho, alto) de cada fila: el ancho en píxeles
+                   de esta pantalla (0 si cambia mientras se muestra, ver
+                   x_centrado) y el alto, que es el espacio hasta la fila
+                   siguiente, en píxeles de la pantalla de referencia
+            y_minimo: La primera fila nunca queda por encima de esta y
+                      (en píxeles de la pantalla de referencia)
+
+        Returns:
+            Tupla con la posición (x, y) de cada fila
+        """
+        clave = (filas, y_minimo)
+        posiciones = self._columnas.get(clave)
+        if posiciones is not None:
+            self._columnas.move_to_end(clave)
+            return posiciones
+
+        altos = [self.medida(alto) for _, alto in filas]
+        y = max(self.medida(y_minimo), (self.alto - sum(altos)) // 2)
+        posiciones = []
+        for (ancho, _), alto in zip(filas, altos):
+            posiciones.append((self.x_centrado(ancho), y))
+            y += alto
+        return _guardar(self._columnas, clave, tuple(posiciones), CAPACIDAD_COLUMNAS)
+
+    def histograma(self, numero_rangos):
+        """
+        Returns:
+            GeometriaHistograma: Posiciones del histograma con ese número de rangos
+        """
+        geometria = self._histogramas.get(numero_rangos)
+        if geometria is None:
+            geometria = self._histogramas[numero_rangos] = GeometriaHistograma(self, numero_rangos)
+        return geometria
+
+# Disposiciones de los últimos tamaños de pantalla (al cambiar el tamaño de una
+# ventana se pasa por muchos, y se puede volver a uno anterior)
+_disposiciones = OrderedDict()
+
+def disposicion_para(ancho, alto):
+    """
+    Returns:
+        Disposicion: Disposición para ese tamaño de pantalla, ya calculada si se usó hace poco
+    """
+    clave = (ancho, alto)
+    disposicion = _disposiciones.get(clave)
+    if disposicion is not None:
+        _disposiciones.move_to_end(clave)
+        return disposicion
+    return _guardar(_disposiciones, clave, Disposicion(ancho, alto), CAPACIDAD_DISPOSICIONES)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Escritura de los resultados en segundo plano.
+
+EscritorSegundoPlano envuelve un registro (RegistroResultados o RegistroSQLite)
+y tiene sus mismos métodos, pero los resultados nuevos se guardan desde un hilo
+aparte. Así la pantalla de resultados no tiene que esperar al disco.
+
+Los resultados que llegan casi a la vez se guardan juntos, en una sola
+escritura. Al cerrar el escritor se guardan todos los que quedan en la cola,
+así que no se pierde ningún resultado al salir del juego de forma normal.
+"""
+
+import queue
+import threading
+import time
+
+from registro import firma_archivos
+
+# Número máximo de resultados esperando a guardarse. Si se llena, agregar
+# espera a que haya sitio en lugar de descartar resultados
+TAMANO_COLA = 256
+
+# Tiempo (segundos) que se esperan más resultados para guardarlos juntos
+ESPERA_LOTE = 0.05
+
+# Número máximo de resultados que se guardan en una misma escritura
+LOTE_MAXIMO = 100
+
+# Marca que se pone en la cola para que el hilo termine
+_FIN = object()
+
+class EscritorSegundoPlano:
+    """
+    Registro de resultados que escribe en el disco desde un hilo aparte.
+    """
+
+    def __init__(self, registro, tamano_cola=TAMANO_COLA):
+        """
+        Args:
+            registro: RegistroResultados o RegistroSQLite donde se guardan los resultados
+            tamano_cola: Número máximo de resultados esperando a guardarse
+        """
+        self.registro = registro
+        self.ruta_datos = registro.ruta_datos
+        self.ruta_registro = registro.ruta_registro
+        self.ultima_firma = None
+        self._cola = queue.Queue(maxsize=tamano_cola)
+        # El registro no se puede usar desde dos hilos a la vez
+        self._candado = threading.Lock()
+        self._pendientes = []
+        self._hilo = threading.Thread(target=self._escribir, name='escritor-resultados', daemon=True)
+        self._hilo.start()
+
+    def _escribir(self):
+        """
+        Bucle del hilo: espera resultados y los guarda por lotes.
+        """
+        while True:
+            lote = [self._cola.get()]
+
+            # Juntar los resultados que llegan casi a la vez
+            limite = time.monotonic() + ESPERA_LOTE
+            while lote[-1] is not _FIN and len(lote) < LOTE_MAXIMO:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            self._guardar_lote([jugador for jugador in lote if jugador is not _FIN])
+            for _ in lote:
+                self._cola.task_done()
+            if lote[-1] is _FIN:
+                return
+
+    def _guardar_lote(self, jugadores):
+        """
+        Guarda un lote de resultados en el registro. Si falla, los resultados
+        se guardan en memoria y se vuelven a intentar con el siguiente lote.
+
+        Args:
+            jugadores: Lista de diccionarios con 'nombre' y 'tiempo'
+        """
+        with self._candado:
+            jugadores = self._pendientes + jugadores
+            if not jugadores:
+                return
+            try:
+                compactar = self.registro.agregar_lote(jugadores)
+            except Exception as e:
+                print(f"Error al guardar {len(jugadores)} resultados, se volverá a intentar: {e}")
+                self._pendientes = jugadores
+                return
+            self._pendientes = []
+
+            try:
+                if compactar:
+                    self.registro.compactar(self.registro.cargar())
+                self.registro.sincronizar()
+            except Exception as e:
+                print(f"Error al compactar el registro: {e}")
+            self.ultima_firma = firma_archivos(self.ruta_datos, self.ruta_registro)
+
+    def agregar(self, jugador):
+        """
+        Pone un resultado en la cola para guardarlo en segundo plano.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: Siempre False, el propio escritor compacta el registro cuando hace falta
+        """
+        self._cola.put(jugador)
+        return False
+
+    def vaciar(self):
+        """
+        Espera a que se guarden todos los resultados de la cola.
+        """
+        if self._hilo.is_alive():
+            self._cola.join()
+
+    def firma_escrita(self):
+        """
+        Returns:
+            Firma de los archivos después de la última escritura propia,
+            para distinguirla de los cambios hechos por otros programas
+        """
+        self.vaciar()
+        return self.ultima_firma
+
+    def cargar(self):
+        """
+        Carga todos los resultados, incluidos los que estaban en la cola.
+
+        Returns:
+            Diccionario con los datos de los jugadores
+        """
+        self.vaciar()
+        with self._candado:
+            return self.registro.cargar()
+
+    def compactar(self, datos):
+        """
+        Sustituye todos los resultados guardados por los indicados.
+
+        Args:
+            datos: Diccionario con los datos de todos los jugadores
+        """
+        self.vaciar()
+        with self._candado:
+            self.registro.compactar(datos)
+
+    def sincronizar(self):
+        """
+        Guarda los resultados de la cola y fuerza que lleguen al disco.
+        """
+        self.vaciar()
+        with self._candado:
+            self.registro.sincronizar()
+
+    def cerrar(self):
+        """
+        Guarda los resultados que quedan en la cola, termina el hilo y cierra
+        el registro. Se puede llamar más de una vez.
+        """
+        if self._hilo.is_alive():
+            self._cola.put(_FIN)
+            self._hilo.join()
+        with self._candado:
+            if self._pendientes:
+                # Último intento con los resultados que no se pudieron guardar
+                self.registro.agregar_lote(self._pendientes)
+                self._pendientes = []
+            self.registro.cerrar()
+
+    def __getattr__(self, nombre):
+        """
+        Las consultas propias de cada registro (mejores_jugadores,
+        consultar_estadisticas...) se hacen después de vaciar la cola.
+        """
+        metodo = getattr(self.registro, nombre)
+        if not callable(metodo):
+            return metodo
+
+        def consultar(*args, **kwargs):
+            self.vaciar()
+            with self._candado:
+                return metodo(*args, **kwargs)
+        return consultar
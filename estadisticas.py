@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""
+Estadísticas de los tiempos de reacción del Juego de Reflejos.
+
+Las estadísticas se calculan una sola vez al cargar los datos y después se
+actualizan con cada resultado nuevo, sin volver a recorrer la lista entera
+de jugadores en cada pantalla.
+"""
+
+import bisect
+import heapq
+import unicodedata
+from collections import Counter, deque
+
+from histograma import (LIMITES_HISTOGRAMA, contar_por_rangos, etiquetas_rangos,
+                        indice_rango, numpy)
+
+# Número de jugadores que se muestran en la lista de mejores
+NUMERO_MEJORES = 5
+
+# Número de tiempos recientes que se guardan de cada jugador
+NUMERO_RECIENTES = 5
+
+# Tiempo máximo (ms) que distingue el índice de posiciones. Los tiempos
+# mayores cuentan todos en el último cubo
+TIEMPO_MAXIMO_INDICE = 10000
+
+class IndicePosiciones:
+    """
+    Árbol de Fenwick con un cubo por milisegundo. Permite añadir un tiempo y
+    saber cuántos jugadores hay por debajo de un tiempo en O(log n), sin
+    ordenar la lista de jugadores.
+    """
+
+    def __init__(self, maximo=TIEMPO_MAXIMO_INDICE):
+        """
+        Args:
+            maximo: Tiempo máximo (ms) que se distingue
+        """
+        self.maximo = maximo
+        self.total = 0
+        self._arbol = [0] * (maximo + 2)
+
+    @classmethod
+    def desde_conteos(cls, conteos, maximo=TIEMPO_MAXIMO_INDICE):
+        """
+        Construye el índice en tiempo lineal a partir del número de jugadores
+        que tiene cada tiempo.
+
+        Args:
+            conteos: Diccionario {tiempo: número de jugadores}
+
+        Returns:
+            IndicePosiciones: Índice con todos los tiempos
+        """
+        indice = cls(maximo)
+        arbol = indice._arbol
+        for tiempo, cantidad in conteos.items():
+            arbol[indice._cubo(tiempo) + 1] += cantidad
+            indice.total += cantidad
+        indice._propagar()
+        return indice
+
+    @classmethod
+    def desde_tiempos(cls, tiempos, maximo=TIEMPO_MAXIMO_INDICE):
+        """
+        Construye el índice en tiempo lineal a partir de una lista de tiempos.
+
+        Args:
+            tiempos: Secuencia de tiempos en milisegundos
+
+        Returns:
+            IndicePosiciones: Índice con todos los tiempos
+        """
+        if numpy is None:
+            return cls.desde_conteos(Counter(tiempos), maximo)
+
+        indice = cls(maximo)
+        cubos = numpy.clip(numpy.asarray(tiempos, dtype=numpy.int64), 0, maximo)
+        conteos = numpy.bincount(cubos, minlength=maximo + 1)
+        indice._arbol = [0] + conteos.tolist()
+        indice.total = int(conteos.sum())
+        indice._propagar()
+        return indice
+
+    def _propagar(self):
+        """
+        Convierte los conteos de cada cubo en un árbol de Fenwick en O(n).
+        """
+        arbol = self._arbol
+        for i in range(1, len(arbol)):
+            padre = i + (i & -i)
+            if padre < len(arbol):
+                arbol[padre] += arbol[i]
+
+    def _cubo(self, tiempo):
+        """
+        Returns:
+            int: Cubo (entre 0 y maximo) donde cae un tiempo
+        """
+        return min(max(int(tiempo), 0), self.maximo)
+
+    def agregar(self, tiempo):
+        """
+        Añade un tiempo al índice en O(log n).
+
+        Args:
+            tiempo: Tiempo en milisegundos
+        """
+        i = self._cubo(tiempo) + 1
+        while i < len(self._arbol):
+            self._arbol[i] += 1
+            i += i & -i
+        self.total += 1
+
+    def contar_hasta(self, tiempo):
+        """
+        Returns:
+            int: Número de tiempos menores o iguales que el indicado
+        """
+        i = self._cubo(tiempo) + 1
+        cantidad = 0
+        while i > 0:
+            cantidad += self._arbol[i]
+            i -= i & -i
+        return cantidad
+
+    def posicion(self, tiempo):
+        """
+        Returns:
+            int: Puesto que ocupa un tiempo en la clasificación (1 es el mejor)
+        """
+        cubo = self._cubo(tiempo)
+        if cubo == 0:
+            return 1
+        return self.contar_hasta(cubo - 1) + 1
+
+    def porcentaje_superados(self, tiempo):
+        """
+        Calcula a qué porcentaje de los demás jugadores ha superado un tiempo
+        que ya está en el índice.
+
+        Args:
+            tiempo: Tiempo del jugador en milisegundos
+
+        Returns:
+            float o None: Porcentaje de jugadores más lentos, o None si no hay otros
+        """
+        otros = self.total - 1
+        if otros <= 0:
+            return None
+        mas_lentos = self.total - self.contar_hasta(tiempo)
+        return 100 * mas_lentos / otros
+
+def normalizar_nombre(nombre):
+    """
+    Devuelve la forma de un nombre que se usa para reconocer al mismo jugador
+    aunque lo escriba con otras mayúsculas o espacios ("Ana  López" = "ana lópez").
+
+    Args:
+        nombre: Nombre tal y como se escribió
+
+    Returns:
+        str: Nombre normalizado
+    """
+    return ' '.join(unicodedata.normalize('NFC', nombre).split()).casefold()
+
+class FichaJugador:
+    """
+    Resumen de los intentos de un jugador: mejor tiempo, número de intentos,
+    suma de los tiempos y los últimos tiempos.
+    """
+
+    __slots__ = ('nombre', 'intentos', 'suma', 'mejor', 'orden_mejor', 'recientes', 'ordenes_recientes')
+
+    def __init__(self, nombre):
+        """
+        Args:
+            nombre: Nombre con el que se muestra al jugador (el de su mejor intento)
+        """
+        self.nombre = nombre
+        self.intentos = 0
+        self.suma = 0
+        self.mejor = None
+        self.orden_mejor = 0
+        self.recientes = deque(maxlen=NUMERO_RECIENTES)
+        # Orden de llegada de cada tiempo reciente, para juntar fichas en orden
+        self.ordenes_recientes = deque(maxlen=NUMERO_RECIENTES)
+
+    def media(self):
+        """
+        Returns:
+            Tiempo medio del jugador en milisegundos, o 0 si no tiene intentos
+        """
+        if not self.intentos:
+            return 0
+        return self.suma / self.intentos
+
+class IndiceJugadores:
+    """
+    Fichas de los jugadores por nombre normalizado y clasificación con el
+    mejor intento de cada jugador. Buscar un jugador es O(1) y añadir un
+    intento es O(1) más O(k) si mejora uno de los k mejores, porque un mejor
+    tiempo personal solo puede bajar.
+    """
+
+    def __init__(self, numero_mejores=NUMERO_MEJORES):
+        """
+        Args:
+            numero_mejores: Cuántos jugadores tiene la clasificación
+        """
+        self.numero_mejores = numero_mejores
+        self._fichas = {}
+        # Clasificación ordenada: (mejor tiempo, orden del intento, clave)
+        self._mejores = []
+        self._orden = 0
+        # Caché de nombres ya normalizados (hay muchos menos nombres que intentos)
+        self._claves = {}
+
+    def __len__(self):
+        return len(self._fichas)
+
+    def _clave(self, nombre):
+        """
+        Returns:
+            str: Nombre normalizado, usando la caché
+        """
+        clave = self._claves.get(nombre)
+        if clave is None:
+            clave = self._claves[nombre] = normalizar_nombre(nombre)
+        return clave
+
+    def _ordenar_mejores(self):
+        """
+        Rehace la clasificación desde cero con todas las fichas.
+        """
+        self._mejores = heapq.nsmallest(self.numero_mejores,
+                                        ((ficha.mejor, ficha.orden_mejor, clave)
+                                         for clave, ficha in self._fichas.items()))
+
+    @classmethod
+    def desde_jugadores(cls, jugadores, numero_mejores=NUMERO_MEJORES):
+        """
+        Construye el índice recorriendo una sola vez los intentos.
+
+        Args:
+            jugadores: Lista de diccionarios con 'nombre' y 'tiempo', en orden de llegada
+
+        Returns:
+            IndiceJugadores: Índice con todos los jugadores
+        """
+        indice = cls(numero_mejores)
+        fichas = indice._fichas
+        for orden, jugador in enumerate(jugadores):
+            tiempo = jugador['tiempo']
+            clave = indice._clave(jugador['nombre'])
+            ficha = fichas.get(clave)
+            if ficha is None:
+                ficha = fichas[clave] = FichaJugador(jugador['nombre'])
+            ficha.intentos += 1
+            ficha.suma += tiempo
+            ficha.recientes.append(tiempo)
+            ficha.ordenes_recientes.append(orden)
+            if ficha.mejor is None or tiempo < ficha.mejor:
+                ficha.mejor = tiempo
+                ficha.orden_mejor = orden
+                ficha.nombre = jugador['nombre']
+        indice._orden = len(jugadores)
+        indice._ordenar_mejores()
+        return indice
+
+    @classmethod
+    def desde_filas(cls, filas, numero_mejores=NUMERO_MEJORES):
+        """
+        Construye el índice a partir de resúmenes por nombre ya calculados (por
+        ejemplo, con consultas a una base de datos). Las filas de nombres que
+        solo se diferencian en mayúsculas o espacios se juntan.
+
+        Args:
+            filas: Tuplas (nombre, intentos, suma, mejor, orden del mejor,
+                   recientes), donde recientes es una lista de (orden, tiempo)
+
+        Returns:
+            IndiceJugadores: Índice con todos los jugadores
+        """
+        indice = cls(numero_mejores)
+        recientes = {}
+        for nombre, intentos, suma, mejor, orden_mejor, ultimos in filas:
+            clave = indice._clave(nombre)
+            ficha = indice._fichas.get(clave)
+            if ficha is None:
+                ficha = indice._fichas[clave] = FichaJugador(nombre)
+            ficha.intentos += intentos
+            ficha.suma += suma
+            if ficha.mejor is None or (mejor, orden_mejor) < (ficha.mejor, ficha.orden_mejor):
+                ficha.mejor = mejor
+                ficha.orden_mejor = orden_mejor
+                ficha.nombre = nombre
+            recientes.setdefault(clave, []).extend(ultimos)
+            indice._orden = max(indice._orden, orden_mejor + 1, *(orden + 1 for orden, _ in ultimos))
+
+        for clave, ultimos in recientes.items():
+            ficha = indice._fichas[clave]
+            for orden, tiempo in sorted(ultimos):
+                ficha.recientes.append(tiempo)
+                ficha.ordenes_recientes.append(orden)
+        indice._ordenar_mejores()
+        return indice
+
+    def agregar(self, jugador):
+        """
+        Añade un intento a la ficha del jugador.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo' (en ms)
+        """
+        tiempo = jugador['tiempo']
+        clave = self._clave(jugador['nombre'])
+        ficha = self._fichas.get(clave)
+        if ficha is None:
+            ficha = self._fichas[clave] = FichaJugador(jugador['nombre'])
+
+        orden = self._orden
+        self._orden += 1
+        ficha.intentos += 1
+        ficha.suma += tiempo
+        ficha.recientes.append(tiempo)
+        ficha.ordenes_recientes.append(orden)
+        if ficha.mejor is not None and tiempo >= ficha.mejor:
+            return
+        ficha.mejor = tiempo
+        ficha.orden_mejor = orden
+        ficha.nombre = jugador['nombre']
+
+        # Ha mejorado: solo puede subir en la clasificación, nunca bajar
+        entrada = (tiempo, orden, clave)
+        if len(self._mejores) < self.numero_mejores or entrada < self._mejores[-1]:
+            mejores = [otra for otra in self._mejores if otra[2] != clave]
+            bisect.insort(mejores, entrada)
+            self._mejores = mejores[:self.numero_mejores]
+
+    def filas(self):
+        """
+        Resume cada jugador en el formato de desde_filas (por ejemplo, para
+        enviar el índice a otro equipo).
+
+        Returns:
+            Lista de tuplas (nombre, intentos, suma, mejor, orden del mejor, recientes),
+            donde recientes es una lista de (orden de llegada, tiempo)
+        """
+        return [(ficha.nombre, ficha.intentos, ficha.suma, ficha.mejor, ficha.orden_mejor,
+                 list(zip(ficha.ordenes_recientes, ficha.recientes)))
+                for ficha in self._fichas.values()]
+
+    def ficha(self, nombre):
+        """
+        Busca la ficha de un jugador en O(1).
+
+        Args:
+            nombre: Nombre del jugador (da igual cómo esté escrito)
+
+        Returns:
+            FichaJugador o None si el jugador no tiene intentos
+        """
+        return self._fichas.get(normalizar_nombre(nombre))
+
+    def mejores_jugadores(self, numero=None):
+        """
+        Devuelve la clasificación con el mejor intento de cada jugador.
+
+        Args:
+            numero: Número de jugadores a devolver (como mucho numero_mejores)
+
+        Returns:
+            Lista de diccionarios con 'nombre' y 'tiempo'
+        """
+        mejores = self._mejores if numero is None else self._mejores[:numero]
+        return [{'nombre': self._fichas[clave].nombre, 'tiempo': tiempo} for tiempo, _, clave in mejores]
+
+class Estadisticas:
+    """
+    Resumen de los resultados de todos los jugadores que se mantiene al día
+    de forma incremental: cantidad, suma, mejor tiempo y conteos del
+    histograma. También mantiene un índice de posiciones para saber el
+    percentil de cualquier tiempo y otro con la ficha de cada jugador, que
+    da la clasificación (el mejor intento de cada jugador).
+    """
+
+    def __init__(self, limites=LIMITES_HISTOGRAMA, numero_mejores=NUMERO_MEJORES):
+        """
+        Args:
+            limites: Límites de los rangos del histograma
+            numero_mejores: Cuántos jugadores tiene la clasificación
+        """
+        self.limites = list(limites)
+        self.numero_mejores = numero_mejores
+        self.cantidad = 0
+        self.suma = 0
+        self.minimo = None
+        # Un conteo por rango, más uno para los tiempos por debajo del primer
+        # límite y otro para los que pasan del último
+        self.conteos = [0] * (len(self.limites) + 1)
+
+        # Aumenta con cada resultado, sirve para saber si hay que redibujar
+        self.version = 0
+
+        # Índice para saber la posición de un tiempo sin ordenar a los jugadores
+        self.posiciones = IndicePosiciones()
+
+        # Fichas de cada jugador y clasificación con su mejor intento
+        self.jugadores = IndiceJugadores(numero_mejores)
+
+    @classmethod
+    def desde_datos(cls, datos, **opciones):
+        """
+        Construye las estadísticas recorriendo una sola vez los datos cargados.
+        Los conteos se hacen de golpe (con NumPy si está disponible) en lugar
+        de añadir los resultados uno a uno.
+
+        Args:
+            datos: Diccionario con los datos de los jugadores
+
+        Returns:
+            Estadisticas: Objeto con las estadísticas de todos los jugadores
+        """
+        jugadores = datos['jugadores']
+        if not jugadores:
+            return cls(**opciones)
+
+        tiempos = [jugador['tiempo'] for jugador in jugadores]
+        limites = opciones.get('limites', LIMITES_HISTOGRAMA)
+        numero_mejores = opciones.get('numero_mejores', NUMERO_MEJORES)
+
+        estadisticas = cls.desde_resumen(len(tiempos), sum(tiempos), min(tiempos),
+                                         contar_por_rangos(tiempos, limites), **opciones)
+        estadisticas.posiciones = IndicePosiciones.desde_tiempos(tiempos)
+        estadisticas.jugadores = IndiceJugadores.desde_jugadores(jugadores, numero_mejores)
+        return estadisticas
+
+    @classmethod
+    def desde_resumen(cls, cantidad, suma, minimo, conteos, conteos_por_tiempo=None,
+                      filas_jugadores=None, **opciones):
+        """
+        Construye las estadísticas a partir de valores ya calculados (por
+        ejemplo, con consultas a una base de datos), sin recorrer los jugadores.
+
+        Args:
+            cantidad: Número de resultados
+            suma: Suma de todos los tiempos
+            minimo: Mejor tiempo, o None si no hay resultados
+            conteos: Conteo de jugadores por rango del histograma (incluidos los
+                     de los extremos, como devuelve contar_por_rangos)
+            conteos_por_tiempo: Diccionario {tiempo: número de jugadores}
+                                para el índice de posiciones
+            filas_jugadores: Resumen de cada nombre para el índice de
+                             jugadores (ver IndiceJugadores.desde_filas)
+
+        Returns:
+            Estadisticas: Objeto con las estadísticas de todos los jugadores
+        """
+        estadisticas = cls(**opciones)
+        estadisticas.cantidad = cantidad
+        estadisticas.suma = suma
+        estadisticas.minimo = minimo
+        estadisticas.conteos = list(conteos)
+        estadisticas.version = cantidad
+        if conteos_por_tiempo is not None:
+            estadisticas.posiciones = IndicePosiciones.desde_conteos(conteos_por_tiempo)
+        if filas_jugadores is not None:
+            estadisticas.jugadores = IndiceJugadores.desde_filas(filas_jugadores, estadisticas.numero_mejores)
+        return estadisticas
+
+    def agregar(self, jugador):
+        """
+        Añade el resultado de un jugador en O(log n).
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo' (en ms)
+        """
+        tiempo = jugador['tiempo']
+
+        self.version += 1
+        self.cantidad += 1
+        self.suma += tiempo
+        if self.minimo is None or tiempo < self.minimo:
+            self.minimo = tiempo
+
+        # Ubicar el tiempo en su rango del histograma
+        self.conteos[indice_rango(self.limites, tiempo)] += 1
+
+        self.posiciones.agregar(tiempo)
+        self.jugadores.agregar(jugador)
+
+    def media(self):
+        """
+        Returns:
+            Tiempo medio en milisegundos, o 0 si no hay jugadores
+        """
+        if not self.cantidad:
+            return 0
+        return self.suma / self.cantidad
+
+    def mejor_tiempo(self):
+        """
+        Returns:
+            Mejor tiempo en milisegundos, o 0 si no hay jugadores
+        """
+        if self.minimo is None:
+            return 0
+        return self.minimo
+
+    def histograma(self):
+        """
+        Returns:
+            Lista con el conteo de jugadores por rango de tiempo. El primero son
+            los tiempos por debajo del primer límite y el último los que pasan del último
+        """
+        return list(self.conteos)
+
+    def etiquetas(self):
+        """
+        Returns:
+            Lista con el texto de cada rango de histograma()
+        """
+        return etiquetas_rangos(self.limites)
+
+    def rangos_visibles(self):
+        """
+        Devuelve los rangos que se dibujan. El rango de los tiempos por debajo
+        del primer límite se omite si está vacío y empieza en 0, porque ningún
+        tiempo de reacción puede caer ahí.
+
+        Returns:
+            Tupla (etiquetas, conteos)
+        """
+        etiquetas = self.etiquetas()
+        conteos = self.histograma()
+        if self.limites[0] <= 0 and conteos[0] == 0:
+            return etiquetas[1:], conteos[1:]
+        return etiquetas, conteos
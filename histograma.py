@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Reparto de los tiempos de reacción en los rangos del histograma.
+
+Los límites de los rangos se pueden configurar o calcular a partir de los
+datos. Además de los rangos normales hay uno para los tiempos por debajo del
+primer límite y otro para los que pasan del último, así que ningún tiempo se
+queda fuera del histograma.
+
+Si NumPy está instalado se usa para contar millones de tiempos de golpe; si
+no, se usa bisect con el mismo resultado.
+"""
+
+from bisect import bisect_right
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Límites de los rangos del histograma (en milisegundos)
+LIMITES_HISTOGRAMA = [0, 200, 220, 240, 260, 280, 300, 320, 340, 360, 380]
+
+# Número de rangos que se usan al calcular los límites automáticamente
+NUMERO_RANGOS_AUTOMATICOS = 10
+
+# Pasos "redondos" (en ms) que se pueden usar como ancho de los rangos
+PASOS_REDONDOS = [1, 2, 5, 10, 20, 25, 50, 100, 200, 250, 500, 1000, 2000, 5000]
+
+def indice_rango(limites, tiempo):
+    """
+    Devuelve el rango donde cae un tiempo: 0 es el de los tiempos por debajo
+    del primer límite y len(limites) el de los que llegan al último o lo pasan.
+
+    Args:
+        limites: Límites de los rangos, de menor a mayor
+        tiempo: Tiempo en milisegundos
+
+    Returns:
+        int: Índice del rango
+    """
+    return bisect_right(limites, tiempo)
+
+def contar_por_rangos(tiempos, limites=LIMITES_HISTOGRAMA):
+    """
+    Cuenta cuántos tiempos caen en cada rango.
+
+    Args:
+        tiempos: Secuencia de tiempos (lista, array de NumPy o similar)
+        limites: Límites de los rangos, de menor a mayor
+
+    Returns:
+        Lista de len(limites) + 1 conteos: tiempos por debajo del primer límite,
+        uno por cada rango y tiempos a partir del último límite
+    """
+    if numpy is not None:
+        valores = numpy.asarray(tiempos)
+        if valores.size == 0:
+            return [0] * (len(limites) + 1)
+        indices = numpy.searchsorted(numpy.asarray(limites), valores, side='right')
+        return numpy.bincount(indices, minlength=len(limites) + 1).tolist()
+
+    conteos = [0] * (len(limites) + 1)
+    for tiempo in tiempos:
+        conteos[bisect_right(limites, tiempo)] += 1
+    return conteos
+
+def _percentil_ordenados(ordenados, porcentaje):
+    """
+    Returns:
+        Valor del percentil indicado en una lista ya ordenada
+    """
+    posicion = min(len(ordenados) - 1, int(len(ordenados) * porcentaje / 100))
+    return ordenados[posicion]
+
+def _limites_redondos(minimo, maximo, numero_rangos):
+    """
+    Returns:
+        Lista de numero_rangos + 1 límites con un paso redondo que cubren de minimo a maximo
+    """
+    # Elegir el paso redondo más pequeño que cubre el intervalo
+    paso = PASOS_REDONDOS[-1]
+    for candidato in PASOS_REDONDOS:
+        inicio = max(0, int(minimo // candidato) * candidato)
+        if inicio + candidato * numero_rangos > maximo:
+            paso = candidato
+            break
+
+    inicio = max(0, int(minimo // paso) * paso)
+    return [inicio + paso * i for i in range(numero_rangos + 1)]
+
+def limites_automaticos(tiempos, numero_rangos=NUMERO_RANGOS_AUTOMATICOS):
+    """
+    Calcula unos límites redondos que cubren casi todos los tiempos (del
+    percentil 2 al 98). Los tiempos raros quedan en los rangos de los extremos.
+
+    Args:
+        tiempos: Secuencia de tiempos en milisegundos
+        numero_rangos: Número de rangos entre el primer y el último límite
+
+    Returns:
+        Lista de numero_rangos + 1 límites, o LIMITES_HISTOGRAMA si no hay tiempos
+    """
+    if numpy is not None:
+        valores = numpy.asarray(tiempos)
+        if valores.size == 0:
+            return list(LIMITES_HISTOGRAMA)
+        minimo, maximo = numpy.percentile(valores, [2, 98]).tolist()
+    else:
+        ordenados = sorted(tiempos)
+        if not ordenados:
+            return list(LIMITES_HISTOGRAMA)
+        minimo = _percentil_ordenados(ordenados, 2)
+        maximo = _percentil_ordenados(ordenados, 98)
+
+    return _limites_redondos(minimo, maximo, numero_rangos)
+
+def limites_automaticos_conteos(conteos, numero_rangos=NUMERO_RANGOS_AUTOMATICOS):
+    """
+    Igual que limites_automaticos, pero a partir del número de jugadores
+    que tiene cada tiempo en lugar de la lista completa.
+
+    Args:
+        conteos: Diccionario {tiempo: número de jugadores}
+        numero_rangos: Número de rangos entre el primer y el último límite
+
+    Returns:
+        Lista de numero_rangos + 1 límites, o LIMITES_HISTOGRAMA si no hay tiempos
+    """
+    total = sum(conteos.values())
+    if not total:
+        return list(LIMITES_HISTOGRAMA)
+
+    percentiles = {}
+    acumulado = 0
+    for tiempo in sorted(conteos):
+        acumulado += conteos[tiempo]
+        for porcentaje in (2, 98):
+            if porcentaje not in percentiles and acumulado > int(total * porcentaje / 100):
+                percentiles[porcentaje] = tiempo
+    return _limites_redondos(percentiles[2], percentiles[98], numero_rangos)
+
+def etiquetas_rangos(limites):
+    """
+    Genera el texto de cada rango a partir de los mismos límites que se usan
+    para contar, así las etiquetas nunca se desajustan de los conteos.
+
+    Args:
+        limites: Límites de los rangos
+
+    Returns:
+        Lista de len(limites) + 1 etiquetas (por ejemplo "<0", "0-199", ..., "380+")
+    """
+    etiquetas = [f"<{limites[0]}"]
+    for inferior, superior in zip(limites, limites[1:]):
+        etiquetas.append(f"{inferior}-{superior - 1}")
+    etiquetas.append(f"{limites[-1]}+")
+    return etiquetas
+
+def leer_limites(texto):
+    """
+    Interpreta la configuración de los límites del histograma.
+
+    Args:
+        texto: "auto", una lista de números separados por comas, o None
+
+    Returns:
+        La cadena "auto", una lista de límites, o LIMITES_HISTOGRAMA
+    """
+    if not texto:
+        return list(LIMITES_HISTOGRAMA)
+    if texto.strip().lower() == 'auto':
+        return 'auto'
+    limites = sorted(int(valor) for valor in texto.split(',') if valor.strip())
+    if len(limites) < 2:
+        raise ValueError("El histograma necesita al menos dos límites")
+    return limites
@@ -11,12 +11,27 @@ import pygame
 import sys
 import time
 import random
-import json
 import os
+import argparse
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
 from pygame.locals import *
 
-# Inicialización de Pygame
-pygame.init()
+from agregacion import ClienteAgregacion, PUERTO_AGREGACION
+from almacen import AlmacenJugadores
+from captura import CapturaTeclado
+from consumo import ConsumoPantallas
+from disposicion import disposicion_para
+from escritor import EscritorSegundoPlano
+from estadisticas import IndiceJugadores
+from histograma import contar_por_rangos, leer_limites, limites_automaticos
+from perfilado import Perfilador
+from registro import RegistroResultados
+from registro_binario import RegistroBinario
+from registro_sqlite import RegistroSQLite
+from texturas import PresentadorTexturas
+import traza
 
 # Constantes del juego
 TIEMPO_REACCION_MEDIA = 250 # milisegundos para una persona media (valor de referencia)
@@ -33,52 +48,583 @@ AMARILLO = (255, 255, 0)
 GRIS = (100, 100, 100)
 AZUL_CLARO = (100, 180, 255)
 
-# Configuración de la pantalla en modo pantalla completa
-info = pygame.display.Info()
-ANCHO = info.current_w
-ALTO = info.current_h
-pantalla = pygame.display.set_mode((ANCHO, ALTO), pygame.FULLSCREEN)
-pygame.display.set_caption('Juego de reflejos')
-reloj = pygame.time.Clock()  # Para controlar la velocidad de actualización
+# Sincronizar el volcado de pantalla con el refresco vertical (vsync).
+# Se activa con la variable de entorno REFLEJOS_VSYNC=1
+SINCRONIZAR_VSYNC = os.environ.get('REFLEJOS_VSYNC', '0') == '1'
 
-# División de la pantalla - mitad izquierda para el juego, mitad derecha para el histograma
-ANCHO_IZQUIERDA = ANCHO // 2
-ANCHO_DERECHA = ANCHO - ANCHO_IZQUIERDA
+# Mostrar al salir el consumo de CPU y los fotogramas de cada pantalla.
+# Se activa con la variable de entorno REFLEJOS_CONSUMO=1
+MOSTRAR_CONSUMO = os.environ.get('REFLEJOS_CONSUMO', '0') == '1'
 
-# Fuentes para texto
-fuente_grande = pygame.font.Font(None, 72)
-fuente_mediana = pygame.font.Font(None, 48)
-fuente_pequena = pygame.font.Font(None, 32)
-fuente_muy_pequena = pygame.font.Font(None, 24)  # Para los créditos
+# Guardar medidas de tiempo de cada fotograma y mostrarlas en pantalla.
+# Se activa con REFLEJOS_PERFIL=1 (o el nombre del archivo donde guardarlas)
+# o con la opción --perfil
+ARCHIVO_PERFIL = 'perfil.json'
+
+# Archivo donde se añade la traza binaria de cada ronda (ver traza.py).
+# REFLEJOS_TRAZA permite cambiarlo; con REFLEJOS_TRAZA=0 no se guarda
+ARCHIVO_TRAZA = os.environ.get('REFLEJOS_TRAZA', 'reflejos.traza')
+if ARCHIVO_TRAZA == '0':
+    ARCHIVO_TRAZA = None
+
+# Leer el teclado en un hilo aparte (ver captura.py). Si no hay teclados que
+# se puedan leer se usa la cola de eventos de pygame. REFLEJOS_CAPTURA=0 la desactiva
+CAPTURA_TECLADO = os.environ.get('REFLEJOS_CAPTURA', '1') != '0'
+
+# Eventos propios que envían los temporizadores de las pantallas de reposo
+EVENTO_CURSOR = pygame.USEREVENT + 1
+EVENTO_FIN_PANTALLA = pygame.USEREVENT + 2
+
+# Cada cuánto parpadea el cursor del nombre (milisegundos)
+INTERVALO_CURSOR_MS = 500
+
+# Cuánto dura la pantalla de derrota (milisegundos)
+DURACION_PANTALLA_PERDIDA_MS = 6000
+
+# La pantalla y las fuentes no se crean al importar el módulo sino
+# al llamar a iniciar_pantalla() desde main(). Así las funciones de datos y
+# estadísticas se pueden usar desde otras herramientas sin abrir ninguna ventana
+pantalla = None
+ANCHO = ALTO = 0
+ANCHO_IZQUIERDA = ANCHO_DERECHA = 0
+X_PANEL_HISTOGRAMA = 0
+fuente_grande = fuente_mediana = fuente_pequena = fuente_muy_pequena = None
+
+# Posiciones de los elementos para el tamaño actual de la pantalla
+disposicion = None
+
+# Presentar las pantallas con texturas de SDL (en la tarjeta gráfica si la hay)
+# en lugar de volcar la superficie de la pantalla con la CPU
+USAR_TEXTURAS = os.environ.get('REFLEJOS_TEXTURAS', '0') == '1'
+
+# Ventana con renderizador de SDL cuando se usan texturas; entonces la
+# pantalla es una superficie aparte donde se compone lo que no está en una textura
+presentador = None
+
+# Tamaño de una ventana a la que se le puede cambiar el tamaño (por ejemplo
+# "1280x720"), en lugar de la pantalla completa. Sirve para probar el juego
+# con otras resoluciones
+VENTANA = os.environ.get('REFLEJOS_VENTANA')
+
+# Fuentes ya cargadas de cada tamaño
+fuentes = {}
+
+def iniciar_pantalla():
+    """
+    Inicializa solo los módulos de pygame que usa el juego (pantalla y fuentes),
+    abre la pantalla completa (con texturas si se han pedido y se puede) y
+    carga las fuentes. Si ya estaba iniciada no hace nada.
+    """
+    global pantalla, presentador, SINCRONIZAR_VSYNC
+    
+    if pantalla is not None:
+        return
+    
+    # No hace falta pygame.init(): el sonido y los mandos no se usan
+    pygame.display.init()
+    pygame.font.init()
+    
+    tamano_ventana = None
+    if VENTANA:
+        tamano_ventana = tuple(int(valor) for valor in VENTANA.lower().split('x'))
+    
+    if USAR_TEXTURAS:
+        try:
+            presentador = PresentadorTexturas('Juego de reflejos', tamano_ventana, SINCRONIZAR_VSYNC)
+        except pygame.error as e:
+            print(f"No se pueden usar texturas ({e}). Se usará la pantalla normal.")
+        else:
+            print(f"Usando texturas ({'por hardware' if presentador.acelerado else 'por software'}).")
+            SINCRONIZAR_VSYNC = presentador.vsync
+            pantalla = pygame.Surface(presentador.tamano)
+    
+    if presentador is None:
+        if tamano_ventana:
+            pantalla = pygame.display.set_mode(tamano_ventana, pygame.RESIZABLE)
+            SINCRONIZAR_VSYNC = False
+        else:
+            # Configuración de la pantalla en modo pantalla completa
+            info = pygame.display.Info()
+            ancho = info.current_w
+            alto = info.current_h
+            
+            if SINCRONIZAR_VSYNC:
+                try:
+                    # En pygame 2 el vsync solo está disponible con SCALED u OPENGL
+                    pantalla = pygame.display.set_mode((ancho, alto), pygame.FULLSCREEN | pygame.SCALED, vsync=1)
+                except pygame.error:
+                    print("No se pudo activar el vsync. Se usará el modo normal.")
+                    SINCRONIZAR_VSYNC = False
+                    pantalla = pygame.display.set_mode((ancho, alto), pygame.FULLSCREEN)
+            else:
+                pantalla = pygame.display.set_mode((ancho, alto), pygame.FULLSCREEN)
+        pygame.display.set_caption('Juego de reflejos')
+    
+    # Ninguna pantalla usa el movimiento del ratón: así no despierta a las
+    # pantallas de reposo
+    pygame.event.set_blocked(MOUSEMOTION)
+    
+    ajustar_pantalla(*pantalla.get_size())
+
+def ajustar_pantalla(ancho, alto):
+    """
+    Calcula la disposición y carga las fuentes para un tamaño de pantalla.
+    Se llama al abrir la pantalla y cada vez que cambia el tamaño de la ventana;
+    las pantallas que están a la vista se vuelven a componer solas.
+    
+    Args:
+        ancho: Ancho de la pantalla en píxeles
+        alto: Alto de la pantalla en píxeles
+    """
+    global ANCHO, ALTO, ANCHO_IZQUIERDA, ANCHO_DERECHA, X_PANEL_HISTOGRAMA, disposicion
+    global fuente_grande, fuente_mediana, fuente_pequena, fuente_muy_pequena
+    
+    disposicion = disposicion_para(ancho, alto)
+    ANCHO = ancho
+    ALTO = alto
+    
+    # División de la pantalla - mitad izquierda para el juego, mitad derecha para el histograma
+    ANCHO_IZQUIERDA = disposicion.ancho_izquierda
+    ANCHO_DERECHA = disposicion.ancho_derecha
+    
+    # El panel del histograma empieza justo a la derecha de la línea divisoria
+    X_PANEL_HISTOGRAMA = disposicion.x_panel_histograma
+    
+    # Fuentes para texto, del tamaño que corresponde a la pantalla
+    for tamano in disposicion.tamanos_fuente.values():
+        if tamano not in fuentes:
+            fuentes[tamano] = pygame.font.Font(None, tamano)
+    fuente_grande = fuentes[disposicion.tamanos_fuente['grande']]
+    fuente_mediana = fuentes[disposicion.tamanos_fuente['mediana']]
+    fuente_pequena = fuentes[disposicion.tamanos_fuente['pequena']]
+    fuente_muy_pequena = fuentes[disposicion.tamanos_fuente['muy_pequena']]
+
+def comprobar_tamano(evento):
+    """
+    Si el evento es un cambio de tamaño de la ventana, ajusta la disposición.
+    
+    Returns:
+        bool: True si ha cambiado el tamaño de la pantalla
+    """
+    global pantalla
+    
+    if evento.type not in (VIDEORESIZE, WINDOWSIZECHANGED) or pantalla is None:
+        return False
+    if presentador is not None:
+        tamano = presentador.tamano
+    else:
+        # En pygame 2 la superficie de la pantalla ya tiene el tamaño nuevo
+        tamano = pantalla.get_size()
+    if tamano == (ANCHO, ALTO):
+        return False
+    if presentador is not None:
+        pantalla = pygame.Surface(tamano)
+    ajustar_pantalla(*tamano)
+    return True
+
+def nueva_superficie(tamano):
+    """
+    Crea una superficie para componer una pantalla o el histograma. Sin
+    texturas se convierte al formato de la pantalla para que copiarla sea
+    rápido; con texturas no hace falta (y no se puede: no hay modo de vídeo).
+    
+    Args:
+        tamano: (ancho, alto) de la superficie
+    
+    Returns:
+        Surface: Superficie nueva
+    """
+    superficie = pygame.Surface(tamano)
+    if presentador is None:
+        superficie = superficie.convert()
+    return superficie
+
+def volcar_pantalla(zonas=None):
+    """
+    Muestra lo que se ha dibujado: con texturas, las junta el renderizador;
+    si no, se vuelca la pantalla entera o solo las zonas indicadas.
+    
+    Args:
+        zonas: Lista de rectángulos que han cambiado, o None para toda la pantalla
+    """
+    if presentador is not None:
+        presentador.presentar()
+    elif zonas is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(zonas)
+
+class CacheTextos:
+    """
+    Caché de textos ya dibujados con una fuente. Así un texto que no cambia
+    (nombre de la escuela, créditos, títulos...) se dibuja una sola vez.
+    Cuando se llena, se descarta el texto que lleva más tiempo sin usarse.
+    """
+    
+    def __init__(self, capacidad=256):
+        """
+        Args:
+            capacidad: Número máximo de textos guardados
+        """
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._textos = OrderedDict()
+    
+    def render(self, fuente, texto, antialias, color):
+        """
+        Igual que fuente.render, pero reutiliza el resultado si ya se dibujó.
+        La superficie devuelta es compartida, así que no se debe modificar.
+        
+        Args:
+            fuente: Fuente con la que se dibuja el texto
+            texto: Texto a dibujar
+            antialias: Si se suavizan los bordes de las letras
+            color: Color del texto
+            
+        Returns:
+            Surface: Superficie con el texto dibujado
+        """
+        clave = (fuente, texto, tuple(color), antialias)
+        superficie = self._textos.get(clave)
+        if superficie is not None:
+            self.aciertos += 1
+            self._textos.move_to_end(clave)
+            return superficie
+        
+        self.fallos += 1
+        superficie = fuente.render(texto, antialias, color)
+        self._textos[clave] = superficie
+        if len(self._textos) > self.capacidad:
+            self._textos.popitem(last=False)
+        return superficie
+
+# Caché compartida por todas las pantallas
+cache_textos = CacheTextos()
+
+def renderizar_texto(fuente, texto, antialias, color):
+    """
+    Dibuja un texto con la fuente indicada usando la caché de textos.
+    
+    Returns:
+        Surface: Superficie con el texto dibujado (no se debe modificar)
+    """
+    with perfil.fase('texto'):
+        return cache_textos.render(fuente, texto, antialias, color)
 
 # Archivo para guardar los datos de los jugadores
 ARCHIVO_JUGADORES = 'jugadores.json'
 
+# Registro donde se van añadiendo los resultados nuevos (JSON Lines)
+ARCHIVO_REGISTRO = 'jugadores.jsonl'
+
+# Almacenes opcionales. Se eligen con la variable de entorno REFLEJOS_ALMACEN:
+# "sqlite" (base de datos) o "binario" (registros de tamaño fijo, para
+# historiales de millones de resultados)
+ARCHIVO_SQLITE = 'jugadores.sqlite3'
+ARCHIVO_BINARIO = 'jugadores.bin'
+ARCHIVO_NOMBRES = 'jugadores.nombres'
+TIPO_ALMACEN = os.environ.get('REFLEJOS_ALMACEN', 'json')
+
+# Servidor donde se juntan los resultados de varios puestos (ver agregacion.py),
+# con el formato "anfitrion:puerto". Sin REFLEJOS_SERVIDOR cada puesto solo usa
+# sus resultados. REFLEJOS_KIOSCO da nombre al puesto (por defecto, el del equipo)
+SERVIDOR_AGREGACION = os.environ.get('REFLEJOS_SERVIDOR')
+NOMBRE_KIOSCO = os.environ.get('REFLEJOS_KIOSCO')
+
+def limites_configurados():
+    """
+    Lee los límites del histograma de REFLEJOS_HISTOGRAMA. Un valor mal
+    escrito no impide arrancar el juego: se avisa y se usan los de siempre.
+    
+    Returns:
+        La cadena "auto" o una lista de límites
+    """
+    texto = os.environ.get('REFLEJOS_HISTOGRAMA')
+    try:
+        return leer_limites(texto)
+    except ValueError as e:
+        print(f"REFLEJOS_HISTOGRAMA={texto!r} no es válido ({e}). Se usarán los límites de siempre.")
+        return leer_limites(None)
+
+# Límites de los rangos del histograma. Con REFLEJOS_HISTOGRAMA se pueden
+# cambiar ("0,250,300,...") o calcular a partir de los datos ("auto")
+LIMITES_HISTOGRAMA = limites_configurados()
+
+# Intervalo de sondeo de la entrada en las pantallas cronometradas (segundos).
+# Es independiente de la velocidad de refresco: las pulsaciones se marcan
+# con una precisión de ~1 ms en lugar de los ~33 ms de un fotograma a 30 FPS
+INTERVALO_SONDEO = 0.001
+
+def marca_tiempo_ns():
+    """
+    Devuelve una marca de tiempo monótona de alta resolución.
+    
+    Returns:
+        int: Tiempo en nanosegundos (solo sirve para calcular diferencias)
+    """
+    return time.perf_counter_ns()
+
+# Marca de la pulsación con la que terminó el último esperar_tecla si la
+# capturó el hilo de captura (None si no): su evento de pygame puede llegar
+# a la cola un poco después y no lo debe ver la pantalla siguiente
+pulsacion_capturada = None
+
+def descartar_tecla_capturada():
+    """
+    Quita de la cola de pygame las teclas que quedan de la última pulsación
+    capturada por el hilo de captura. Si la pulsación llegó por pygame (o no
+    hubo), la cola no se toca.
+    """
+    global pulsacion_capturada
+    if pulsacion_capturada is None:
+        return
+    pygame.event.pump()
+    pygame.event.clear((KEYDOWN, TEXTINPUT))
+    pulsacion_capturada = None
+
+def esperar_tecla(limite_ns, desde_ns=None):
+    """
+    Espera una pulsación de tecla. Con la captura en otro hilo (durante una
+    ronda, ver CapturaTeclado.escuchar) se usa la marca de tiempo que puso ese
+    hilo (o el núcleo), aunque la pulsación llegara mientras se dibujaba. Si no, se sondea la cola de eventos de
+    pygame a alta frecuencia y la marca se toma en cuanto llega el evento.
+    
+    Args:
+        limite_ns: Instante (en la escala de marca_tiempo_ns) en el que se deja de esperar
+        desde_ns: Las pulsaciones capturadas antes de este instante no cuentan
+        
+    Returns:
+        int o None: Marca de tiempo en ns de la pulsación, o None si se alcanzó el límite
+    """
+    global pulsacion_capturada
+    pulsacion_capturada = None
+    ultimo_sondeo = marca_tiempo_ns()
+    while True:
+        for evento in pygame.event.get():
+            if evento.type == QUIT:
+                salir()
+            elif comprobar_tamano(evento):
+                # La pantalla a la vista se queda como está hasta la siguiente
+                continue
+            elif evento.type == KEYDOWN and not captura_teclado.recibiendo:
+                marca = marca_tiempo_ns()
+                traza_rondas.registrar(traza.ENTRADA, marca, evento.key)
+                # La tecla llegó en algún momento desde el sondeo anterior
+                perfil.retraso_entrada(marca - ultimo_sondeo)
+                perfil.despertar()
+                return marca
+        
+        if captura_teclado.recibiendo:
+            # La cola del hilo de captura despierta al juego en cuanto hay una pulsación
+            pulsacion = captura_teclado.esperar(INTERVALO_SONDEO)
+            if pulsacion is not None and (desde_ns is None or pulsacion[0] >= desde_ns):
+                marca, codigo = pulsacion
+                traza_rondas.registrar(traza.ENTRADA, marca, codigo)
+                # Lo que tardó el juego en enterarse de la pulsación
+                perfil.retraso_entrada(marca_tiempo_ns() - marca)
+                perfil.despertar()
+                # La misma tecla también llega a pygame: que no la vea la pantalla siguiente
+                # (la pantalla siguiente vuelve a quitarla con descartar_tecla_capturada)
+                pygame.event.clear((KEYDOWN, TEXTINPUT))
+                pulsacion_capturada = marca
+                return marca
+        
+        ultimo_sondeo = marca_tiempo_ns()
+        if ultimo_sondeo >= limite_ns:
+            perfil.despertar()
+            return None
+        
+        if not captura_teclado.recibiendo:
+            time.sleep(INTERVALO_SONDEO)
+
+def presentar_estimulo():
+    """
+    Vuelca en pantalla el fotograma del estímulo ya dibujado y toma la marca
+    de tiempo justo después, cuando el panel rojo ya es visible. Así el tiempo
+    de dibujado y del propio volcado no se cuenta como tiempo del jugador.
+    
+    Returns:
+        int: Marca de tiempo en ns de la aparición del estímulo
+    """
+    antes_flip = marca_tiempo_ns()
+    volcar_pantalla()
+    inicio = marca_tiempo_ns()
+    
+    # La duración del volcado queda en el perfil y en la traza de la ronda
+    perfil.registrar('volcado', antes_flip, inicio - antes_flip)
+    traza_rondas.registrar(traza.ESTIMULO, inicio, inicio - antes_flip)
+    contar_fotograma()
+    
+    return inicio
+
+def esperar_eventos():
+    """
+    Espera sin gastar CPU hasta que llegue algún evento. Es lo que usan las
+    pantallas de reposo en lugar de redibujar a 30 FPS; las cronometradas
+    usan esperar_tecla. Si cambia el tamaño de la ventana se ajusta la
+    disposición, y la pantalla se vuelve a componer al ver que ha cambiado.
+    
+    Returns:
+        Lista con el evento recibido y los que ya estuvieran en la cola
+    """
+    evento = pygame.event.wait()
+    perfil.despertar()
+    with perfil.fase('eventos'):
+        eventos = [evento] + pygame.event.get()
+        for evento in eventos:
+            comprobar_tamano(evento)
+        return eventos
+
+@contextmanager
+def temporizador(tipo_evento, milisegundos, repetir=True):
+    """
+    Envía un evento propio cada cierto tiempo mientras dura el bloque with.
+    Al salir se para y se descartan los eventos que no se hayan procesado.
+    
+    Args:
+        tipo_evento: Tipo del evento (EVENTO_CURSOR, EVENTO_FIN_PANTALLA...)
+        milisegundos: Tiempo entre eventos
+        repetir: Si es False, el evento se envía una sola vez
+    """
+    pygame.time.set_timer(tipo_evento, milisegundos, 0 if repetir else 1)
+    try:
+        yield
+    finally:
+        pygame.time.set_timer(tipo_evento, 0)
+        pygame.event.clear(tipo_evento)
+
+# Registro de resultados, se abre la primera vez que se usa
+registro = None
+
+def obtener_registro():
+    """
+    Devuelve el registro de resultados, abriéndolo la primera vez.
+    Los resultados se guardan en segundo plano; al salir del programa se
+    guardan los pendientes y se cierra solo, así no se pierde ningún resultado.
+    
+    Returns:
+        EscritorSegundoPlano: Registro de resultados de los jugadores
+    """
+    global registro
+    if registro is None:
+        # La primera vez se importan los resultados de los archivos JSON
+        if TIPO_ALMACEN == 'sqlite':
+            base = RegistroSQLite(ARCHIVO_SQLITE, migrar_desde=(ARCHIVO_JUGADORES, ARCHIVO_REGISTRO))
+        elif TIPO_ALMACEN == 'binario':
+            base = RegistroBinario(ARCHIVO_BINARIO, ARCHIVO_NOMBRES, migrar_desde=(ARCHIVO_JUGADORES, ARCHIVO_REGISTRO))
+        else:
+            base = RegistroResultados(ARCHIVO_JUGADORES, ARCHIVO_REGISTRO)
+        registro = EscritorSegundoPlano(base)
+        atexit.register(registro.cerrar)
+    return registro
+
+def salir():
+    """
+    Guarda los resultados que quedan pendientes y cierra el juego.
+    """
+    captura_teclado.detener()
+    if cliente_agregacion is not None:
+        cliente_agregacion.detener()
+    if registro is not None:
+        registro.cerrar()
+    if MOSTRAR_CONSUMO:
+        consumo_pantallas.terminar()
+        for linea in consumo_pantallas.informe():
+            print(linea)
+    if presentador is not None:
+        presentador.cerrar()
+    pygame.quit()
+    sys.exit()
+
 def cargar_datos():
     """
-    Carga los datos de los jugadores desde el archivo JSON.
-    Si el archivo no existe o está corrupto, crea una estructura de datos vacía.
+    Carga los datos de los jugadores: la última instantánea guardada más los
+    resultados añadidos después al registro.
+    Si la instantánea está corrupta se aparta una copia en lugar de perderla.
     """
-    if os.path.exists(ARCHIVO_JUGADORES):
-        try:
-            with open(ARCHIVO_JUGADORES, 'r') as archivo:
-                return json.load(archivo)
-        except:
-            print("Error al cargar el archivo de jugadores. Creando nuevo archivo.")
-            return {'jugadores': []}
-    else:
-        return {'jugadores': []}
+    return obtener_registro().cargar()
 
 def guardar_datos(datos):
     """
-    Guarda los datos de los jugadores en el archivo JSON.
+    Guarda todos los datos de los jugadores en el archivo JSON y vacía el registro.
+    """
+    obtener_registro().compactar(datos)
+
+# Datos de los jugadores compartidos por todas las pantallas
+almacen = None
+
+def obtener_almacen():
+    """
+    Devuelve el almacén en memoria con los datos de los jugadores.
+    Los datos se leen del disco una sola vez por proceso.
+    
+    Returns:
+        AlmacenJugadores: Almacén compartido por todas las pantallas
+    """
+    global almacen
+    if almacen is None:
+        almacen = AlmacenJugadores(obtener_registro(), LIMITES_HISTOGRAMA)
+    return almacen
+
+def obtener_estadisticas():
+    """
+    Devuelve las estadísticas de todos los jugadores sin acceder al disco
+    (salvo la primera vez). Con un servidor de agregación son las de todos
+    los puestos, en cuanto se hayan aplicado con actualizar_estadisticas_servidor.
+    
+    Returns:
+        Estadisticas: Objeto con las estadísticas de todos los jugadores
+    """
+    if cliente_agregacion is not None and cliente_agregacion.estadisticas is not None:
+        return cliente_agregacion.estadisticas
+    return obtener_almacen().estadisticas
+
+# Cliente del servidor de agregación (None si no se usa)
+cliente_agregacion = None
+
+def actualizar_estadisticas_servidor():
+    """
+    Aplica las últimas estadísticas recibidas del servidor de agregación. Se
+    hace solo en las pantallas de bienvenida y de resultados, que no miden
+    tiempos, para que el hilo del cliente no ocupe el intérprete reconstruyéndolas.
     """
-    with open(ARCHIVO_JUGADORES, 'w') as archivo:
-        json.dump(datos, archivo)
+    if cliente_agregacion is not None:
+        cliente_agregacion.actualizar_estadisticas()
+
+def leer_resultados_locales(desde, hasta):
+    """
+    Lee los resultados de este puesto que el servidor de agregación todavía no tiene.
+    
+    Args:
+        desde: Posición del primer resultado
+        hasta: Posición siguiente al último
+        
+    Returns:
+        Lista de diccionarios con 'nombre' y 'tiempo'
+    """
+    return obtener_registro().leer_resultados(desde, hasta)
+
+def iniciar_agregacion():
+    """
+    Arranca el cliente del servidor de agregación si se ha configurado uno.
+    """
+    global cliente_agregacion
+    if not SERVIDOR_AGREGACION or cliente_agregacion is not None:
+        return
+    anfitrion, _, puerto = SERVIDOR_AGREGACION.rpartition(':')
+    if not anfitrion:
+        anfitrion, puerto = SERVIDOR_AGREGACION, PUERTO_AGREGACION
+    cliente_agregacion = ClienteAgregacion(anfitrion, int(puerto), NOMBRE_KIOSCO,
+                                           cantidad_local=obtener_almacen().estadisticas.cantidad,
+                                           leer_locales=leer_resultados_locales,
+                                           limites=LIMITES_HISTOGRAMA)
+    cliente_agregacion.iniciar()
 
 def obtener_mejores_jugadores(datos, numero=5):
     """
-    Devuelve una lista con los mejores jugadores ordenados por tiempo (menor es mejor).
+    Devuelve una lista con los mejores jugadores ordenados por tiempo (menor es mejor),
+    con el mejor intento de cada jugador.
     
     Args:
         datos: Diccionario con los datos de los jugadores
@@ -87,9 +633,27 @@ def obtener_mejores_jugadores(datos, numero=5):
     Returns:
         Lista de diccionarios con los mejores jugadores
     """
-    # Ordenar por tiempo de reacción (menor es mejor)
-    jugadores_ordenados = sorted(datos['jugadores'], key=lambda x: x['tiempo'])
-    return jugadores_ordenados[:numero]
+    return IndiceJugadores.desde_jugadores(datos['jugadores'], numero).mejores_jugadores()
+
+def texto_ficha_jugador(estadisticas, nombre):
+    """
+    Prepara la línea con las marcas de un jugador para la pantalla de bienvenida.
+    
+    Args:
+        estadisticas: Estadísticas de todos los jugadores
+        nombre: Nombre escrito hasta ahora
+        
+    Returns:
+        str: Texto con el mejor tiempo, los intentos y los últimos tiempos,
+             o una cadena vacía si el jugador todavía no ha jugado
+    """
+    if not nombre.strip():
+        return ""
+    ficha = estadisticas.jugadores.ficha(nombre)
+    if ficha is None:
+        return ""
+    ultimos = ", ".join(str(tiempo) for tiempo in reversed(ficha.recientes))
+    return f"Tu mejor: {ficha.mejor} ms · {ficha.intentos} intentos · últimos: {ultimos}"
 
 def calcular_media(datos):
     """
@@ -122,369 +686,574 @@ def obtener_mejor_tiempo(datos):
     
     return min(jugador['tiempo'] for jugador in datos['jugadores'])
 
-def generar_datos_histograma(datos):
+def generar_datos_histograma(datos, limites=None):
     """
     Genera los datos para el histograma de tiempos de reacción.
     
     Args:
         datos: Diccionario con los datos de los jugadores
+        limites: Límites de los rangos (por defecto, los configurados)
         
     Returns:
-        Lista de 10 elementos con el conteo de jugadores por rango de tiempo
+        Lista con el conteo de jugadores por rango de tiempo. El primer elemento
+        cuenta los tiempos por debajo del primer límite y el último los que pasan del último
     """
-# Definir los rangos específicos
-    rangos_limites = [0, 200, 220, 240, 260, 280, 300, 320, 340, 360, 380]
-    
-    # Inicializar contadores para cada rango
-    rangos_conteo = [0] * 10
+    tiempos = [jugador['tiempo'] for jugador in datos['jugadores']]
     
-    # Contar jugadores en cada rango
-    for jugador in datos['jugadores']:
-        tiempo = jugador['tiempo']
-        
-        # Ubicar el tiempo en el rango correspondiente
-        for i in range(10):
-            if rangos_limites[i] <= tiempo < rangos_limites[i+1]:
-                rangos_conteo[i] += 1
-                break
+    if limites is None:
+        limites = LIMITES_HISTOGRAMA
+    if limites == 'auto':
+        limites = limites_automaticos(tiempos)
     
-    return rangos_conteo
+    return contar_por_rangos(tiempos, limites)
+
+# Panel del histograma ya dibujado y la clave de los datos con los que se dibujó
+panel_histograma = None
+clave_panel_histograma = None
 
-def dibujar_histograma(datos):
+def dibujar_panel_histograma(estadisticas, panel):
     """
-    Dibuja un histograma de distribución de tiempos de reacción en la parte derecha de la pantalla.
+    Dibuja el histograma completo (título, ejes, etiquetas y barras) en una
+    superficie aparte que se coloca en X_PANEL_HISTOGRAMA. Las posiciones
+    salen de la disposición de la pantalla, calculadas una vez por tamaño.
     
     Args:
-        datos: Diccionario con los datos de los jugadores
+        estadisticas: Estadísticas de todos los jugadores
+        panel: Superficie del panel donde dibujar
     """
-    # Área para el histograma
-    area_x = ANCHO_IZQUIERDA + 50
-    area_y = 150
-    area_ancho = ANCHO_DERECHA - 100
-    area_alto = ALTO - 300
+    panel.fill(NEGRO)
+    
+    # Obtener datos para el histograma (las etiquetas salen de los mismos límites)
+    rangos_etiquetas, conteos = estadisticas.rangos_visibles()
+    numero_rangos = len(conteos)
+    geometria = disposicion.histograma(numero_rangos)
     
     # Dibujar título
-    titulo = fuente_mediana.render("Distribución de tiempos de reacción", True, BLANCO)
-    pantalla.blit(titulo, (ANCHO_IZQUIERDA + (ANCHO_DERECHA // 2) - titulo.get_width() // 2, 80))
+    titulo = renderizar_texto(fuente_mediana, "Distribución de tiempos de reacción", True, BLANCO)
+    panel.blit(titulo, (geometria.titulo[0] - titulo.get_width() // 2, geometria.titulo[1]))
     
     # Dibujar ejes
-    pygame.draw.line(pantalla, BLANCO, (area_x, area_y), (area_x, area_y + area_alto), 2)  # Eje Y
-    pygame.draw.line(pantalla, BLANCO, (area_x, area_y + area_alto), (area_x + area_ancho, area_y + area_alto), 2)  # Eje X
-    
-    # Obtener datos para el histograma
-    conteos = generar_datos_histograma(datos)
+    pygame.draw.line(panel, BLANCO, *geometria.eje_y, 2)
+    pygame.draw.line(panel, BLANCO, *geometria.eje_x, 2)
     
     # Encontrar el valor máximo para escalar las barras
     max_conteo = max(conteos) if max(conteos) > 0 else 1
     
     # Dibujar etiquetas del eje X (tiempos)
-    rangos_etiquetas = ["0-199", "200-219", "220-239", "240-259", "260-279", 
-                        "280-299", "300-319", "320-339", "340-359", "360-380"]
-    for i in range(10):
-        etiqueta = fuente_muy_pequena.render(rangos_etiquetas[i], True, BLANCO)
-        x_pos = area_x + (i * area_ancho // 10) + (area_ancho // 20)
-        pantalla.blit(etiqueta, (x_pos - etiqueta.get_width() // 2, area_y + area_alto + 5))
+    for texto, (x_centro, y) in zip(rangos_etiquetas, geometria.etiquetas_rangos):
+        etiqueta = renderizar_texto(fuente_muy_pequena, texto, True, BLANCO)
+        panel.blit(etiqueta, (x_centro - etiqueta.get_width() // 2, y))
     
     # Dibujar etiquetas del eje Y (número de jugadores)
-    for i in range(5):
-        valor = i * (max_conteo // 4 + 1)
-        if i == 4:  # Para la etiqueta superior
+    ultima_marca = len(geometria.marcas_y) - 1
+    for i, (x_derecha, y_centro) in enumerate(geometria.marcas_y):
+        valor = i * (max_conteo // ultima_marca + 1)
+        if i == ultima_marca:  # Para la etiqueta superior
             valor = max_conteo
-        etiqueta = fuente_muy_pequena.render(str(valor), True, BLANCO)
-        y_pos = area_y + area_alto - (i * area_alto // 4)
-        pantalla.blit(etiqueta, (area_x - etiqueta.get_width() - 5, y_pos - etiqueta.get_height() // 2))
+        etiqueta = renderizar_texto(fuente_muy_pequena, str(valor), True, BLANCO)
+        panel.blit(etiqueta, (x_derecha - etiqueta.get_width(), y_centro - etiqueta.get_height() // 2))
     
     # Dibujar barras
-    ancho_barra = (area_ancho) // 10 - 10
-    for i, conteo in enumerate(conteos):
-        if max_conteo > 0:
-            altura_barra = (conteo / max_conteo) * area_alto
-        else:
-            altura_barra = 0
-        
-        x = area_x + 5 + (i * area_ancho // 10)
-        y = area_y + area_alto - altura_barra
+    for i, (conteo, x) in enumerate(zip(conteos, geometria.x_barras)):
+        altura_barra = (conteo / max_conteo) * geometria.area_alto
         
         # Alternar colores para mejor visibilidad
         color = VERDE if i % 2 == 0 else AZUL_CLARO
         
-        pygame.draw.rect(pantalla, color, (x, y, ancho_barra, altura_barra))
+        pygame.draw.rect(panel, color, (x, geometria.base_barras - altura_barra, geometria.ancho_barra, altura_barra))
     
     # Dibujar etiqueta de eje X
-    etiqueta_x = fuente_pequena.render("Tiempo (ms)", True, BLANCO)
-    pantalla.blit(etiqueta_x, (area_x + area_ancho // 2 - etiqueta_x.get_width() // 2, area_y + area_alto + 30))
+    etiqueta_x = renderizar_texto(fuente_pequena, "Tiempo (ms)", True, BLANCO)
+    panel.blit(etiqueta_x, (geometria.nombre_eje_x[0] - etiqueta_x.get_width() // 2, geometria.nombre_eje_x[1]))
     
     # Dibujar etiqueta de eje Y
-    etiqueta_y = fuente_pequena.render("Jugadores", True, BLANCO)
+    etiqueta_y = renderizar_texto(fuente_pequena, "Jugadores", True, BLANCO)
     # Rotar texto para eje Y
     etiqueta_y_rotada = pygame.transform.rotate(etiqueta_y, 90)
-    pantalla.blit(etiqueta_y_rotada, (area_x - 40, area_y + area_alto // 2 - etiqueta_y_rotada.get_height() // 2))
+    panel.blit(etiqueta_y_rotada, (geometria.nombre_eje_y[0],
+                                   geometria.nombre_eje_y[1] - etiqueta_y_rotada.get_height() // 2))
+
+def dibujar_histograma(estadisticas, superficie=None):
+    """
+    Dibuja un histograma de distribución de tiempos de reacción en la parte derecha de la pantalla.
+    El panel solo se vuelve a dibujar cuando cambian los datos o el tamaño de la pantalla;
+    el resto de las veces basta con copiarlo.
+    
+    Args:
+        estadisticas: Estadísticas de todos los jugadores
+        superficie: Superficie donde dibujar (por defecto, la pantalla)
+    """
+    global panel_histograma, clave_panel_histograma
+    
+    if superficie is None:
+        superficie = pantalla
+    
+    with perfil.fase('histograma'):
+        clave = (estadisticas, estadisticas.version, disposicion)
+        if clave != clave_panel_histograma:
+            panel_histograma = nueva_superficie((ANCHO - X_PANEL_HISTOGRAMA, ALTO))
+            dibujar_panel_histograma(estadisticas, panel_histograma)
+            clave_panel_histograma = clave
+        
+        superficie.blit(panel_histograma, (X_PANEL_HISTOGRAMA, 0))
 
-def dibujar_boton_salir():
+def dibujar_boton_salir(superficie=None):
     """
     Dibuja un pequeño botón X para salir del juego en la esquina superior derecha.
     
+    Args:
+        superficie: Superficie donde dibujar (por defecto, la pantalla)
+    
     Returns:
         Rect: Objeto rectángulo que representa el área del botón
     """
+    if superficie is None:
+        superficie = pantalla
+    
     # Dibujar un pequeño botón de salida en la esquina superior derecha
-    tamano_boton = 30
-    margen = 10
-    pygame.draw.rect(pantalla, NEGRO, (ANCHO - tamano_boton - margen, margen, tamano_boton, tamano_boton))
-    pygame.draw.rect(pantalla, BLANCO, (ANCHO - tamano_boton - margen, margen, tamano_boton, tamano_boton), 2)
+    boton = pygame.Rect(disposicion.boton_salir)
+    pygame.draw.rect(superficie, NEGRO, boton)
+    pygame.draw.rect(superficie, BLANCO, boton, 2)
     
     # Dibujar una X
-    x = fuente_pequena.render("X", True, BLANCO)
-    pantalla.blit(x, (ANCHO - tamano_boton - margen + tamano_boton//2 - x.get_width()//2, 
-                      margen + tamano_boton//2 - x.get_height()//2))
+    x = renderizar_texto(fuente_pequena, "X", True, BLANCO)
+    superficie.blit(x, x.get_rect(center=boton.center))
+    
+    return boton
+
+# Fotogramas y tiempo de CPU de cada pantalla
+consumo_pantallas = ConsumoPantallas()
+
+# Medidas de tiempo de cada fase del fotograma (desactivado salvo que se pida)
+perfil = Perfilador(consumo_pantallas)
+
+# Traza de las pantallas de espera y de reacción de cada ronda
+traza_rondas = traza.GrabadorTraza(ARCHIVO_TRAZA)
+
+# Hilo que lee el teclado mientras el juego dibuja (se arranca en main)
+captura_teclado = CapturaTeclado()
+
+def contar_fotograma():
+    """
+    Apunta un volcado de pantalla en los contadores de consumo, en el
+    perfilador y en la traza de la ronda.
+    """
+    consumo_pantallas.fotograma()
+    perfil.fotograma()
+    traza_rondas.registrar(traza.VOLCADO, marca_tiempo_ns())
+
+class EscenaRetenida:
+    """
+    Fondo con los elementos de una pantalla que no cambian (nombre de la escuela,
+    créditos, línea divisoria, botón de salir, histograma...) y las zonas que han
+    cambiado desde el último volcado. En cada fotograma solo se actualizan esas
+    zonas con pygame.display.update en lugar de volcar la pantalla entera.
+    Con texturas, el fondo se sube una vez y los elementos se juntan encima.
+    """
     
-    return pygame.Rect(ANCHO - tamano_boton - margen, margen, tamano_boton, tamano_boton)
+    def __init__(self):
+        # Disposición con la que se compone: si cambia, hay que componer otra escena
+        self.disposicion = disposicion
+        with perfil.fase('fondo'):
+            self.fondo = nueva_superficie((ANCHO, ALTO))
+            self.fondo.fill(NEGRO)
+            
+            # Dibujar línea divisoria vertical
+            pygame.draw.line(self.fondo, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
+        
+        self._zonas_elementos = {}
+        self._zonas_sucias = []
+        # Último texto del perfilador y su imagen
+        self._texto_perfil = None
+        self._imagen_perfil = None
+    
+    def mostrar(self):
+        """
+        Copia el fondo completo en la pantalla y la vuelca entera (primer fotograma).
+        """
+        with perfil.fase('fondo'):
+            if presentador is not None:
+                presentador.subir_fondo('escena', self.fondo)
+                presentador.usar_fondo('escena')
+            else:
+                pantalla.blit(self.fondo, (0, 0))
+        self._zonas_elementos = {}
+        self._dibujar_perfil()
+        with perfil.fase('volcado'):
+            volcar_pantalla()
+        self._zonas_sucias = []
+        contar_fotograma()
+    
+    def colocar(self, nombre, imagen, posicion):
+        """
+        Dibuja un elemento que cambia, borrando antes el sitio que ocupaba.
+        
+        Args:
+            nombre: Nombre con el que se identifica el elemento
+            imagen: Superficie con el elemento ya dibujado
+            posicion: Posición (x, y) en la pantalla
+        """
+        if presentador is not None:
+            # El renderizador vuelve a juntar todo: no hay nada que borrar
+            self._zonas_sucias.append(presentador.colocar(nombre, imagen, posicion))
+            return
+        
+        anterior = self._zonas_elementos.get(nombre)
+        if anterior is not None:
+            pantalla.blit(self.fondo, anterior, anterior)
+            self._zonas_sucias.append(anterior)
+        
+        zona = pantalla.blit(imagen, posicion)
+        self._zonas_elementos[nombre] = zona
+        self._zonas_sucias.append(zona)
+    
+    def actualizar(self):
+        """
+        Vuelca en la pantalla solo las zonas que han cambiado.
+        """
+        if self._zonas_sucias:
+            self._dibujar_perfil()
+            with perfil.fase('volcado'):
+                volcar_pantalla(self._zonas_sucias)
+            self._zonas_sucias = []
+            contar_fotograma()
+    
+    def _dibujar_perfil(self):
+        """
+        Si el perfilador está activado, muestra sus percentiles en la esquina
+        superior izquierda. Se dibuja sin la caché de textos porque cambia a
+        menudo, pero solo cuando el perfilador recalcula el texto.
+        """
+        if perfil.activo:
+            texto = perfil.texto_resumen()
+            if texto != self._texto_perfil:
+                self._texto_perfil = texto
+                self._imagen_perfil = fuente_muy_pequena.render(texto, True, AMARILLO, NEGRO)
+            self.colocar('perfil', self._imagen_perfil, (0, 0))
+
+def componer_bienvenida(estadisticas):
+    """
+    Dibuja en el fondo de una escena todo lo que no cambia en la pantalla de
+    bienvenida: títulos, mejores jugadores, tiempos medios, botones e histograma.
+    
+    Args:
+        estadisticas: Estadísticas de todos los jugadores
+    
+    Returns:
+        Tupla (escena, y del campo de texto, y de las marcas del jugador,
+        rectángulo del botón jugar, rectángulo del botón salir)
+    """
+    # La clasificación tiene el mejor intento de cada jugador
+    mejores = estadisticas.jugadores.mejores_jugadores()
+    tiempo_medio = estadisticas.media()
+    
+    # Textos de la columna de la izquierda y el espacio que ocupa cada uno
+    # (en la pantalla de referencia)
+    titulo = renderizar_texto(fuente_grande, "COMPRUEBA TUS REFLEJOS", True, BLANCO)
+    subtitulo = renderizar_texto(fuente_mediana, "Mejores Jugadores:", True, BLANCO)
+    if mejores:
+        lista = [renderizar_texto(fuente_pequena, f"{i+1}. {jugador['nombre']}: {jugador['tiempo']} ms", True, BLANCO)
+                 for i, jugador in enumerate(mejores)]
+    else:
+        lista = [renderizar_texto(fuente_pequena, "Aún no hay registros", True, BLANCO)]
+    medio = None
+    if tiempo_medio > 0:
+        medio = renderizar_texto(fuente_pequena, f"Tiempo medio de nuestros jugadores: {int(tiempo_medio)} ms",
+                                 True, AMARILLO)
+    referencia = renderizar_texto(fuente_pequena, f"Tiempo medio de la poblacion: {TIEMPO_REACCION_MEDIA} ms",
+                                  True, AMARILLO)
+    instruccion = renderizar_texto(fuente_mediana, "Ingresa tu nombre:", True, BLANCO)
+    ancho_boton = disposicion.medida(200)
+    
+    filas = ((titulo.get_width(), 80), (subtitulo.get_width(), 60)) + \
+            tuple((render.get_width(), 40) for render in lista) + \
+            ((medio.get_width() if medio else 0, 40), (referencia.get_width(), 60),
+             (instruccion.get_width(), 50),
+             (0, 50),  # Campo de texto, lo único que cambia en esta pantalla
+             (0, 50),  # Marcas del jugador que escribe su nombre
+             (ancho_boton, 50))  # Botón jugar
+    
+    # Centrado vertical en la parte izquierda, debajo del nombre de la escuela
+    posiciones = disposicion.columna(filas, y_minimo=80)
+    
+    escena = EscenaRetenida()
+    fondo = escena.fondo
+    
+    # Nombre de la escuela en la parte superior izquierda
+    escuela = renderizar_texto(fuente_mediana, NOMBRE_ESCUELA, True, BLANCO)
+    fondo.blit(escuela, (disposicion.x_centrado(escuela.get_width()), disposicion.y_escuela))
+    
+    for render, posicion in zip([titulo, subtitulo] + lista + [medio, referencia, instruccion], posiciones):
+        if render is not None:
+            fondo.blit(render, posicion)
+    y_campo_texto = posiciones[-3][1]
+    y_ficha = posiciones[-2][1]
+    
+    # Botón de jugar (también es el área de clic)
+    rect_boton_jugar = pygame.Rect(posiciones[-1], (ancho_boton, disposicion.medida(50)))
+    pygame.draw.rect(fondo, VERDE, rect_boton_jugar)
+    texto_boton = renderizar_texto(fuente_mediana, "JUGAR", True, NEGRO)
+    fondo.blit(texto_boton, texto_boton.get_rect(center=rect_boton_jugar.center))
+    
+    # Créditos en la parte inferior
+    creditos = renderizar_texto(fuente_muy_pequena, CREDITOS, True, BLANCO)
+    fondo.blit(creditos, (disposicion.x_centrado(creditos.get_width()), disposicion.y_creditos))
+    
+    # Dibujar histograma en la parte derecha
+    dibujar_histograma(estadisticas, fondo)
+    
+    # Botón de salir
+    boton_salir = dibujar_boton_salir(fondo)
+    
+    return escena, y_campo_texto, y_ficha, rect_boton_jugar, boton_salir
 
+@consumo_pantallas.medir('bienvenida')
 def pantalla_bienvenida():
     """
     Muestra la pantalla de bienvenida con la entrada del nombre del jugador.
-    También muestra los mejores jugadores y estadísticas.
+    También muestra los mejores jugadores, estadísticas y las marcas del
+    jugador cuyo nombre se está escribiendo.
     
     Returns:
         str: Nombre del jugador ingresado
     """
-    # Cargar datos de jugadores
-    datos = cargar_datos()
-    mejores = obtener_mejores_jugadores(datos)
-    tiempo_medio = calcular_media(datos)
+    # Recargar los datos solo si otro programa ha cambiado los archivos
+    obtener_almacen().comprobar_cambios()
+    actualizar_estadisticas_servidor()
+    
+    estadisticas = obtener_estadisticas()
     nombre = ""
     cursor_visible = True
-    ultimo_cambio = time.time()
     
     # Longitud máxima del nombre
     LONGITUD_MAXIMA_NOMBRE = 20
     
-    # Calcular altura total del contenido para centrado vertical en la parte izquierda
-    altura_total = 0
-    altura_total += 80  # Título escuela
-    altura_total += 80  # Título juego
-    altura_total += 60  # Subtítulo mejores jugadores
-    altura_total += (len(mejores) if mejores else 1) * 40  # Lista de jugadores
-    altura_total += 40  # Tiempo medio
-    altura_total += 40  # Tiempo referencia
-    altura_total += 60  # Instrucción nombre
-    altura_total += 50  # Campo de texto
-    altura_total += 70  # Botón jugar
-    altura_total += 40  # Créditos
-    
-    # Calcular posición inicial para centrado vertical
-    y_inicio = (ALTO - altura_total) // 2
+    escena = None
     
-    while True:
-        pantalla.fill(NEGRO)
-        
-        # Dibujar línea divisoria vertical
-        pygame.draw.line(pantalla, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
-        
-        # Nombre de la escuela en la parte superior izquierda
-        escuela = fuente_mediana.render(NOMBRE_ESCUELA, True, BLANCO)
-        pantalla.blit(escuela, (ANCHO_IZQUIERDA//2 - escuela.get_width()//2, 20))
-        
-        # Posición vertical actual (empezando desde el centrado)
-        y_pos = y_inicio
-        
-        # Título
-        titulo = fuente_grande.render("COMPRUEBA TUS REFLEJOS", True, BLANCO)
-        pantalla.blit(titulo, (ANCHO_IZQUIERDA//2 - titulo.get_width()//2, y_pos))
-        y_pos += 80
-        
-        # Mejores jugadores
-        subtitulo = fuente_mediana.render("Mejores Jugadores:", True, BLANCO)
-        pantalla.blit(subtitulo, (ANCHO_IZQUIERDA//2 - subtitulo.get_width()//2, y_pos))
-        y_pos += 60
-        
-        if mejores:
-            for i, jugador in enumerate(mejores):
-                texto = f"{i+1}. {jugador['nombre']}: {jugador['tiempo']} ms"
-                render = fuente_pequena.render(texto, True, BLANCO)
-                pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-                y_pos += 40
-        else:
-            texto = "Aún no hay registros"
-            render = fuente_pequena.render(texto, True, BLANCO)
-            pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-            y_pos += 40
-        
-        # Tiempo medio de los jugadores
-        if tiempo_medio > 0:
-            texto = f"Tiempo medio de nuestros jugadores: {int(tiempo_medio)} ms"
-            render = fuente_pequena.render(texto, True, AMARILLO)
-            pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-        y_pos += 40
-        
-        # Tiempo medio de referencia
-        texto = f"Tiempo medio de la poblacion: {TIEMPO_REACCION_MEDIA} ms"
-        render = fuente_pequena.render(texto, True, AMARILLO)
-        pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-        y_pos += 60
-        
-        # Entrada de nombre
-        instruccion = fuente_mediana.render("Ingresa tu nombre:", True, BLANCO)
-        pantalla.blit(instruccion, (ANCHO_IZQUIERDA//2 - instruccion.get_width()//2, y_pos))
-        y_pos += 50
-        
-        # Actualizar el cursor parpadeante cada 0.5 segundos
-        if time.time() - ultimo_cambio > 0.5:
-            cursor_visible = not cursor_visible
-            ultimo_cambio = time.time()
-        
-        # Mostrar el campo de texto con cursor
-        if cursor_visible:
-            texto_input = fuente_mediana.render(nombre + "|", True, BLANCO)
-        else:
-            texto_input = fuente_mediana.render(nombre + " ", True, BLANCO)
-        
-        pantalla.blit(texto_input, (ANCHO_IZQUIERDA//2 - texto_input.get_width()//2, y_pos))
-        y_pos += 70
-        
-        # Botón de jugar
-        pygame.draw.rect(pantalla, VERDE, (ANCHO_IZQUIERDA//2 - 100, y_pos, 200, 50))
-        texto_boton = fuente_mediana.render("JUGAR", True, NEGRO)
-        pantalla.blit(texto_boton, (ANCHO_IZQUIERDA//2 - texto_boton.get_width()//2, y_pos + 10))
-        
-        # Área de clic para el botón jugar
-        rect_boton_jugar = pygame.Rect(ANCHO_IZQUIERDA//2 - 100, y_pos, 200, 50)
-        
-        # Créditos en la parte inferior
-        creditos = fuente_muy_pequena.render(CREDITOS, True, BLANCO)
-        pantalla.blit(creditos, (ANCHO_IZQUIERDA//2 - creditos.get_width()//2, ALTO - 40))
-        
-        # Dibujar histograma en la parte derecha
-        dibujar_histograma(datos)
-        
-        # Botón de salir
-        boton_salir = dibujar_boton_salir()
-        
-        pygame.display.flip()
-        
-        for evento in pygame.event.get():
-            if evento.type == QUIT:
-                pygame.quit()
-                sys.exit()
-            elif evento.type == KEYDOWN:
-                if evento.key == K_RETURN and nombre.strip():
-                    # Si el usuario presiona Enter y el nombre no está vacío
-                    return nombre
-                elif evento.key == K_BACKSPACE:
-                    # Borrar el último carácter
-                    nombre = nombre[:-1]
-                # Permitir letras, números y espacio, y limitar a LONGITUD_MAXIMA_NOMBRE caracteres
-                elif (evento.unicode.isalnum() or evento.unicode == ' ') and len(nombre) < LONGITUD_MAXIMA_NOMBRE:
-                    nombre += evento.unicode
-            elif evento.type == MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                # Verificar si hizo clic en el botón de jugar
-                if rect_boton_jugar.collidepoint(mouse_pos):
-                    if nombre.strip():  # Verificar que el nombre no esté vacío
+    # El cursor parpadea con un temporizador: el bucle solo se despierta
+    # cuando hay algo que cambiar
+    with temporizador(EVENTO_CURSOR, INTERVALO_CURSOR_MS):
+        while True:
+            # Todo menos el campo de texto y las marcas se dibuja una sola vez
+            # en el fondo, y otra si cambia el tamaño de la pantalla
+            if escena is None or escena.disposicion is not disposicion:
+                escena, y_campo_texto, y_ficha, rect_boton_jugar, boton_salir = componer_bienvenida(estadisticas)
+                escena.mostrar()
+                campo_dibujado = None
+                ficha_dibujada = None
+            
+            # Redibujar el campo de texto solo si ha cambiado
+            if (nombre, cursor_visible) != campo_dibujado:
+                # Mostrar el campo de texto con cursor
+                if cursor_visible:
+                    texto_input = renderizar_texto(fuente_mediana, nombre + "|", True, BLANCO)
+                else:
+                    texto_input = renderizar_texto(fuente_mediana, nombre + " ", True, BLANCO)
+                
+                escena.colocar('campo_texto', texto_input,
+                               (disposicion.x_centrado(texto_input.get_width()), y_campo_texto))
+                campo_dibujado = (nombre, cursor_visible)
+            
+            # Buscar las marcas del jugador solo cuando cambia el nombre
+            if nombre != ficha_dibujada:
+                texto_ficha = renderizar_texto(fuente_muy_pequena, texto_ficha_jugador(estadisticas, nombre),
+                                               True, AMARILLO)
+                escena.colocar('ficha', texto_ficha,
+                               (disposicion.x_centrado(texto_ficha.get_width()), y_ficha))
+                ficha_dibujada = nombre
+            
+            escena.actualizar()
+            
+            # Sin eventos (teclas o el parpadeo del cursor) no se hace nada
+            for evento in esperar_eventos():
+                if evento.type == EVENTO_CURSOR:
+                    cursor_visible = not cursor_visible
+                elif evento.type == QUIT:
+                    salir()
+                elif evento.type == KEYDOWN:
+                    if evento.key == K_RETURN and nombre.strip():
+                        # Si el usuario presiona Enter y el nombre no está vacío
                         return nombre
-                # Verificar si hizo clic en el botón de salir
-                if boton_salir.collidepoint(mouse_pos):
-                    pygame.quit()
-                    sys.exit()
-        
-        reloj.tick(30)  # 30 FPS
+                    elif evento.key == K_BACKSPACE:
+                        # Borrar el último carácter
+                        nombre = nombre[:-1]
+                    # Permitir letras, números y espacio, y limitar a LONGITUD_MAXIMA_NOMBRE caracteres
+                    elif (evento.unicode.isalnum() or evento.unicode == ' ') and len(nombre) < LONGITUD_MAXIMA_NOMBRE:
+                        nombre += evento.unicode
+                elif evento.type == MOUSEBUTTONDOWN:
+                    mouse_pos = pygame.mouse.get_pos()
+                    # Verificar si hizo clic en el botón de jugar
+                    if rect_boton_jugar.collidepoint(mouse_pos):
+                        if nombre.strip():  # Verificar que el nombre no esté vacío
+                            return nombre
+                    # Verificar si hizo clic en el botón de salir
+                    if boton_salir.collidepoint(mouse_pos):
+                        salir()
+
+def componer_escena_reaccion(escena, estadisticas):
+    """
+    Dibuja el fotograma completo de la pantalla roja en una superficie aparte,
+    para que mostrar el estímulo solo cueste copiarla y volcarla.
+    
+    Args:
+        escena: Superficie del tamaño de la pantalla donde se compone el fotograma
+        estadisticas: Estadísticas de todos los jugadores
+    """
+    # La parte izquierda es roja, la derecha sigue siendo negra con el histograma
+    with perfil.fase('fondo'):
+        escena.fill(NEGRO)
+        pygame.draw.rect(escena, ROJO, (0, 0, ANCHO_IZQUIERDA, ALTO))
+    
+    # Dibujar línea divisoria vertical
+    pygame.draw.line(escena, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
+    
+    # Texto en la parte izquierda
+    texto = renderizar_texto(fuente_grande, "¡¡¡Pulsa ya!!!", True, BLANCO)
+    escena.blit(texto, disposicion.columna(((texto.get_width(), 80),))[0])
+    
+    # Dibujar histograma en la parte derecha
+    dibujar_histograma(estadisticas, escena)
 
-def pantalla_espera():
+@consumo_pantallas.medir('espera')
+def pantalla_espera(escena=None):
     """
     Muestra la pantalla de "estate atento" durante un tiempo aleatorio.
+    Mientras espera, aprovecha para preparar el fotograma de la pantalla roja.
+    
+    Args:
+        escena: Superficie donde componer el fotograma de la pantalla roja (opcional)
     
     Returns:
         bool: True si el tiempo de espera terminó normalmente, 
               False si el jugador pulsó una tecla antes de tiempo
     """
     tiempo_espera = random.uniform(3, 10)  # Tiempo aleatorio entre 3 y 10 segundos
-    tiempo_inicio = time.time()
+    inicio_espera = marca_tiempo_ns()
+    tiempo_limite = inicio_espera + int(tiempo_espera * 1e9)
     
-    # Cargar datos para el histograma
-    datos = cargar_datos()
+    # La ronda queda registrada en la traza desde aquí
+    traza_rondas.empezar_ronda(inicio_espera)
+    traza_rondas.registrar(traza.ESPERA, inicio_espera, int(tiempo_espera * 1e9))
     
-    while True:
-        tiempo_actual = time.time() - tiempo_inicio
-        
-        if tiempo_actual >= tiempo_espera:
-            # El tiempo de espera ha terminado, pasar a la siguiente pantalla
-            return True
-        
-        pantalla.fill(NEGRO)
-        
-        # Dibujar línea divisoria vertical
-        pygame.draw.line(pantalla, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
-        
-        # Contenido en la parte izquierda
-        texto = fuente_grande.render("ESTATE ATENTO", True, BLANCO)
-        pantalla.blit(texto, (ANCHO_IZQUIERDA//2 - texto.get_width()//2, ALTO//2 - 50))
-        
-        instruccion = fuente_mediana.render("Cuando te diga debes pulsar una tecla", True, BLANCO)
-        pantalla.blit(instruccion, (ANCHO_IZQUIERDA//2 - instruccion.get_width()//2, ALTO//2 + 30))
-        
-        # Dibujar histograma en la parte derecha
-        dibujar_histograma(datos)
-        
-        pygame.display.flip()
-        
-        for evento in pygame.event.get():
-            if evento.type == QUIT:
-                pygame.quit()
-                sys.exit()
-            elif evento.type == KEYDOWN:
-                # El jugador pulsó una tecla antes de tiempo
-                return False
-        
-        reloj.tick(30)
+    # Estadísticas para el histograma
+    estadisticas = obtener_estadisticas()
+    
+    # La pantalla no cambia durante la espera, así que se dibuja una sola vez
+    escena_espera = EscenaRetenida()
+    fondo = escena_espera.fondo
+    
+    # Contenido en la parte izquierda
+    texto = renderizar_texto(fuente_grande, "ESTATE ATENTO", True, BLANCO)
+    instruccion = renderizar_texto(fuente_mediana, "Cuando te diga debes pulsar una tecla", True, BLANCO)
+    posicion_texto, posicion_instruccion = disposicion.columna(((texto.get_width(), 80),
+                                                                (instruccion.get_width(), 50)))
+    fondo.blit(texto, posicion_texto)
+    fondo.blit(instruccion, posicion_instruccion)
+    
+    # Dibujar histograma en la parte derecha
+    dibujar_histograma(estadisticas, fondo)
+    
+    escena_espera.mostrar()
+    
+    # Preparar la pantalla roja ahora que no hay nada más que hacer
+    if escena is not None:
+        componer_escena_reaccion(escena, estadisticas)
+        if presentador is not None:
+            presentador.subir_fondo('reaccion', escena)
+    
+    # Si llega una pulsación antes del límite, el jugador se ha adelantado
+    # Las pulsaciones de la pantalla de bienvenida (como el Enter) no cuentan
+    pulsacion = esperar_tecla(tiempo_limite, desde_ns=inicio_espera)
+    if pulsacion is not None:
+        traza_rondas.terminar_ronda(pulsacion, traza.ADELANTADO)
+    return pulsacion is None
 
-def pantalla_reaccion():
+@consumo_pantallas.medir('reaccion')
+def pantalla_reaccion(escena=None):
     """
     Muestra la pantalla roja "¡¡¡Pulsa ya!!!" y mide el tiempo de reacción.
     
+    Args:
+        escena: Fotograma de la pantalla roja ya compuesto por pantalla_espera.
+                Si no se indica (o si ha cambiado el tamaño de la pantalla
+                desde que se compuso), se compone en este momento
+    
     Returns:
         int o None: Tiempo de reacción en milisegundos, 
-                  o None si el jugador no reaccionó a tiempo
+                  o None si el jugador no reaccionó a tiempo,
+                  o traza.ADELANTADO si pulsó antes de que apareciera el estímulo
     """
-    tiempo_inicio = time.time()
-    tiempo_limite = tiempo_inicio + 10  # 10 segundos para reaccionar
+    if escena is not None and escena.get_size() == pantalla.get_size():
+        # Mostrar el estímulo solo cuesta una copia y un volcado (o, con
+        # texturas, juntar la que ya se subió durante la espera)
+        if presentador is not None:
+            presentador.usar_fondo('reaccion')
+        else:
+            pantalla.blit(escena, (0, 0))
+    else:
+        componer_escena_reaccion(pantalla, obtener_estadisticas())
+        if presentador is not None:
+            presentador.subir_fondo('reaccion', pantalla)
+            presentador.usar_fondo('reaccion')
     
-    # Cargar datos para el histograma
-    datos = cargar_datos()
+    # El tiempo empieza a contar cuando el panel rojo aparece en pantalla
+    tiempo_inicio = presentar_estimulo()
+    tiempo_limite = tiempo_inicio + 10 * 1_000_000_000  # 10 segundos para reaccionar
     
-    while True:
-        tiempo_actual = time.time()
-        
-        if tiempo_actual >= tiempo_limite:
-            # Se acabó el tiempo sin que el jugador pulsara
-            return None
-        
-        # La parte izquierda es roja, la derecha sigue siendo negra con el histograma
-        pantalla.fill(NEGRO)
-        pygame.draw.rect(pantalla, ROJO, (0, 0, ANCHO_IZQUIERDA, ALTO))
-        
-        # Dibujar línea divisoria vertical
-        pygame.draw.line(pantalla, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
-        
-        # Texto en la parte izquierda
-        texto = fuente_grande.render("¡¡¡Pulsa ya!!!", True, BLANCO)
-        pantalla.blit(texto, (ANCHO_IZQUIERDA//2 - texto.get_width()//2, ALTO//2))
-        
-        # Dibujar histograma en la parte derecha
-        dibujar_histograma(datos)
-        
-        pygame.display.flip()
-        
-        for evento in pygame.event.get():
-            if evento.type == QUIT:
-                pygame.quit()
-                sys.exit()
-            elif evento.type == KEYDOWN:
-                # Calcular tiempo de reacción en milisegundos
-                tiempo_reaccion = int((time.time() - tiempo_inicio) * 1000)
-                return tiempo_reaccion
-        
-        reloj.tick(30)
+    # La pantalla roja es estática: solo hace falta vigilar la entrada
+    tiempo_pulsacion = esperar_tecla(tiempo_limite)
+    
+    if tiempo_pulsacion is None:
+        # Se acabó el tiempo sin que el jugador pulsara
+        traza_rondas.terminar_ronda(tiempo_limite, traza.SIN_REACCION)
+        return None
+    
+    if tiempo_pulsacion < tiempo_inicio:
+        # Con la captura en otro hilo se ve la pulsación que llegó mientras
+        # se volcaba el estímulo: todavía no se veía, así que se ha adelantado
+        traza_rondas.terminar_ronda(tiempo_pulsacion, traza.ADELANTADO)
+        return traza.ADELANTADO
+    
+    # Calcular tiempo de reacción en milisegundos
+    tiempo_reaccion = round((tiempo_pulsacion - tiempo_inicio) / 1_000_000)
+    traza_rondas.terminar_ronda(tiempo_pulsacion, tiempo_reaccion)
+    return tiempo_reaccion
+
+def componer_perdida(mensaje, estadisticas):
+    """
+    Dibuja la pantalla de derrota en el fondo de una escena.
+    
+    Args:
+        mensaje: Texto que se mostrará al jugador
+        estadisticas: Estadísticas de todos los jugadores
+    
+    Returns:
+        EscenaRetenida: Escena con la pantalla ya dibujada
+    """
+    # Dividir el mensaje en dos líneas si es necesario (parte izquierda)
+    if len(mensaje) > 30:
+        partes = mensaje.split(" y ")
+        if len(partes) == 2:
+            lineas = [partes[0], "y " + partes[1]]
+        else:
+            palabras = mensaje.split()
+            mitad = len(palabras) // 2
+            lineas = [" ".join(palabras[:mitad]), " ".join(palabras[mitad:])]
+    else:
+        lineas = [mensaje]
+    textos = [renderizar_texto(fuente_grande, linea, True, BLANCO) for linea in lineas]
+    posiciones = disposicion.columna(tuple((texto.get_width(), 80) for texto in textos))
+    
+    # Nada cambia en esta pantalla: se dibuja una vez en el fondo
+    escena = EscenaRetenida()
+    for texto, posicion in zip(textos, posiciones):
+        escena.fondo.blit(texto, posicion)
+    
+    # Dibujar histograma en la parte derecha
+    dibujar_histograma(estadisticas, escena.fondo)
+    return escena
 
+@consumo_pantallas.medir('perdida')
 def pantalla_perdida(mensaje="No has pulsado nada y has perdido"):
     """
     Muestra una pantalla de derrota con un mensaje personalizable.
@@ -492,55 +1261,91 @@ def pantalla_perdida(mensaje="No has pulsado nada y has perdido"):
     Args:
         mensaje: Texto que se mostrará al jugador
     """
-    tiempo_inicio = time.time()
+    # Estadísticas para el histograma
+    estadisticas = obtener_estadisticas()
     
-    # Cargar datos para el histograma
-    datos = cargar_datos()
+    escena = componer_perdida(mensaje, estadisticas)
+    escena.mostrar()
     
-    while True:
-        tiempo_actual = time.time() - tiempo_inicio
-        
-        if tiempo_actual >= 6:  # Mostrar por 6 segundos
-            return
-        
-        pantalla.fill(NEGRO)
-        
-        # Dibujar línea divisoria vertical
-        pygame.draw.line(pantalla, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
-        
-        # Dividir el mensaje en dos líneas si es necesario (parte izquierda)
-        if len(mensaje) > 30:
-            partes = mensaje.split(" y ")
-            if len(partes) == 2:
-                texto1 = fuente_grande.render(partes[0], True, BLANCO)
-                texto2 = fuente_grande.render("y " + partes[1], True, BLANCO)
-                
-                pantalla.blit(texto1, (ANCHO_IZQUIERDA//2 - texto1.get_width()//2, ALTO//2 - 50))
-                pantalla.blit(texto2, (ANCHO_IZQUIERDA//2 - texto2.get_width()//2, ALTO//2 + 30))
-            else:
-                palabras = mensaje.split()
-                mitad = len(palabras) // 2
-                texto1 = fuente_grande.render(" ".join(palabras[:mitad]), True, BLANCO)
-                texto2 = fuente_grande.render(" ".join(palabras[mitad:]), True, BLANCO)
-                
-                pantalla.blit(texto1, (ANCHO_IZQUIERDA//2 - texto1.get_width()//2, ALTO//2 - 50))
-                pantalla.blit(texto2, (ANCHO_IZQUIERDA//2 - texto2.get_width()//2, ALTO//2 + 30))
-        else:
-            texto = fuente_grande.render(mensaje, True, BLANCO)
-            pantalla.blit(texto, (ANCHO_IZQUIERDA//2 - texto.get_width()//2, ALTO//2))
-        
-        # Dibujar histograma en la parte derecha
-        dibujar_histograma(datos)
-        
-        pygame.display.flip()
-        
-        for evento in pygame.event.get():
-            if evento.type == QUIT:
-                pygame.quit()
-                sys.exit()
-        
-        reloj.tick(30)
+    # La pantalla no se vuelve a dibujar (salvo si cambia el tamaño de la
+    # pantalla): solo se espera a que pase el tiempo
+    with temporizador(EVENTO_FIN_PANTALLA, DURACION_PANTALLA_PERDIDA_MS, repetir=False):
+        while True:
+            for evento in esperar_eventos():
+                if evento.type == QUIT:
+                    salir()
+                elif evento.type == EVENTO_FIN_PANTALLA:
+                    return
+            if escena.disposicion is not disposicion:
+                escena = componer_perdida(mensaje, estadisticas)
+                escena.mostrar()
+
+def componer_resultados(tiempo_reaccion, estadisticas):
+    """
+    Dibuja la pantalla de resultados en el fondo de una escena.
+    
+    Args:
+        tiempo_reaccion: Tiempo de reacción en ms, o None si perdió
+        estadisticas: Estadísticas de todos los jugadores (ya con el resultado)
+    
+    Returns:
+        EscenaRetenida: Escena con la pantalla ya dibujada
+    """
+    # Calcular estadísticas
+    mejor_tiempo = estadisticas.mejor_tiempo()
+    tiempo_medio = estadisticas.media()
+    
+    # Porcentaje de jugadores más lentos, consultando el índice de posiciones
+    porcentaje_superados = None
+    if tiempo_reaccion is not None:
+        porcentaje_superados = estadisticas.posiciones.porcentaje_superados(tiempo_reaccion)
+    
+    # Título según el resultado (parte izquierda)
+    if tiempo_reaccion is None:
+        titulo = renderizar_texto(fuente_grande, "¡Has perdido!", True, ROJO)
+    else:
+        titulo = renderizar_texto(fuente_grande, "¡Resultados!", True, VERDE)
+    
+    # Líneas de resultados, cada una con su color
+    lineas = []
+    if tiempo_reaccion is not None:
+        # Tiempo de reacción del jugador
+        lineas.append((f"Tu tiempo de reacción: {tiempo_reaccion} ms", BLANCO))
+    if porcentaje_superados is not None:
+        # A cuántos jugadores ha superado
+        lineas.append((f"Has sido más rápido que el {int(porcentaje_superados)}% de los jugadores", AMARILLO))
+    # Tiempo de reacción promedio de referencia
+    lineas.append((f"Tiempo de una persona media: {TIEMPO_REACCION_MEDIA} ms", BLANCO))
+    if mejor_tiempo > 0:
+        lineas.append((f"Mejor tiempo: {mejor_tiempo} ms", BLANCO))
+    if tiempo_medio > 0:
+        # Tiempo promedio de todos los jugadores
+        lineas.append((f"Tiempo promedio: {int(tiempo_medio)} ms", BLANCO))
+    textos = [renderizar_texto(fuente_mediana, texto, True, color) for texto, color in lineas]
+    
+    # Instrucción final
+    textos.append(renderizar_texto(fuente_pequena, "Pulsa cualquier tecla para continuar", True, BLANCO))
+    
+    # Centrado vertical, sin subir hasta el título
+    filas = tuple((texto.get_width(), 60) for texto in textos[:-1]) + ((textos[-1].get_width(), 40),)
+    posiciones = disposicion.columna(filas, y_minimo=150)
+    
+    # Nada cambia en esta pantalla: se dibuja una vez en el fondo
+    escena = EscenaRetenida()
+    fondo = escena.fondo
+    fondo.blit(titulo, (disposicion.x_centrado(titulo.get_width()), disposicion.medida(50)))
+    for texto, posicion in zip(textos, posiciones):
+        fondo.blit(texto, posicion)
+    
+    # Mostrar créditos en la parte inferior
+    creditos = renderizar_texto(fuente_muy_pequena, CREDITOS, True, BLANCO)
+    fondo.blit(creditos, (disposicion.x_centrado(creditos.get_width()), disposicion.y_creditos))
+    
+    # Dibujar el histograma en la parte derecha
+    dibujar_histograma(estadisticas, fondo)
+    return escena
 
+@consumo_pantallas.medir('resultados')
 def pantalla_resultados(nombre, tiempo_reaccion):
     """
     Muestra los resultados del jugador y las estadísticas comparativas.
@@ -550,126 +1355,101 @@ def pantalla_resultados(nombre, tiempo_reaccion):
         nombre: Nombre del jugador
         tiempo_reaccion: Tiempo de reacción en ms, o None si perdió
     """
-    datos = cargar_datos()
-    
     # Guardar el nuevo resultado solo si el jugador completó el juego
     if tiempo_reaccion is not None:
-        datos['jugadores'].append({
+        # Se actualizan las estadísticas sin recorrer todos los jugadores
+        jugador = {
             'nombre': nombre,
             'tiempo': tiempo_reaccion
-        })
-        guardar_datos(datos)
+        }
+        obtener_almacen().agregar(jugador)
+        
+        # El resultado se envía al servidor de agregación en segundo plano
+        if cliente_agregacion is not None:
+            cliente_agregacion.agregar(jugador)
     
-    # Calcular estadísticas
-    mejor_tiempo = obtener_mejor_tiempo(datos)
-    tiempo_medio = calcular_media(datos)
+    actualizar_estadisticas_servidor()
+    estadisticas = obtener_estadisticas()
+    escena = componer_resultados(tiempo_reaccion, estadisticas)
+    escena.mostrar()
+    
+    # Con la captura en otro hilo, el evento de pygame de la tecla con la que
+    # reaccionó el jugador puede llegar después de la pulsación capturada
+    descartar_tecla_capturada()
     
+    # La pantalla no se vuelve a dibujar (salvo si cambia el tamaño de la
+    # pantalla): solo se espera a que pulsen una tecla
     while True:
-        pantalla.fill(NEGRO)
-        
-        # Dibujar línea divisoria vertical
-        pygame.draw.line(pantalla, BLANCO, (ANCHO_IZQUIERDA, 0), (ANCHO_IZQUIERDA, ALTO), 2)
-        
-        # Título según el resultado (parte izquierda)
-        if tiempo_reaccion is None:
-            titulo = fuente_grande.render("¡Has perdido!", True, ROJO)
-        else:
-            titulo = fuente_grande.render("¡Resultados!", True, VERDE)
-        
-        pantalla.blit(titulo, (ANCHO_IZQUIERDA//2 - titulo.get_width()//2, 50))
-        
-        # Calcular altura total del contenido para centrado vertical
-        altura_total = 0
-        if tiempo_reaccion is not None:
-            altura_total += 60  # Tiempo del jugador
-        altura_total += 60  # Tiempo persona media
-        altura_total += 60  # Mejor tiempo (si existe)
-        altura_total += 60  # Tiempo promedio (si existe)
-        altura_total += 40  # Instrucción final
-        
-        # Calcular posición inicial para centrado vertical
-        y_pos = max(150, (ALTO - altura_total) // 2)
-        
-        if tiempo_reaccion is not None:
-            # Mostrar tiempo de reacción del jugador
-            texto = f"Tu tiempo de reacción: {tiempo_reaccion} ms"
-            render = fuente_mediana.render(texto, True, BLANCO)
-            pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-            y_pos += 60
-        
-        # Mostrar tiempo de reacción promedio de referencia
-        texto = f"Tiempo de una persona media: {TIEMPO_REACCION_MEDIA} ms"
-        render = fuente_mediana.render(texto, True, BLANCO)
-        pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-        y_pos += 60
-        
-        # Mostrar mejor tiempo
-        if mejor_tiempo > 0:
-            texto = f"Mejor tiempo: {mejor_tiempo} ms"
-            render = fuente_mediana.render(texto, True, BLANCO)
-            pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-            y_pos += 60
-        
-        # Mostrar tiempo promedio de todos los jugadores
-        if tiempo_medio > 0:
-            texto = f"Tiempo promedio: {int(tiempo_medio)} ms"
-            render = fuente_mediana.render(texto, True, BLANCO)
-            pantalla.blit(render, (ANCHO_IZQUIERDA//2 - render.get_width()//2, y_pos))
-            y_pos += 60
-        
- # Instrucción final
-        instruccion = fuente_pequena.render("Pulsa cualquier tecla para continuar", True, BLANCO)
-        pantalla.blit(instruccion, (ANCHO_IZQUIERDA//2 - instruccion.get_width()//2, y_pos))
-        
-        # Mostrar créditos en la parte inferior
-        creditos = fuente_muy_pequena.render(CREDITOS, True, BLANCO)
-        pantalla.blit(creditos, (ANCHO_IZQUIERDA//2 - creditos.get_width()//2, ALTO - 40))
-        
-        # Dibujar el histograma en la parte derecha
-        dibujar_histograma(datos)
-        
-        pygame.display.flip()
-        
-        for evento in pygame.event.get():
+        for evento in esperar_eventos():
             if evento.type == QUIT:
-                pygame.quit()
-                sys.exit()
+                salir()
             elif evento.type == KEYDOWN:
                 return
-        
-        reloj.tick(30)
+        if escena.disposicion is not disposicion:
+            escena = componer_resultados(tiempo_reaccion, estadisticas)
+            escena.mostrar()
 
 def main():
     """
     Función principal que controla el flujo del juego.
     """
+    parser = argparse.ArgumentParser(description="Juego de Reflejos")
+    parser.add_argument('--perfil', nargs='?', const=ARCHIVO_PERFIL, default=os.environ.get('REFLEJOS_PERFIL'),
+                        help=f"Guardar medidas de tiempo de cada fotograma (por defecto en {ARCHIVO_PERFIL})")
+    argumentos = parser.parse_args()
+    if argumentos.perfil:
+        # Las medidas se guardan al salir, también si el juego termina con un error
+        perfil.activar(ARCHIVO_PERFIL if argumentos.perfil == '1' else argumentos.perfil)
+        atexit.register(perfil.guardar)
+    
+    iniciar_pantalla()
+    
+    # Las pulsaciones se apuntan en otro hilo, aunque el juego esté dibujando
+    if CAPTURA_TECLADO and captura_teclado.iniciar():
+        print("Leyendo el teclado en un hilo aparte.")
+    
+    # Resultados compartidos con otros puestos, si hay servidor
+    iniciar_agregacion()
+    
+    # Superficie donde se prepara la pantalla roja durante la espera
+    escena_reaccion = nueva_superficie((ANCHO, ALTO))
+    
     while True:
         try:
             # Pantalla 1: Bienvenida y entrada de nombre
             nombre = pantalla_bienvenida()
             
-            # Pantalla 2: Espera con instrucciones
-            espera_completada = pantalla_espera()
+            # La pantalla roja se prepara del tamaño que tenga la pantalla
+            if escena_reaccion.get_size() != (ANCHO, ALTO):
+                escena_reaccion = nueva_superficie((ANCHO, ALTO))
+            
+            # El hilo de captura solo guarda las pulsaciones de la ronda, no
+            # las del nombre ni las que se hagan en otras ventanas
+            with captura_teclado.escuchar():
+                # Pantalla 2: Espera con instrucciones
+                espera_completada = pantalla_espera(escena_reaccion)
+                
+                # Pantalla 3: Reacción (pantalla roja)
+                if espera_completada:
+                    tiempo_reaccion = pantalla_reaccion(escena_reaccion)
             
             if not espera_completada:
                 # Pantalla 4.5: Perdida por presionar antes de tiempo
                 pantalla_perdida("Has pulsado antes de tiempo y has perdido")
                 continue
-                
-            # Pantalla 3: Reacción (pantalla roja)
-            tiempo_reaccion = pantalla_reaccion()
             
-            # Pantalla 4: Perdida (si no reaccionó a tiempo)
+            # Pantalla 4: Perdida (si no reaccionó a tiempo o se adelantó al estímulo)
             if tiempo_reaccion is None:
                 pantalla_perdida()
+            elif tiempo_reaccion == traza.ADELANTADO:
+                pantalla_perdida("Has pulsado antes de tiempo y has perdido")
             else:
                 # Pantalla 5: Resultados
                 pantalla_resultados(nombre, tiempo_reaccion)
         except Exception as e:
             # Capturar excepciones para evitar que el programa se cierre inesperadamente
             print(f"Error en el juego: {e}")
-            pygame.quit()
-            sys.exit()
+            salir()
 
 # Punto de entrada del programa
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Medidas de tiempo por fotograma del Juego de Reflejos.
+
+Cuando está activado, el perfilador guarda cuánto dura cada fase del dibujo
+(fondo, textos, histograma, volcado, eventos), cuánto trabajo ha costado cada
+fotograma y el retraso máximo entre una pulsación y su marca de tiempo. Solo
+se guardan las últimas medidas (un búfer circular), así que se puede dejar
+activado durante horas. Al salir se guarda todo en un archivo JSON para
+analizarlo después.
+
+Desactivado no guarda nada y cada medida solo cuesta una llamada.
+"""
+
+import json
+import time
+from collections import deque
+
+# Número de medidas de cada tipo que se guardan
+CAPACIDAD_PERFIL = 10000
+
+# Percentiles que se muestran en pantalla y en el resumen
+PERCENTILES = [50, 95, 99]
+
+# Cada cuánto (segundos) se recalcula el texto de los percentiles en pantalla:
+# ordenar los búferes en cada fotograma costaría más que lo que se mide
+INTERVALO_TEXTO = 0.5
+
+def percentiles(valores, porcentajes=PERCENTILES):
+    """
+    Args:
+        valores: Secuencia de números
+        porcentajes: Percentiles que se quieren calcular
+
+    Returns:
+        Diccionario {porcentaje: valor}, vacío si no hay valores
+    """
+    ordenados = sorted(valores)
+    if not ordenados:
+        return {}
+    return {porcentaje: ordenados[min(len(ordenados) - 1, int(len(ordenados) * porcentaje / 100))]
+            for porcentaje in porcentajes}
+
+class _Fase:
+    """
+    Bloque with que mide la duración de una fase.
+    """
+
+    __slots__ = ('perfilador', 'nombre', 'inicio')
+
+    def __init__(self, perfilador, nombre):
+        self.perfilador = perfilador
+        self.nombre = nombre
+        self.inicio = 0
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *excepcion):
+        self.perfilador.registrar(self.nombre, self.inicio, time.perf_counter_ns() - self.inicio)
+        return False
+
+class _SinMedir:
+    """
+    Bloque with que no hace nada, para cuando el perfilador está desactivado.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+_SIN_MEDIR = _SinMedir()
+
+class Perfilador:
+    """
+    Búferes circulares con las medidas de las fases, los fotogramas y la entrada.
+    """
+
+    def __init__(self, consumo, capacidad=CAPACIDAD_PERFIL):
+        """
+        Args:
+            consumo: ConsumoPantallas, de donde se saca la pantalla actual
+            capacidad: Número de medidas de cada tipo que se guardan
+        """
+        self.consumo = consumo
+        self.activo = False
+        self.ruta = None
+        # (pantalla, fase, inicio_ns, duracion_ns)
+        self.fases = deque(maxlen=capacidad)
+        # (pantalla, inicio_ns, duracion_ns)
+        self.fotogramas = deque(maxlen=capacidad)
+        # (pantalla, retraso_ns)
+        self.retrasos_entrada = deque(maxlen=capacidad)
+        self._inicio_fotograma = time.perf_counter_ns()
+        self._texto = None
+        self._siguiente_texto = 0.0
+
+    def activar(self, ruta):
+        """
+        Empieza a guardar medidas.
+
+        Args:
+            ruta: Archivo JSON donde se guardan las medidas al salir
+        """
+        self.activo = True
+        self.ruta = ruta
+        self._inicio_fotograma = time.perf_counter_ns()
+
+    def fase(self, nombre):
+        """
+        Mide una fase del fotograma con un bloque with.
+
+        Args:
+            nombre: Nombre de la fase ('texto', 'histograma', 'volcado'...)
+        """
+        if not self.activo:
+            return _SIN_MEDIR
+        return _Fase(self, nombre)
+
+    def registrar(self, nombre, inicio_ns, duracion_ns):
+        """
+        Guarda la duración de una fase medida por fuera.
+
+        Args:
+            nombre: Nombre de la fase
+            inicio_ns: Inicio de la fase (perf_counter_ns)
+            duracion_ns: Duración de la fase
+        """
+        if self.activo:
+            self.fases.append((self.consumo.nombre_actual, nombre, inicio_ns, duracion_ns))
+
+    def despertar(self):
+        """
+        Marca el inicio del trabajo de un fotograma, después de esperar un evento.
+        """
+        self._inicio_fotograma = time.perf_counter_ns()
+
+    def fotograma(self):
+        """
+        Marca el final de un fotograma (justo después del volcado). Su duración
+        es el trabajo hecho desde el anterior volcado o desde que llegó el evento.
+        """
+        if not self.activo:
+            return
+        ahora = time.perf_counter_ns()
+        self.fotogramas.append((self.consumo.nombre_actual, self._inicio_fotograma, ahora - self._inicio_fotograma))
+        self._inicio_fotograma = ahora
+
+    def retraso_entrada(self, retraso_ns):
+        """
+        Guarda el retraso máximo entre una pulsación y su marca de tiempo
+        (el tiempo desde el sondeo anterior de la cola de eventos).
+
+        Args:
+            retraso_ns: Retraso en nanosegundos
+        """
+        if self.activo:
+            self.retrasos_entrada.append((self.consumo.nombre_actual, retraso_ns))
+
+    def resumen(self):
+        """
+        Returns:
+            Diccionario con los percentiles (ms) de los fotogramas, de cada fase
+            y del retraso de la entrada
+        """
+        duraciones_fases = {}
+        for _, nombre, _, duracion in self.fases:
+            duraciones_fases.setdefault(nombre, []).append(duracion / 1e6)
+        return {
+            'fotograma_ms': percentiles(duracion / 1e6 for _, _, duracion in self.fotogramas),
+            'fases_ms': {nombre: percentiles(duraciones) for nombre, duraciones in duraciones_fases.items()},
+            'retraso_entrada_ms': percentiles(retraso / 1e6 for _, retraso in self.retrasos_entrada)
+        }
+
+    def texto_resumen(self):
+        """
+        Returns:
+            Una línea de texto con los percentiles, para mostrarla en pantalla.
+            Se recalcula como mucho cada INTERVALO_TEXTO segundos
+        """
+        ahora = time.monotonic()
+        if self._texto is None or ahora >= self._siguiente_texto:
+            self._texto = self._calcular_texto()
+            self._siguiente_texto = ahora + INTERVALO_TEXTO
+        return self._texto
+
+    def _calcular_texto(self):
+        """
+        Returns:
+            Texto de texto_resumen calculado con las medidas actuales
+        """
+        fotograma = percentiles(duracion / 1e6 for _, _, duracion in self.fotogramas)
+        entrada = percentiles(retraso / 1e6 for _, retraso in self.retrasos_entrada)
+        if not fotograma:
+            return "Aún no hay fotogramas medidos"
+        texto = "fotograma " + " ".join(f"p{p} {fotograma[p]:.1f}" for p in fotograma) + " ms"
+        if entrada:
+            texto += f" | entrada p95 {entrada[95]:.2f} ms"
+        return texto
+
+    def guardar(self):
+        """
+        Guarda todas las medidas y el resumen en el archivo indicado al activar.
+        """
+        if not self.activo:
+            return
+        datos = {
+            'resumen': self.resumen(),
+            'fases': list(self.fases),
+            'fotogramas': list(self.fotogramas),
+            'retrasos_entrada': list(self.retrasos_entrada)
+        }
+        with open(self.ruta, 'w') as archivo:
+            json.dump(datos, archivo)
+        print(f"Medidas de rendimiento guardadas en {self.ruta}")
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de resultados del Juego de Reflejos.
+
+Cada resultado nuevo se añade al final de un registro en formato JSON Lines
+(una línea por resultado), sin reescribir el archivo entero. De vez en cuando
+el registro se compacta en una instantánea con el mismo formato que el antiguo
+jugadores.json, que por tanto se sigue pudiendo leer sin migraciones.
+
+Cada línea del registro lleva un número de secuencia y la instantánea guarda
+el último que incluye, así que si se corta la luz a mitad de una compactación
+no se pierden ni se duplican resultados.
+"""
+
+import itertools
+import json
+import os
+import time
+
+# Número de resultados que se escriben antes de forzar un fsync
+LOTE_FSYNC = 20
+
+# Tiempo máximo (segundos) que un resultado puede quedar sin fsync
+INTERVALO_FSYNC = 5.0
+
+# Número de líneas del registro a partir del cual conviene compactar
+COMPACTAR_CADA = 500
+
+def _escribir_atomico(ruta, datos):
+    """
+    Escribe un archivo JSON de forma atómica: primero en un temporal y después
+    se renombra, para que un corte de luz nunca deje el archivo a medias.
+
+    Args:
+        ruta: Ruta del archivo destino
+        datos: Objeto que se guardará en formato JSON
+    """
+    ruta_temporal = ruta + '.tmp'
+    with open(ruta_temporal, 'w') as archivo:
+        json.dump(datos, archivo)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(ruta_temporal, ruta)
+
+def _apartar_corrupto(ruta):
+    """
+    Renombra un archivo que no se puede leer para no perderlo al sobrescribirlo.
+
+    Args:
+        ruta: Ruta del archivo corrupto
+    """
+    destino = f"{ruta}.corrupto-{int(time.time())}"
+    os.replace(ruta, destino)
+    print(f"Error al cargar {ruta}. Se ha guardado una copia en {destino}.")
+
+def firma_archivos(*rutas):
+    """
+    Sirve para saber si otro programa ha cambiado los archivos.
+
+    Args:
+        rutas: Rutas de los archivos
+
+    Returns:
+        Tupla con la fecha de modificación y el tamaño de cada archivo
+        (None si el archivo no existe)
+    """
+    firma = []
+    for ruta in rutas:
+        try:
+            estado = os.stat(ruta)
+            firma.append((estado.st_mtime_ns, estado.st_size))
+        except OSError:
+            firma.append(None)
+    return tuple(firma)
+
+class RegistroResultados:
+    """
+    Instantánea de todos los jugadores más un registro de solo añadir con los
+    resultados posteriores.
+    """
+
+    def __init__(self, ruta_datos, ruta_registro):
+        """
+        Args:
+            ruta_datos: Ruta de la instantánea (formato del antiguo jugadores.json)
+            ruta_registro: Ruta del registro JSON Lines
+        """
+        self.ruta_datos = ruta_datos
+        self.ruta_registro = ruta_registro
+        self.secuencia = None
+        self.lineas_registro = 0
+        self._archivo = None
+        self._sin_sincronizar = 0
+        self._ultima_sincronizacion = time.monotonic()
+
+    def cargar(self):
+        """
+        Carga la instantánea y le aplica los resultados del registro.
+
+        Returns:
+            Diccionario con los datos de los jugadores
+        """
+        return {'jugadores': list(self._resultados())}
+
+    def leer_resultados(self, desde, hasta):
+        """
+        Lee solo los resultados de unas posiciones. El registro se recorre
+        línea a línea y se deja de leer al llegar a hasta.
+
+        Args:
+            desde: Posición del primer resultado
+            hasta: Posición siguiente al último
+
+        Returns:
+            Lista de diccionarios con 'nombre' y 'tiempo'
+        """
+        return list(itertools.islice(self._resultados(), desde, max(desde, hasta)))
+
+    def _resultados(self):
+        """
+        Recorre los resultados de la instantánea y después los del registro.
+        Si se llega al final, apunta la última secuencia y las líneas del registro.
+
+        Returns:
+            Generador de diccionarios con 'nombre' y 'tiempo'
+        """
+        ultima_secuencia = 0
+
+        if os.path.exists(self.ruta_datos):
+            try:
+                with open(self.ruta_datos, 'r') as archivo:
+                    instantanea = json.load(archivo)
+                jugadores = instantanea['jugadores']
+                ultima_secuencia = instantanea.get('ultima_secuencia', 0)
+            except (ValueError, KeyError, TypeError):
+                _apartar_corrupto(self.ruta_datos)
+            else:
+                yield from jugadores
+
+        secuencia = ultima_secuencia
+        lineas = 0
+        if os.path.exists(self.ruta_registro):
+            with open(self.ruta_registro, 'r') as archivo:
+                for linea in archivo:
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        # Línea a medio escribir por un corte de luz
+                        continue
+                    lineas += 1
+
+                    # Saltar las entradas que ya están en la instantánea
+                    if entrada['seq'] <= ultima_secuencia:
+                        continue
+                    secuencia = max(secuencia, entrada['seq'])
+                    yield {
+                        'nombre': entrada['nombre'],
+                        'tiempo': entrada['tiempo']
+                    }
+
+        self.secuencia = secuencia
+        self.lineas_registro = lineas
+
+    def _abrir(self):
+        """
+        Abre el registro para añadir líneas, reparando una última línea cortada.
+        """
+        if self.secuencia is None:
+            self.cargar()
+
+        # Comprobar si la última línea quedó sin terminar
+        cortada = False
+        if os.path.exists(self.ruta_registro) and os.path.getsize(self.ruta_registro) > 0:
+            with open(self.ruta_registro, 'rb') as archivo:
+                archivo.seek(-1, os.SEEK_END)
+                cortada = archivo.read(1) != b'\n'
+
+        self._archivo = open(self.ruta_registro, 'a')
+        if cortada:
+            self._archivo.write('\n')
+
+    def agregar(self, jugador):
+        """
+        Añade un resultado al final del registro.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: True si el registro ha crecido lo suficiente para compactarlo
+        """
+        return self.agregar_lote([jugador])
+
+    def agregar_lote(self, jugadores):
+        """
+        Añade varios resultados al final del registro con una sola escritura.
+
+        Args:
+            jugadores: Lista de diccionarios con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: True si el registro ha crecido lo suficiente para compactarlo
+        """
+        if self._archivo is None:
+            self._abrir()
+
+        lineas = []
+        for jugador in jugadores:
+            self.secuencia += 1
+            entrada = {'seq': self.secuencia, 'nombre': jugador['nombre'], 'tiempo': jugador['tiempo']}
+            lineas.append(json.dumps(entrada) + '\n')
+        self._archivo.write(''.join(lineas))
+        self._archivo.flush()
+        self.lineas_registro += len(lineas)
+
+        # Agrupar los fsync para no esperar al disco en cada resultado
+        self._sin_sincronizar += len(lineas)
+        if (self._sin_sincronizar >= LOTE_FSYNC or
+                time.monotonic() - self._ultima_sincronizacion >= INTERVALO_FSYNC):
+            self.sincronizar()
+
+        return self.lineas_registro >= COMPACTAR_CADA
+
+    def sincronizar(self):
+        """
+        Fuerza que los resultados escritos lleguen al disco.
+        """
+        if self._archivo is not None and self._sin_sincronizar:
+            os.fsync(self._archivo.fileno())
+        self._sin_sincronizar = 0
+        self._ultima_sincronizacion = time.monotonic()
+
+    def compactar(self, datos):
+        """
+        Guarda todos los datos en la instantánea y vacía el registro.
+
+        Args:
+            datos: Diccionario con los datos de todos los jugadores,
+                   incluidos los resultados que hay en el registro
+        """
+        if self.secuencia is None:
+            self.cargar()
+        self.sincronizar()
+
+        instantanea = dict(datos)
+        instantanea['ultima_secuencia'] = self.secuencia
+        _escribir_atomico(self.ruta_datos, instantanea)
+
+        # Si se corta la luz aquí, las líneas repetidas se descartan al cargar
+        if self._archivo is not None:
+            self._archivo.close()
+        self._archivo = open(self.ruta_registro, 'w')
+        self.lineas_registro = 0
+
+    def cerrar(self):
+        """
+        Sincroniza y cierra el registro.
+        """
+        if self._archivo is not None:
+            self.sincronizar()
+            self._archivo.close()
+            self._archivo = None
@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de resultados del Juego de Reflejos en un archivo binario de
+registros de tamaño fijo.
+
+Pensado para historiales muy grandes (millones de resultados): cada resultado
+ocupa 16 bytes (tiempo en ms, número del nombre y fecha) y los nombres se
+guardan una sola vez en una tabla aparte. El archivo se lee con mmap (con
+numpy.memmap si NumPy está instalado) y las estadísticas se calculan por
+bloques directamente sobre los bytes, sin crear un diccionario por resultado,
+así que la memoria no crece con el historial.
+
+Tiene los mismos métodos que registro.RegistroResultados y RegistroSQLite.
+"""
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import time
+
+from estadisticas import (Estadisticas, LIMITES_HISTOGRAMA, NUMERO_MEJORES, NUMERO_RECIENTES,
+                          TIEMPO_MAXIMO_INDICE)
+from histograma import contar_por_rangos, limites_automaticos_conteos, numpy
+from registro import RegistroResultados
+
+# Identifica el archivo de resultados (y su versión); ocupa la cabecera entera
+MAGIA = b'RFLJBIN\x01'
+
+# Cada resultado: tiempo (ms), número del nombre y fecha (segundos desde 1970)
+REGISTRO = struct.Struct('<iId')
+
+# Nombre que ocupa el número de una línea ilegible de la tabla de nombres
+NOMBRE_ILEGIBLE = '?'
+
+# Número de resultados que se procesan de una vez al calcular estadísticas
+BLOQUE = 1 << 20
+
+if numpy is not None:
+    TIPO_REGISTRO = numpy.dtype([('tiempo', '<i4'), ('nombre', '<u4'), ('fecha', '<f8')])
+
+class RegistroBinario:
+    """
+    Resultados de los jugadores en registros binarios de tamaño fijo, más una
+    tabla con los nombres (un nombre por línea; el número de línea es su número).
+    """
+
+    def __init__(self, ruta_datos, ruta_nombres, migrar_desde=None):
+        """
+        Args:
+            ruta_datos: Archivo con los registros de los resultados
+            ruta_nombres: Archivo con la tabla de nombres
+            migrar_desde: Tupla (ruta_datos, ruta_registro) con los archivos JSON
+                          que se importan si todavía no hay archivo binario
+        """
+        self.ruta_datos = ruta_datos
+        # Los nombres nuevos se añaden aquí; sirve para detectar cambios
+        self.ruta_registro = ruta_nombres
+        self.migrar_desde = migrar_desde
+        self._nombres = None
+        self._numeros = None
+        self._archivo = None
+        self._archivo_nombres = None
+
+    def _leer_nombres(self):
+        """
+        Carga la tabla de nombres si todavía no está en memoria.
+        """
+        if self._nombres is not None:
+            return
+        self._nombres = []
+        ilegibles = set()
+        if os.path.exists(self.ruta_registro):
+            with open(self.ruta_registro, 'r') as archivo:
+                for linea in archivo:
+                    try:
+                        self._nombres.append(json.loads(linea))
+                    except ValueError:
+                        if not linea.endswith('\n'):
+                            # Última línea a medio escribir por un corte de
+                            # luz: _reparar_nombres la quita
+                            break
+                        # Una línea estropeada conserva su número, para que
+                        # los de los nombres siguientes no cambien
+                        ilegibles.add(len(self._nombres))
+                        self._nombres.append(NOMBRE_ILEGIBLE)
+        self._numeros = {nombre: numero for numero, nombre in enumerate(self._nombres)
+                         if numero not in ilegibles}
+
+    def _crear_si_falta(self):
+        """
+        Crea el archivo binario si no existe, importando los datos JSON si los hay.
+        """
+        if os.path.exists(self.ruta_datos):
+            return
+        datos = {'jugadores': []}
+        if self.migrar_desde is not None and any(os.path.exists(ruta) for ruta in self.migrar_desde):
+            datos = RegistroResultados(*self.migrar_desde).cargar()
+            print(f"Se han importado {len(datos['jugadores'])} resultados de {self.migrar_desde[0]}.")
+        self.compactar(datos)
+
+    def _abrir(self):
+        """
+        Abre los archivos para añadir resultados. Un registro cortado al final
+        por un corte de luz se descarta.
+        """
+        self._crear_si_falta()
+        self._leer_nombres()
+        tamano = os.path.getsize(self.ruta_datos)
+        sobrante = (tamano - len(MAGIA)) % REGISTRO.size
+        self._archivo = open(self.ruta_datos, 'r+b')
+        if sobrante:
+            self._archivo.truncate(tamano - sobrante)
+        self._archivo.seek(0, os.SEEK_END)
+        self._reparar_nombres()
+        self._archivo_nombres = open(self.ruta_registro, 'a')
+
+    def _reparar_nombres(self):
+        """
+        Repara la última línea de la tabla de nombres si quedó cortada por un
+        corte de luz, para que el siguiente nombre no se pegue a ella.
+        """
+        if not os.path.exists(self.ruta_registro) or os.path.getsize(self.ruta_registro) == 0:
+            return
+        with open(self.ruta_registro, 'r+b') as archivo:
+            archivo.seek(-1, os.SEEK_END)
+            if archivo.read(1) == b'\n':
+                return
+
+            # Buscar desde el final dónde empieza la última línea
+            inicio = archivo.tell()
+            while inicio > 0:
+                paso = min(inicio, 4096)
+                archivo.seek(inicio - paso)
+                salto = archivo.read(paso).rfind(b'\n')
+                inicio -= paso
+                if salto >= 0:
+                    inicio += salto + 1
+                    break
+
+            archivo.seek(inicio)
+            try:
+                json.loads(archivo.read())
+            except ValueError:
+                # Nombre a medio escribir: _leer_nombres no lo ha cargado y
+                # ningún resultado lo usa, así que se quita
+                archivo.truncate(inicio)
+            else:
+                # El nombre está entero, solo le falta el salto de línea
+                archivo.write(b'\n')
+
+    def _numero_nombre(self, nombre):
+        """
+        Devuelve el número de un nombre, añadiéndolo a la tabla si es nuevo.
+
+        Args:
+            nombre: Nombre del jugador
+
+        Returns:
+            int: Número del nombre
+        """
+        numero = self._numeros.get(nombre)
+        if numero is None:
+            numero = len(self._nombres)
+            self._nombres.append(nombre)
+            self._numeros[nombre] = numero
+            self._archivo_nombres.write(json.dumps(nombre) + '\n')
+        return numero
+
+    def agregar(self, jugador):
+        """
+        Añade un resultado.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: Siempre False, el archivo no necesita compactarse
+        """
+        return self.agregar_lote([jugador])
+
+    def agregar_lote(self, jugadores):
+        """
+        Añade varios resultados con una sola escritura.
+
+        Args:
+            jugadores: Lista de diccionarios con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: Siempre False, el archivo no necesita compactarse
+        """
+        if self._archivo is None:
+            self._abrir()
+
+        fecha = time.time()
+        datos = b''.join(REGISTRO.pack(jugador['tiempo'], self._numero_nombre(jugador['nombre']), fecha)
+                         for jugador in jugadores)
+        # Los nombres nuevos tienen que estar guardados antes que los resultados que los usan
+        self._archivo_nombres.flush()
+        self._archivo.write(datos)
+        self._archivo.flush()
+        return False
+
+    def sincronizar(self):
+        """
+        Fuerza que los resultados escritos lleguen al disco.
+        """
+        if self._archivo is not None:
+            os.fsync(self._archivo_nombres.fileno())
+            os.fsync(self._archivo.fileno())
+
+    def cerrar(self):
+        """
+        Sincroniza y cierra los archivos.
+        """
+        if self._archivo is not None:
+            self.sincronizar()
+            self._archivo.close()
+            self._archivo_nombres.close()
+            self._archivo = None
+            self._archivo_nombres = None
+
+    def compactar(self, datos):
+        """
+        Sustituye todos los resultados por los indicados (equivale a guardar_datos).
+
+        Args:
+            datos: Diccionario con los datos de todos los jugadores
+        """
+        abierto = self._archivo is not None
+        self.cerrar()
+
+        # Los números de los nombres que ya existen no cambian: la tabla solo
+        # crece, así que sirve tanto para los resultados viejos como para los nuevos
+        self._leer_nombres()
+        partes = [MAGIA]
+        for jugador in datos['jugadores']:
+            numero = self._numeros.get(jugador['nombre'])
+            if numero is None:
+                numero = self._numeros[jugador['nombre']] = len(self._nombres)
+                self._nombres.append(jugador['nombre'])
+            partes.append(REGISTRO.pack(jugador['tiempo'], numero, jugador.get('fecha', 0.0)))
+
+        # Primero los nombres, para que ningún resultado use un nombre que no está guardado
+        ruta_temporal = self.ruta_registro + '.tmp'
+        with open(ruta_temporal, 'w') as archivo:
+            archivo.writelines(json.dumps(nombre) + '\n' for nombre in self._nombres)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(ruta_temporal, self.ruta_registro)
+
+        ruta_temporal = self.ruta_datos + '.tmp'
+        with open(ruta_temporal, 'wb') as archivo:
+            archivo.write(b''.join(partes))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(ruta_temporal, self.ruta_datos)
+
+        if abierto:
+            self._abrir()
+
+    def _bloques(self, con_fechas=False):
+        """
+        Recorre los resultados por bloques de como mucho BLOQUE registros,
+        leyendo el archivo con mmap.
+
+        Args:
+            con_fechas: Si cada tupla lleva también las fechas
+
+        Returns:
+            Generador de tuplas (posición del primer registro, tiempos, números de nombre),
+            más las fechas si se piden. Con NumPy son vistas de numpy.memmap; sin
+            NumPy, listas del tamaño del bloque
+        """
+        if self._archivo is not None:
+            self._archivo.flush()
+        self._crear_si_falta()
+        cantidad = (os.path.getsize(self.ruta_datos) - len(MAGIA)) // REGISTRO.size
+        if cantidad <= 0:
+            return
+
+        if numpy is not None:
+            registros = numpy.memmap(self.ruta_datos, dtype=TIPO_REGISTRO, mode='r',
+                                     offset=len(MAGIA), shape=(cantidad,))
+            for inicio in range(0, cantidad, BLOQUE):
+                bloque = registros[inicio:inicio + BLOQUE]
+                if con_fechas:
+                    yield inicio, bloque['tiempo'], bloque['nombre'], bloque['fecha']
+                else:
+                    yield inicio, bloque['tiempo'], bloque['nombre']
+            return
+
+        with open(self.ruta_datos, 'rb') as archivo:
+            with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                for inicio in range(0, cantidad, BLOQUE):
+                    fin = min(cantidad, inicio + BLOQUE)
+                    bloque = mapa[len(MAGIA) + inicio * REGISTRO.size:len(MAGIA) + fin * REGISTRO.size]
+                    # Cada registro son 4 enteros de 32 bits: tiempo, nombre y la fecha (2)
+                    enteros = memoryview(bloque).cast('i')
+                    tiempos = enteros[0::4].tolist()
+                    nombres = [numero & 0xFFFFFFFF for numero in enteros[1::4].tolist()]
+                    if con_fechas:
+                        # Vistos como números de 64 bits, la fecha es el segundo de cada registro
+                        yield inicio, tiempos, nombres, memoryview(bloque).cast('d')[1::2].tolist()
+                    else:
+                        yield inicio, tiempos, nombres
+
+    def tiempos_por_bloques(self):
+        """
+        Recorre los tiempos de todos los resultados por bloques, sin leer el
+        archivo entero (por ejemplo, para analizarlo con analisis.py).
+
+        Returns:
+            Generador de bloques de tiempos (arrays de NumPy o listas)
+        """
+        for _, tiempos, _ in self._bloques():
+            yield tiempos
+
+    def _jugador(self, numero_nombre, tiempo, fecha=0.0):
+        """
+        Returns:
+            Diccionario con 'nombre' y 'tiempo' de un resultado, más 'fecha'
+            si el resultado la tiene (los importados no tienen)
+        """
+        self._leer_nombres()
+        jugador = {'nombre': self._nombres[int(numero_nombre)], 'tiempo': int(tiempo)}
+        if fecha:
+            jugador['fecha'] = float(fecha)
+        return jugador
+
+    def cargar(self):
+        """
+        Lee todos los resultados. Solo hace falta para herramientas que
+        necesitan la lista completa; el juego usa consultar_estadisticas.
+
+        Returns:
+            Diccionario con los datos de los jugadores (con 'fecha' en los
+            resultados que la tienen, para que compactar la conserve)
+        """
+        jugadores = []
+        for _, tiempos, nombres, fechas in self._bloques(con_fechas=True):
+            jugadores.extend(self._jugador(numero, tiempo, fecha)
+                             for tiempo, numero, fecha in zip(tiempos, nombres, fechas))
+        return {'jugadores': jugadores}
+
+    def leer_resultados(self, desde, hasta):
+        """
+        Lee solo los registros de unas posiciones, sin recorrer el resto del archivo.
+
+        Args:
+            desde: Posición del primer resultado
+            hasta: Posición siguiente al último
+
+        Returns:
+            Lista de diccionarios con 'nombre' y 'tiempo'
+        """
+        if self._archivo is not None:
+            self._archivo.flush()
+        self._crear_si_falta()
+        cantidad = (os.path.getsize(self.ruta_datos) - len(MAGIA)) // REGISTRO.size
+        hasta = min(hasta, cantidad)
+        if desde >= hasta:
+            return []
+        with open(self.ruta_datos, 'rb') as archivo:
+            archivo.seek(len(MAGIA) + desde * REGISTRO.size)
+            datos = archivo.read((hasta - desde) * REGISTRO.size)
+        return [self._jugador(numero, tiempo, fecha) for tiempo, numero, fecha in REGISTRO.iter_unpack(datos)]
+
+    def mejores_jugadores(self, numero=NUMERO_MEJORES):
+        """
+        Devuelve los mejores resultados; los empates los gana el más antiguo.
+
+        Args:
+            numero: Número de resultados a devolver
+
+        Returns:
+            Lista de diccionarios con los mejores jugadores
+        """
+        candidatos = []
+        for inicio, tiempos, nombres in self._bloques():
+            if numpy is not None:
+                k = min(numero, len(tiempos))
+                corte = numpy.partition(tiempos, k - 1)[k - 1]
+                posiciones = numpy.flatnonzero(tiempos <= corte)
+                posiciones = posiciones[numpy.argsort(tiempos[posiciones], kind='stable')][:numero]
+                candidatos.extend((int(tiempos[i]), inicio + int(i), int(nombres[i])) for i in posiciones)
+            else:
+                candidatos.extend(heapq.nsmallest(numero, ((tiempo, inicio + i, nombre)
+                                  for i, (tiempo, nombre) in enumerate(zip(tiempos, nombres)))))
+            # Solo hace falta guardar los mejores de lo recorrido hasta ahora
+            candidatos = sorted(candidatos)[:numero]
+        return [self._jugador(nombre, tiempo) for tiempo, _, nombre in candidatos]
+
+    def historial_jugador(self, nombre):
+        """
+        Devuelve todos los tiempos de un jugador.
+
+        Args:
+            nombre: Nombre del jugador
+
+        Returns:
+            Lista de diccionarios con el tiempo de cada intento
+        """
+        self._leer_nombres()
+        numero = self._numeros.get(nombre)
+        historial = []
+        if numero is None:
+            return historial
+        for _, tiempos, nombres in self._bloques():
+            if numpy is not None:
+                historial.extend({'tiempo': int(tiempo)} for tiempo in tiempos[nombres == numero])
+            else:
+                historial.extend({'tiempo': tiempo} for tiempo, otro in zip(tiempos, nombres) if otro == numero)
+        return historial
+
+    def resumen_jugadores(self):
+        """
+        Resume los intentos de cada nombre recorriendo el archivo por bloques.
+        La posición de cada registro hace de orden de llegada.
+
+        Returns:
+            Lista de tuplas (nombre, intentos, suma, mejor, orden del mejor,
+            recientes) como las que espera IndiceJugadores.desde_filas
+        """
+        # número de nombre -> [intentos, suma, mejor, orden del mejor, recientes]
+        resumen = {}
+        for inicio, tiempos, nombres in self._bloques():
+            if numpy is None:
+                for i, (tiempo, numero) in enumerate(zip(tiempos, nombres)):
+                    fila = resumen.get(numero)
+                    if fila is None:
+                        fila = resumen[numero] = [0, 0, tiempo, inicio + i, []]
+                    fila[0] += 1
+                    fila[1] += tiempo
+                    if tiempo < fila[2]:
+                        fila[2] = tiempo
+                        fila[3] = inicio + i
+                    fila[4].append((inicio + i, tiempo))
+                    if len(fila[4]) > NUMERO_RECIENTES:
+                        del fila[4][0]
+                continue
+
+            numeros, grupos = numpy.unique(nombres, return_inverse=True)
+            intentos = numpy.bincount(grupos)
+            sumas = numpy.bincount(grupos, weights=tiempos)
+            posiciones = numpy.arange(len(tiempos))
+            # Mejor de cada nombre: el primero al ordenar por nombre, tiempo y posición
+            orden = numpy.lexsort((posiciones, tiempos, grupos))
+            mejores = orden[numpy.searchsorted(grupos[orden], numpy.arange(len(numeros)))]
+            # Últimos de cada nombre: los que quedan al final al ordenar por nombre y posición
+            orden = numpy.argsort(grupos, kind='stable')
+            desde_final = numpy.cumsum(intentos)[grupos[orden]] - 1 - numpy.arange(len(orden))
+            ultimos = orden[desde_final < NUMERO_RECIENTES]
+
+            for grupo, numero in enumerate(numeros.tolist()):
+                mejor = int(mejores[grupo])
+                fila = resumen.setdefault(numero, [0, 0, int(tiempos[mejor]), inicio + mejor, []])
+                fila[0] += int(intentos[grupo])
+                fila[1] += int(round(sumas[grupo]))
+                if int(tiempos[mejor]) < fila[2]:
+                    fila[2] = int(tiempos[mejor])
+                    fila[3] = inicio + mejor
+            for posicion in ultimos.tolist():
+                fila = resumen[int(nombres[posicion])]
+                fila[4].append((inicio + posicion, int(tiempos[posicion])))
+                if len(fila[4]) > NUMERO_RECIENTES:
+                    del fila[4][0]
+
+        self._leer_nombres()
+        return [(self._nombres[numero], *fila) for numero, fila in resumen.items()]
+
+    def consultar_estadisticas(self, **opciones):
+        """
+        Calcula las estadísticas del juego recorriendo el archivo por bloques,
+        sin crear un objeto por resultado.
+
+        Args:
+            opciones: Opciones de Estadisticas. Si limites es "auto", los límites
+                      del histograma se calculan a partir de los tiempos
+
+        Returns:
+            Estadisticas: Objeto con las estadísticas de todos los jugadores
+        """
+        # Primera pasada: cantidad, suma, mínimo y conteo por milisegundo
+        cantidad = suma = 0
+        minimo = None
+        conteos_por_tiempo = [0] * (TIEMPO_MAXIMO_INDICE + 1)
+        for _, tiempos, _ in self._bloques():
+            cantidad += len(tiempos)
+            if numpy is not None:
+                suma += int(tiempos.sum(dtype=numpy.int64))
+                minimo_bloque = int(tiempos.min())
+                cubos = numpy.clip(tiempos, 0, TIEMPO_MAXIMO_INDICE)
+                conteos_bloque = numpy.bincount(cubos, minlength=TIEMPO_MAXIMO_INDICE + 1).tolist()
+                conteos_por_tiempo = [a + b for a, b in zip(conteos_por_tiempo, conteos_bloque)]
+            else:
+                suma += sum(tiempos)
+                minimo_bloque = min(tiempos)
+                for tiempo in tiempos:
+                    conteos_por_tiempo[min(max(tiempo, 0), TIEMPO_MAXIMO_INDICE)] += 1
+            if minimo is None or minimo_bloque < minimo:
+                minimo = minimo_bloque
+        conteos_por_tiempo = {tiempo: conteo for tiempo, conteo in enumerate(conteos_por_tiempo) if conteo}
+
+        if opciones.get('limites') == 'auto':
+            opciones['limites'] = limites_automaticos_conteos(conteos_por_tiempo)
+        limites = opciones.get('limites', LIMITES_HISTOGRAMA)
+
+        # Segunda pasada: conteos del histograma con los tiempos exactos
+        conteos = [0] * (len(limites) + 1)
+        for _, tiempos, _ in self._bloques():
+            conteos = [a + b for a, b in zip(conteos, contar_por_rangos(tiempos, limites))]
+
+        return Estadisticas.desde_resumen(
+            cantidad, suma, minimo, conteos, conteos_por_tiempo, self.resumen_jugadores(), **opciones)
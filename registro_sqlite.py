@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de resultados del Juego de Reflejos en una base de datos SQLite.
+
+Es una alternativa opcional a registro.RegistroResultados con los mismos
+métodos, así que el resto del juego no nota la diferencia. Los tiempos y los
+nombres están indexados, de modo que las preguntas habituales (mejores
+jugadores, historial de un jugador, conteos del histograma) se responden con
+consultas que no traen todas las filas a Python.
+
+La base de datos usa el modo WAL para que otros programas puedan leerla
+mientras el juego escribe.
+"""
+
+import os
+import sqlite3
+import time
+
+from estadisticas import Estadisticas, LIMITES_HISTOGRAMA, NUMERO_MEJORES, NUMERO_RECIENTES
+from histograma import limites_automaticos_conteos
+from registro import RegistroResultados
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jugadores (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    tiempo INTEGER NOT NULL,
+    fecha REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jugadores_tiempo ON jugadores (tiempo);
+CREATE INDEX IF NOT EXISTS idx_jugadores_nombre ON jugadores (nombre);
+"""
+
+# Número de sincronizaciones (una por lote guardado) entre checkpoints del
+# WAL; entre medias SQLite ya lo pasa a la base de datos cuando crece mucho
+CHECKPOINT_CADA = 50
+
+class RegistroSQLite:
+    """
+    Resultados de los jugadores guardados en una tabla SQLite indexada.
+    """
+
+    def __init__(self, ruta_base_datos, migrar_desde=None):
+        """
+        Args:
+            ruta_base_datos: Ruta del archivo SQLite
+            migrar_desde: Tupla (ruta_datos, ruta_registro) con los archivos JSON
+                          que se importan si la base de datos está vacía
+        """
+        self.ruta_datos = ruta_base_datos
+        # Con WAL las escrituras van primero a este archivo
+        self.ruta_registro = ruta_base_datos + '-wal'
+        self.migrar_desde = migrar_desde
+        self._conexion = None
+        self._sin_checkpoint = 0
+
+    def _conectar(self):
+        """
+        Abre la base de datos, crea la tabla si no existe y migra los datos antiguos.
+
+        Returns:
+            sqlite3.Connection: Conexión abierta
+        """
+        if self._conexion is None:
+            # La conexión se puede usar desde el hilo del escritor en segundo
+            # plano; escritor.EscritorSegundoPlano evita que se use a la vez
+            self._conexion = sqlite3.connect(self.ruta_datos, check_same_thread=False)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            # En WAL basta con sincronizar en los checkpoints
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            self._conexion.executescript(ESQUEMA)
+            self._migrar()
+        return self._conexion
+
+    def _migrar(self):
+        """
+        Importa los resultados del antiguo jugadores.json si la tabla está vacía.
+        """
+        if self.migrar_desde is None:
+            return
+        ruta_datos, ruta_registro = self.migrar_desde
+        if not (os.path.exists(ruta_datos) or os.path.exists(ruta_registro)):
+            return
+        if self._conexion.execute("SELECT 1 FROM jugadores LIMIT 1").fetchone():
+            return
+
+        datos = RegistroResultados(ruta_datos, ruta_registro).cargar()
+        with self._conexion:
+            self._conexion.executemany(
+                "INSERT INTO jugadores (nombre, tiempo, fecha) VALUES (?, ?, ?)",
+                ((jugador['nombre'], jugador['tiempo'], jugador.get('fecha')) for jugador in datos['jugadores']))
+        print(f"Se han importado {len(datos['jugadores'])} resultados de {ruta_datos}.")
+
+    def cargar(self):
+        """
+        Lee todos los resultados. Solo hace falta para herramientas que
+        necesitan la lista completa; el juego usa consultar_estadisticas.
+
+        Returns:
+            Diccionario con los datos de los jugadores (con 'fecha' en los
+            resultados que la tienen, para que compactar la conserve)
+        """
+        filas = self._conectar().execute("SELECT nombre, tiempo, fecha FROM jugadores ORDER BY id")
+        jugadores = []
+        for nombre, tiempo, fecha in filas:
+            jugador = {'nombre': nombre, 'tiempo': tiempo}
+            if fecha is not None:
+                jugador['fecha'] = fecha
+            jugadores.append(jugador)
+        return {'jugadores': jugadores}
+
+    def leer_resultados(self, desde, hasta):
+        """
+        Lee solo los resultados de unas posiciones (en el orden en que se guardaron).
+
+        Args:
+            desde: Posición del primer resultado
+            hasta: Posición siguiente al último
+
+        Returns:
+            Lista de diccionarios con 'nombre' y 'tiempo'
+        """
+        filas = self._conectar().execute("SELECT nombre, tiempo FROM jugadores ORDER BY id LIMIT ? OFFSET ?",
+                                         (max(0, hasta - desde), desde))
+        return [{'nombre': nombre, 'tiempo': tiempo} for nombre, tiempo in filas]
+
+    def agregar(self, jugador):
+        """
+        Añade un resultado.
+
+        Args:
+            jugador: Diccionario con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: Siempre False, la base de datos no necesita compactarse
+        """
+        return self.agregar_lote([jugador])
+
+    def agregar_lote(self, jugadores):
+        """
+        Añade varios resultados en una sola transacción.
+
+        Args:
+            jugadores: Lista de diccionarios con 'nombre' y 'tiempo'
+
+        Returns:
+            bool: Siempre False, la base de datos no necesita compactarse
+        """
+        conexion = self._conectar()
+        fecha = time.time()
+        with conexion:
+            conexion.executemany("INSERT INTO jugadores (nombre, tiempo, fecha) VALUES (?, ?, ?)",
+                                 ((jugador['nombre'], jugador['tiempo'], fecha) for jugador in jugadores))
+        return False
+
+    def compactar(self, datos):
+        """
+        Sustituye todos los resultados por los indicados (equivale a guardar_datos).
+
+        Args:
+            datos: Diccionario con los datos de todos los jugadores
+        """
+        conexion = self._conectar()
+        with conexion:
+            conexion.execute("DELETE FROM jugadores")
+            conexion.executemany(
+                "INSERT INTO jugadores (nombre, tiempo, fecha) VALUES (?, ?, ?)",
+                ((jugador['nombre'], jugador['tiempo'], jugador.get('fecha')) for jugador in datos['jugadores']))
+        conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._sin_checkpoint = 0
+
+    def sincronizar(self):
+        """
+        Pasa el contenido del WAL a la base de datos cada CHECKPOINT_CADA
+        llamadas, no después de cada lote. Con synchronous=NORMAL un corte de
+        luz como mucho pierde los últimos resultados, nunca estropea la base de datos.
+        """
+        if self._conexion is None:
+            return
+        self._sin_checkpoint += 1
+        if self._sin_checkpoint >= CHECKPOINT_CADA:
+            self._conexion.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self._sin_checkpoint = 0
+
+    def cerrar(self):
+        """
+        Pasa el WAL a la base de datos y la cierra.
+        """
+        if self._conexion is not None:
+            self._conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._sin_checkpoint = 0
+            self._conexion.close()
+            self._conexion = None
+
+    def mejores_jugadores(self, numero=NUMERO_MEJORES):
+        """
+        Devuelve los mejores resultados usando el índice de tiempos.
+
+        Args:
+            numero: Número de resultados a devolver
+
+        Returns:
+            Lista de diccionarios con los mejores jugadores
+        """
+        filas = self._conectar().execute(
+            "SELECT nombre, tiempo FROM jugadores ORDER BY tiempo, id LIMIT ?", (numero,))
+        return [{'nombre': nombre, 'tiempo': tiempo} for nombre, tiempo in filas]
+
+    def historial_jugador(self, nombre):
+        """
+        Devuelve todos los intentos de un jugador usando el índice de nombres.
+
+        Args:
+            nombre: Nombre del jugador
+
+        Returns:
+            Lista de diccionarios con el tiempo y la fecha de cada intento
+        """
+        filas = self._conectar().execute(
+            "SELECT tiempo, fecha FROM jugadores WHERE nombre = ? ORDER BY id", (nombre,))
+        return [{'tiempo': tiempo, 'fecha': fecha} for tiempo, fecha in filas]
+
+    def resumen_jugadores(self):
+        """
+        Resume los intentos de cada nombre con dos consultas agrupadas, sin
+        traer todas las filas a Python. El id de cada fila hace de orden de llegada.
+
+        Returns:
+            Lista de tuplas (nombre, intentos, suma, mejor, orden del mejor,
+            recientes) como las que espera IndiceJugadores.desde_filas
+        """
+        conexion = self._conectar()
+        filas = {nombre: [nombre, intentos, int(suma), mejor, 0, []]
+                 for nombre, intentos, suma, mejor in conexion.execute(
+                     "SELECT nombre, COUNT(*), TOTAL(tiempo), MIN(tiempo) FROM jugadores GROUP BY nombre")}
+        # El mejor intento (el primero si hay empate) y los últimos de cada nombre
+        consulta = """
+            SELECT nombre, id, tiempo, reciente, puesto FROM (
+                SELECT nombre, id, tiempo,
+                       ROW_NUMBER() OVER (PARTITION BY nombre ORDER BY id DESC) AS reciente,
+                       ROW_NUMBER() OVER (PARTITION BY nombre ORDER BY tiempo, id) AS puesto
+                FROM jugadores)
+            WHERE reciente <= ? OR puesto = 1
+        """
+        for nombre, id_fila, tiempo, reciente, puesto in conexion.execute(consulta, (NUMERO_RECIENTES,)):
+            fila = filas[nombre]
+            if puesto == 1:
+                fila[4] = id_fila
+            if reciente <= NUMERO_RECIENTES:
+                fila[5].append((id_fila, tiempo))
+        return [tuple(fila) for fila in filas.values()]
+
+    def conteo_por_rangos(self, limites=LIMITES_HISTOGRAMA):
+        """
+        Cuenta los resultados de cada rango del histograma. Cada conteo es una
+        búsqueda en el índice de tiempos, sin leer las filas.
+
+        Args:
+            limites: Límites de los rangos
+
+        Returns:
+            Lista con el conteo de jugadores por rango de tiempo, con el mismo
+            formato que histograma.contar_por_rangos
+        """
+        conexion = self._conectar()
+        conteos = [conexion.execute("SELECT COUNT(*) FROM jugadores WHERE tiempo < ?",
+                                    (limites[0],)).fetchone()[0]]
+        for inferior, superior in zip(limites, limites[1:]):
+            conteos.append(conexion.execute("SELECT COUNT(*) FROM jugadores WHERE tiempo >= ? AND tiempo < ?",
+                                            (inferior, superior)).fetchone()[0])
+        conteos.append(conexion.execute("SELECT COUNT(*) FROM jugadores WHERE tiempo >= ?",
+                                        (limites[-1],)).fetchone()[0])
+        return conteos
+
+    def consultar_estadisticas(self, **opciones):
+        """
+        Calcula las estadísticas del juego con consultas a la base de datos.
+
+        Args:
+            opciones: Opciones de Estadisticas. Si limites es "auto", los límites
+                      del histograma se calculan a partir de los tiempos
+
+        Returns:
+            Estadisticas: Objeto con las estadísticas de todos los jugadores
+        """
+        cantidad, suma, minimo = self._conectar().execute(
+            "SELECT COUNT(*), TOTAL(tiempo), MIN(tiempo) FROM jugadores").fetchone()
+        # Para el índice de posiciones basta con un conteo por milisegundo
+        conteos_por_tiempo = dict(self._conectar().execute(
+            "SELECT tiempo, COUNT(*) FROM jugadores GROUP BY tiempo"))
+
+        if opciones.get('limites') == 'auto':
+            # Con el conteo por milisegundo se pueden calcular sin leer todas las filas
+            opciones['limites'] = limites_automaticos_conteos(conteos_por_tiempo)
+        limites = opciones.get('limites', LIMITES_HISTOGRAMA)
+        return Estadisticas.desde_resumen(
+            cantidad, int(suma), minimo,
+            self.conteo_por_rangos(limites),
+            conteos_por_tiempo,
+            self.resumen_jugadores(),
+            **opciones)
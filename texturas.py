@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Presentación de las pantallas con texturas de SDL (pygame._sdl2.video).
+
+Las pantallas se siguen componiendo en superficies de pygame, pero en lugar
+de copiar la pantalla entera con la CPU en cada volcado, lo que no cambia (el
+fondo de cada pantalla con sus textos y el histograma, y el fotograma rojo
+del estímulo) se sube una sola vez como textura y en cada fotograma la
+tarjeta gráfica solo junta las texturas. En la Raspberry Pi se usa el
+renderizador por hardware (OpenGL ES); si no hay tarjeta gráfica, SDL tiene
+un renderizador por software que también funciona.
+
+pygame._sdl2 es una parte experimental de pygame: si no está disponible o no
+se puede crear la ventana, juego.py sigue usando pygame.display como siempre.
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+try:
+    from pygame._sdl2 import video
+except ImportError:
+    # pygame 1 o una versión sin _sdl2: se usa la pantalla normal
+    video = None
+
+# Texturas de textos ya subidas que se guardan (como la caché de textos)
+CAPACIDAD_TEXTURAS = 256
+
+class PresentadorTexturas:
+    """
+    Ventana con un renderizador de SDL. Guarda las texturas de los fondos
+    con un nombre y las de los elementos que cambian (campo de texto,
+    marcas del jugador...) y las junta en cada volcado.
+    """
+
+    def __init__(self, titulo, tamano=None, vsync=False):
+        """
+        Args:
+            titulo: Título de la ventana
+            tamano: (ancho, alto) de una ventana a la que se le puede cambiar
+                    el tamaño, o None para la pantalla completa
+            vsync: Si se espera al refresco del monitor en cada volcado
+
+        Raises:
+            pygame.error: Si no se puede crear la ventana ni ningún renderizador
+        """
+        if video is None:
+            raise pygame.error("pygame._sdl2 no está disponible")
+        try:
+            if tamano is None:
+                self.ventana = video.Window(titulo, fullscreen_desktop=True)
+            else:
+                self.ventana = video.Window(titulo, size=tamano, resizable=True)
+        except video.error as e:
+            raise pygame.error(str(e)) from e
+
+        # Primero por hardware; si no hay tarjeta gráfica, por software
+        self.acelerado = True
+        try:
+            self.renderizador = video.Renderer(self.ventana, accelerated=1, vsync=vsync)
+        except video.error:
+            self.acelerado = False
+            try:
+                self.renderizador = video.Renderer(self.ventana, accelerated=0)
+            except video.error as e:
+                self.ventana.destroy()
+                raise pygame.error(str(e)) from e
+        self.vsync = vsync and self.acelerado
+
+        # Fondos con nombre ('escena', 'reaccion'...) y el que se está mostrando
+        self._fondos = {}
+        self._fondo = None
+        # Elementos que se dibujan encima del fondo: nombre -> (textura, posición)
+        self._elementos = {}
+        # Textura de cada superficie ya subida (las de la caché de textos no cambian)
+        self._texturas = OrderedDict()
+
+    @property
+    def tamano(self):
+        """
+        Returns:
+            Tupla (ancho, alto) de la ventana
+        """
+        return self.ventana.size
+
+    def subir_fondo(self, nombre, superficie):
+        """
+        Sube (o vuelve a subir) una superficie del tamaño de la ventana como
+        fondo con nombre. Se hace una vez cuando se compone la pantalla.
+
+        Args:
+            nombre: Nombre del fondo
+            superficie: Superficie ya dibujada
+        """
+        textura = self._fondos.get(nombre)
+        if textura is not None and (textura.width, textura.height) == superficie.get_size():
+            textura.update(superficie)
+        else:
+            self._fondos[nombre] = video.Texture.from_surface(self.renderizador, superficie)
+
+    def usar_fondo(self, nombre):
+        """
+        Elige el fondo que se muestra y quita los elementos de la pantalla anterior.
+
+        Args:
+            nombre: Nombre de un fondo ya subido con subir_fondo
+        """
+        self._fondo = self._fondos[nombre]
+        self._elementos = {}
+
+    def colocar(self, nombre, imagen, posicion):
+        """
+        Pone un elemento encima del fondo, en lugar del que tuviera ese nombre.
+
+        Args:
+            nombre: Nombre con el que se identifica el elemento
+            imagen: Superficie con el elemento (no se debe modificar después)
+            posicion: Posición (x, y) en la pantalla
+
+        Returns:
+            Rect: Zona de la pantalla que ocupa el elemento
+        """
+        zona = pygame.Rect(posicion, imagen.get_size())
+        if not zona.width or not zona.height:
+            # Un texto vacío: SDL no admite texturas sin píxeles
+            self._elementos.pop(nombre, None)
+            return zona
+
+        textura = self._texturas.get(imagen)
+        if textura is None:
+            textura = video.Texture.from_surface(self.renderizador, imagen)
+            self._texturas[imagen] = textura
+            if len(self._texturas) > CAPACIDAD_TEXTURAS:
+                self._texturas.popitem(last=False)
+        else:
+            self._texturas.move_to_end(imagen)
+        self._elementos[nombre] = (textura, zona)
+        return zona
+
+    def presentar(self):
+        """
+        Junta el fondo y los elementos y los muestra en la ventana.
+        """
+        self.renderizador.clear()
+        if self._fondo is not None:
+            self._fondo.draw()
+        for textura, zona in self._elementos.values():
+            textura.draw(dstrect=zona)
+        self.renderizador.present()
+
+    def capturar(self):
+        """
+        Returns:
+            Surface: Copia de lo que se ha mostrado (para comprobarlo sin monitor)
+        """
+        return self.renderizador.to_surface()
+
+    def cerrar(self):
+        """
+        Libera las texturas y cierra la ventana.
+        """
+        self._fondos = {}
+        self._fondo = None
+        self._elementos = {}
+        self._texturas.clear()
+        self.ventana.destroy()
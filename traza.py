@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Traza binaria de las rondas del Juego de Reflejos.
+
+Durante cada ronda se apuntan, con marcas de tiempo en nanosegundos, la
+espera programada, cada volcado de pantalla, la aparición del estímulo y cada
+pulsación. Al terminar la ronda se añaden al archivo de traza, así que si
+alguien no está de acuerdo con su tiempo se puede comprobar qué pasó.
+
+Los registros tienen tamaño fijo y se guardan en arrays reservados de antemano
+que funcionan como un búfer circular, de modo que apuntar un suceso no reserva
+memoria ni toca el disco.
+
+Para ver el informe de las rondas de un archivo de traza:
+
+    python3 traza.py reflejos.traza
+"""
+
+import argparse
+import os
+import struct
+import time
+from array import array
+
+# Identifica los archivos de traza (y su versión) al principio del archivo
+MAGIA = b'RFLJTRZ\x01'
+
+# Cada registro: tipo, ronda, marca de tiempo (ns) y un valor que depende del tipo
+REGISTRO = struct.Struct('<BxxxIqq')
+
+# Tipos de registro
+RONDA = 1      # Empieza una ronda; valor: fecha en ns desde 1970 (time.time_ns)
+ESPERA = 2     # Espera programada antes del estímulo; valor: duración en ns
+VOLCADO = 3    # Volcado de pantalla; valor: 0
+ESTIMULO = 4   # Aparece el estímulo; valor: duración del volcado en ns
+ENTRADA = 5    # Pulsación; valor: código de la tecla
+FIN = 6        # Termina la ronda; valor: resultado en ms, SIN_REACCION o ADELANTADO
+
+NOMBRES_TIPOS = {RONDA: 'ronda', ESPERA: 'espera', VOLCADO: 'volcado',
+                 ESTIMULO: 'estimulo', ENTRADA: 'entrada', FIN: 'fin'}
+
+# Resultados especiales del registro FIN
+SIN_REACCION = -1
+ADELANTADO = -2
+
+# Número de registros que caben en el búfer de una ronda
+CAPACIDAD_TRAZA = 1024
+
+class GrabadorTraza:
+    """
+    Búfer circular de registros de tamaño fijo que se vuelca al archivo de
+    traza al final de cada ronda.
+    """
+
+    def __init__(self, ruta, capacidad=CAPACIDAD_TRAZA):
+        """
+        Args:
+            ruta: Archivo de traza (se añaden las rondas al final), o None para no guardar nada
+            capacidad: Número de registros que caben en el búfer
+        """
+        self.ruta = ruta
+        self.capacidad = capacidad
+        self.ronda = 0
+        self.en_ronda = False
+        # Registros perdidos por haberse llenado el búfer
+        self.perdidos = 0
+
+        self._tipos = array('B', bytes(capacidad))
+        self._rondas = array('I', bytes(4 * capacidad))
+        self._marcas = array('q', bytes(8 * capacidad))
+        self._valores = array('q', bytes(8 * capacidad))
+        self._inicio = 0
+        self._cantidad = 0
+
+    def registrar(self, tipo, marca_ns, valor=0):
+        """
+        Apunta un suceso de la ronda actual. Fuera de una ronda no hace nada.
+
+        Args:
+            tipo: Tipo de registro (VOLCADO, ENTRADA...)
+            marca_ns: Marca de tiempo en ns (perf_counter_ns)
+            valor: Valor que depende del tipo
+        """
+        if not self.en_ronda:
+            return
+        if self._cantidad == self.capacidad:
+            # Búfer lleno: se pisa el registro más antiguo
+            self._inicio = (self._inicio + 1) % self.capacidad
+            self._cantidad -= 1
+            self.perdidos += 1
+        posicion = (self._inicio + self._cantidad) % self.capacidad
+        self._tipos[posicion] = tipo
+        self._rondas[posicion] = self.ronda
+        self._marcas[posicion] = marca_ns
+        self._valores[posicion] = valor
+        self._cantidad += 1
+
+    def empezar_ronda(self, marca_ns):
+        """
+        Empieza a apuntar una ronda nueva.
+
+        Args:
+            marca_ns: Marca de tiempo en ns del inicio de la ronda
+        """
+        self.ronda += 1
+        self.en_ronda = True
+        self.registrar(RONDA, marca_ns, time.time_ns())
+
+    def terminar_ronda(self, marca_ns, resultado):
+        """
+        Termina la ronda y añade sus registros al archivo de traza.
+
+        Args:
+            marca_ns: Marca de tiempo en ns del final de la ronda
+            resultado: Tiempo de reacción en ms, SIN_REACCION o ADELANTADO
+        """
+        if not self.en_ronda:
+            return
+        self.registrar(FIN, marca_ns, resultado)
+        self.en_ronda = False
+        self.guardar()
+
+    def guardar(self):
+        """
+        Añade los registros del búfer al archivo de traza y vacía el búfer.
+        """
+        if self.ruta is None or not self._cantidad:
+            self._cantidad = 0
+            return
+
+        datos = bytearray(REGISTRO.size * self._cantidad)
+        for i in range(self._cantidad):
+            posicion = (self._inicio + i) % self.capacidad
+            REGISTRO.pack_into(datos, i * REGISTRO.size, self._tipos[posicion], self._rondas[posicion],
+                               self._marcas[posicion], self._valores[posicion])
+        self._inicio = 0
+        self._cantidad = 0
+
+        try:
+            nuevo = not os.path.exists(self.ruta) or os.path.getsize(self.ruta) == 0
+            with open(self.ruta, 'ab') as archivo:
+                if nuevo:
+                    archivo.write(MAGIA)
+                archivo.write(datos)
+        except OSError as e:
+            print(f"Error al guardar la traza en {self.ruta}: {e}")
+
+def leer_traza(ruta):
+    """
+    Lee todos los registros de un archivo de traza.
+
+    Args:
+        ruta: Archivo de traza
+
+    Returns:
+        Lista de tuplas (tipo, ronda, marca_ns, valor)
+    """
+    with open(ruta, 'rb') as archivo:
+        contenido = archivo.read()
+    if not contenido.startswith(MAGIA):
+        raise ValueError(f"{ruta} no es un archivo de traza del juego")
+
+    # Un registro cortado al final (por un corte de luz) se descarta
+    cuerpo = memoryview(contenido)[len(MAGIA):]
+    completo = len(cuerpo) - len(cuerpo) % REGISTRO.size
+    return list(REGISTRO.iter_unpack(cuerpo[:completo]))
+
+def separar_rondas(registros):
+    """
+    Agrupa los registros por rondas: cada ronda empieza con un registro RONDA.
+
+    Args:
+        registros: Lista de tuplas (tipo, ronda, marca_ns, valor)
+
+    Returns:
+        Lista de rondas, cada una con su lista de registros
+    """
+    rondas = []
+    for registro in registros:
+        if registro[0] == RONDA or not rondas:
+            rondas.append([])
+        rondas[-1].append(registro)
+    return rondas
+
+def analizar_ronda(registros):
+    """
+    Calcula los tiempos de una ronda a partir de sus registros.
+
+    Args:
+        registros: Registros de una ronda
+
+    Returns:
+        Diccionario con la fecha, la espera programada y la real, el volcado
+        del estímulo, las pulsaciones, el tiempo de reacción según la traza
+        y el resultado que se guardó
+    """
+    informe = {'fecha': None, 'espera_programada_ms': None, 'espera_real_ms': None,
+               'volcado_estimulo_ms': None, 'volcados': 0, 'pulsaciones_antes': 0,
+               'reaccion_traza_ms': None, 'resultado': None}
+    inicio = estimulo = None
+    for tipo, _, marca, valor in registros:
+        if tipo == RONDA:
+            inicio = marca
+            informe['fecha'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(valor / 1e9))
+        elif tipo == ESPERA:
+            informe['espera_programada_ms'] = valor / 1e6
+        elif tipo == VOLCADO:
+            informe['volcados'] += 1
+        elif tipo == ESTIMULO:
+            estimulo = marca
+            informe['volcado_estimulo_ms'] = valor / 1e6
+            if inicio is not None:
+                informe['espera_real_ms'] = (marca - inicio) / 1e6
+        elif tipo == ENTRADA:
+            if estimulo is None:
+                informe['pulsaciones_antes'] += 1
+            elif informe['reaccion_traza_ms'] is None:
+                informe['reaccion_traza_ms'] = (marca - estimulo) / 1e6
+        elif tipo == FIN:
+            informe['resultado'] = valor
+    return informe
+
+def informe_rondas(ruta):
+    """
+    Returns:
+        Lista con el informe de cada ronda del archivo de traza (ver analizar_ronda)
+    """
+    return [analizar_ronda(ronda) for ronda in separar_rondas(leer_traza(ruta))]
+
+def texto_resultado(resultado):
+    """
+    Returns:
+        Texto con el resultado guardado de una ronda
+    """
+    if resultado is None:
+        return "sin terminar"
+    if resultado == SIN_REACCION:
+        return "no pulsó"
+    if resultado == ADELANTADO:
+        return "se adelantó"
+    return f"{resultado} ms"
+
+def main():
+    """
+    Muestra el informe de las rondas de un archivo de traza.
+    """
+    parser = argparse.ArgumentParser(description="Informe de las rondas de una traza del Juego de Reflejos")
+    parser.add_argument('archivo', help="Archivo de traza")
+    argumentos = parser.parse_args()
+
+    def ms(valor):
+        return "-" if valor is None else f"{valor:.3f} ms"
+
+    for numero, informe in enumerate(informe_rondas(argumentos.archivo), 1):
+        print(f"Ronda {numero} ({informe['fecha']}): resultado {texto_resultado(informe['resultado'])}")
+        print(f"  espera programada {ms(informe['espera_programada_ms'])}, real {ms(informe['espera_real_ms'])}")
+        print(f"  volcado del estímulo {ms(informe['volcado_estimulo_ms'])}, {informe['volcados']} volcados")
+        print(f"  reacción según la traza {ms(informe['reaccion_traza_ms'])}, "
+              f"{informe['pulsaciones_antes']} pulsaciones antes del estímulo")
+
+if __name__ == "__main__":
+    main()